@@ -5,7 +5,7 @@ import random
 import asyncio
 import requests
 from dotenv import load_dotenv
-from api.order.models import Order
+from api.order.matching_engine import matching_engine
 from apscheduler.schedulers.background import BackgroundScheduler
 import atexit
 
@@ -23,6 +23,18 @@ from api.analysis import views as analysis  # noqa: E402
 from api.order import views as order  # noqa: E402
 from api.model import views as model  # noqa: E402
 from api.rate_limiter.rate_limiter import limiter  # noqa: E402
+from api.common.constants import (  # noqa: E402
+    ORDERS_MATCH_SECONDS,
+    ORDERS_RELOAD_SECONDS,
+    RECORD_HISTOGRAMS_REFRESH_SECONDS,
+    RECORD_SERIES_RELOAD_SECONDS,
+)
+from api.model.registry import model_registry  # noqa: E402
+from api.record.histogram import refresh_record_histograms  # noqa: E402
+from api.record.models import latest_record_cache, record_series  # noqa: E402
+from api.util.cloud_storage_connector import background_uploader  # noqa: E402
+from api.util.plot_cache import plot_cache  # noqa: E402
+from api.util.plot_renderer import plot_renderer  # noqa: E402
 from api.util.util import (  # noqa: E402
     get_subprocesses_ids,
     log_file_system_disk_free,
@@ -105,6 +117,24 @@ def ping():
     return "pong!"
 
 
+@app.route("/metrics")
+def metrics():
+    return (
+        jsonify(
+            {
+                "plotRenderer": plot_renderer.stats(),
+                "plotCache": plot_cache.stats(),
+                "storageUploads": background_uploader.stats(),
+                "modelRegistry": model_registry.stats(),
+                "latestRecord": latest_record_cache.stats(),
+                "recordSeries": record_series.stats(),
+                "matchingEngine": matching_engine.stats(),
+            }
+        ),
+        200,
+    )
+
+
 @app.route("/subprocesses-ids")
 def subprocesses_ids():
     get_subprocesses_ids()
@@ -112,7 +142,18 @@ def subprocesses_ids():
 
 
 scheduler = BackgroundScheduler()
-scheduler.add_job(func=Order.match_orders, trigger="interval", seconds=60 * 60)
+scheduler.add_job(
+    id="MatchOrders",
+    func=matching_engine.match,
+    trigger="interval",
+    seconds=ORDERS_MATCH_SECONDS,
+)
+scheduler.add_job(
+    id="ReloadOrderBooks",
+    func=matching_engine.reload,
+    trigger="interval",
+    seconds=ORDERS_RELOAD_SECONDS,
+)
 scheduler.add_job(
     id="LogResourceUsageTask",
     func=log_resource_usage,
@@ -126,6 +167,30 @@ scheduler.add_job(
     trigger="interval",
     seconds=60 * 60,
 )
+scheduler.add_job(
+    id="ReconcileLatestRecord",
+    func=latest_record_cache.reconcile,
+    trigger="interval",
+    seconds=latest_record_cache.reconcile_seconds,
+)
+scheduler.add_job(
+    id="RefreshRecordHistograms",
+    func=refresh_record_histograms,
+    trigger="interval",
+    seconds=RECORD_HISTOGRAMS_REFRESH_SECONDS,
+)
+scheduler.add_job(
+    id="RefreshRecordSeries",
+    func=record_series.refresh,
+    trigger="interval",
+    seconds=record_series.refresh_seconds,
+)
+scheduler.add_job(
+    id="ReloadRecordSeries",
+    func=record_series.reload,
+    trigger="interval",
+    seconds=RECORD_SERIES_RELOAD_SECONDS,
+)
 scheduler.start()
 atexit.register(lambda: scheduler.shutdown())
 
@@ -0,0 +1,114 @@
+import logging
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from api.util.price_history import price_history_store
+
+DEFAULT_BACKTEST_WINDOW = 252
+DEFAULT_BACKTEST_HORIZONS = [21, 63, 252]
+
+
+def _cumulative_sum(values: np.ndarray) -> np.ndarray:
+    return np.concatenate(([0.0], np.cumsum(values)))
+
+
+def rolling_linear_trend(
+    days: np.ndarray, close: np.ndarray, window: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Slope and intercept of the least squares fit of close on days over every
+    trailing window, element i is the fit over the window ending at i + window - 1.
+
+    Each window is updated from cumulative sums of x, y, x^2 and xy, so no window
+    is refitted from scratch.
+    """
+    x = days - days[0]
+    sum_x = _cumulative_sum(x)
+    sum_y = _cumulative_sum(close)
+    sum_xx = _cumulative_sum(x * x)
+    sum_xy = _cumulative_sum(x * close)
+
+    window_x = sum_x[window:] - sum_x[:-window]
+    window_y = sum_y[window:] - sum_y[:-window]
+    window_xx = sum_xx[window:] - sum_xx[:-window]
+    window_xy = sum_xy[window:] - sum_xy[:-window]
+
+    slope = (window * window_xy - window_x * window_y) / (
+        window * window_xx - window_x**2
+    )
+    intercept = (window_y - slope * window_x) / window - slope * days[0]
+    return slope, intercept
+
+
+def backtest_close_series(
+    close: pd.Series, window: int, horizons: List[int]
+) -> List[dict]:
+    """Walk-forward error metrics of the linear trend predictor for each horizon"""
+    days = ((close.index - close.index.min()).days).to_numpy(dtype=float)
+    prices = close.to_numpy(dtype=float)
+    horizons = np.asarray(horizons)
+
+    if len(prices) < window + horizons.min():
+        raise ValueError(
+            f"Need at least {window + horizons.min()} closes for window {window}, got {len(prices)}"
+        )
+
+    slope, intercept = rolling_linear_trend(days, prices, window)
+
+    # rows are fit end positions, columns are horizons
+    fit_end = np.arange(window - 1, len(prices))[:, None]
+    target = fit_end + horizons[None, :]
+    valid = target < len(prices)
+    target = np.where(valid, target, fit_end)
+
+    predicted = intercept[:, None] + slope[:, None] * days[target]
+    actual = prices[target]
+    base = prices[fit_end]
+
+    absolute_error = np.where(valid, np.abs(predicted - actual), np.nan)
+    percentage_error = absolute_error / np.abs(actual)
+    direction_hit = np.where(
+        valid, np.sign(predicted - base) == np.sign(actual - base), np.nan
+    )
+
+    samples = valid.sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mae = np.nansum(absolute_error, axis=0) / samples
+        mape = np.nansum(percentage_error, axis=0) / samples * 100
+        directional_accuracy = np.nansum(direction_hit, axis=0) / samples
+
+    return [
+        {
+            "horizon": int(horizon),
+            "window": window,
+            "samples": int(samples[i]),
+            "mae": round(float(mae[i]), 4) if samples[i] else None,
+            "mape": round(float(mape[i]), 4) if samples[i] else None,
+            "directionalAccuracy": (
+                round(float(directional_accuracy[i]), 4) if samples[i] else None
+            ),
+        }
+        for i, horizon in enumerate(horizons)
+    ]
+
+
+def run_backtest(
+    stock_symbols: List[str],
+    years: int,
+    window: int = DEFAULT_BACKTEST_WINDOW,
+    horizons: List[int] = DEFAULT_BACKTEST_HORIZONS,
+) -> List[dict]:
+    results = []
+    for stock_symbol in stock_symbols:
+        df = price_history_store.get_history(stock_symbol, years)
+        if df.empty:
+            raise ValueError(f"No price history for {stock_symbol}")
+
+        for result in backtest_close_series(df["Close"].dropna(), window, horizons):
+            logging.info(
+                f"{stock_symbol:<10} | horizon {result['horizon']:>4} | MAE {result['mae']} | MAPE {result['mape']}% | direction {result['directionalAccuracy']}"
+            )
+            results.append({"stock": stock_symbol, **result})
+    return results
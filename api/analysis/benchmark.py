@@ -0,0 +1,208 @@
+import logging
+import multiprocessing
+import os
+import platform
+import queue as queue_module
+import resource
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+BENCHMARK_STRATEGIES = {
+    "async": "/api/analysis/price-prediction-async",
+    "multiprocess": "/api/analysis/price-prediction-multiprocess",
+    "generator": "/api/analysis/price-prediction-generator",
+    "heapq": "/api/analysis/price-prediction-heapq",
+    "deque": "/api/analysis/price-prediction-deque",
+    "shared-memory": "/api/analysis/price-prediction-multiprocess-shared-memory",
+}
+DEFAULT_BENCHMARK_RUNS = [1, 2, 3]
+DEFAULT_BENCHMARK_CONCURRENCY = [1, 4]
+DEFAULT_BENCHMARK_REQUESTS = 20
+BENCHMARK_WORKER_TIMEOUT_SECONDS = 10 * 60
+BENCHMARK_WORKER_POLL_SECONDS = 1
+
+# ru_maxrss is reported in kilobytes on Linux and in bytes on macOS
+RU_MAXRSS_KB_DIVISOR = 1024 if sys.platform == "darwin" else 1
+
+
+def write_synthetic_price_history(
+    cache_dir: str, stock_symbol: str, years: int = 2, seed: int = 0
+):
+    """Writes a reproducible random walk in the offline price history format"""
+    index = pd.bdate_range(
+        end=pd.Timestamp.now(tz="UTC").normalize(), periods=252 * years, name="Date"
+    )
+    returns = np.random.default_rng(seed).normal(0.0005, 0.015, size=len(index))
+    close = 100 * np.exp(np.cumsum(returns))
+    os.makedirs(cache_dir, exist_ok=True)
+    pd.DataFrame({"Close": close}, index=index).to_csv(
+        os.path.join(cache_dir, f"{stock_symbol}.csv")
+    )
+
+
+def _cpu_seconds(usage) -> float:
+    return usage.ru_utime + usage.ru_stime
+
+
+def _timed_request(client, url: str, payload: dict):
+    start_time = time.perf_counter()
+    response = client.post(url, json=payload)
+    return time.perf_counter() - start_time, response.status_code
+
+
+def _measure_strategy(
+    strategy: str, stock_symbol: str, runs: int, concurrency: int, requests: int
+) -> dict:
+    """Runs in a fresh process so peak RSS and CPU time belong to one measurement"""
+    from api import app
+    from api.rate_limiter.rate_limiter import limiter
+
+    limiter.enabled = False
+    url = BENCHMARK_STRATEGIES[strategy]
+    payload = {"stock": stock_symbol, "runs": runs}
+
+    # warm up the price history cache before measuring
+    app.test_client().post(url, json=payload)
+
+    self_usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    start_time = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        clients = [app.test_client() for _ in range(requests)]
+        outcomes = list(
+            executor.map(lambda client: _timed_request(client, url, payload), clients)
+        )
+    wall_seconds = time.perf_counter() - start_time
+
+    self_usage = resource.getrusage(resource.RUSAGE_SELF)
+    children_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+
+    latencies_ms = np.array([latency for latency, _ in outcomes]) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        "strategy": strategy,
+        "runs": runs,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": sum(1 for _, status_code in outcomes if status_code != 200),
+        "p50Ms": round(float(p50), 2),
+        "p95Ms": round(float(p95), 2),
+        "p99Ms": round(float(p99), 2),
+        "throughputRps": round(requests / wall_seconds, 2),
+        "wallSeconds": round(wall_seconds, 3),
+        "cpuSeconds": round(
+            _cpu_seconds(self_usage) - _cpu_seconds(self_usage_before), 3
+        ),
+        "childCpuSeconds": round(
+            _cpu_seconds(children_usage) - _cpu_seconds(children_usage_before), 3
+        ),
+        "peakRssKb": self_usage.ru_maxrss // RU_MAXRSS_KB_DIVISOR,
+        "peakRssGrowthKb": (self_usage.ru_maxrss - self_usage_before.ru_maxrss)
+        // RU_MAXRSS_KB_DIVISOR,
+        "peakChildRssKb": children_usage.ru_maxrss // RU_MAXRSS_KB_DIVISOR,
+    }
+
+
+def _measure_strategy_worker(queue, *args):
+    try:
+        queue.put(_measure_strategy(*args))
+    except Exception as e:
+        logging.error(e)
+        queue.put({"error": str(e)})
+
+
+def _get_worker_result(queue, process, timeout_seconds: float) -> dict:
+    """
+    Waits for the worker's result, returning an error result if the worker exits
+    without one, for example on an import error or OOM kill, or runs for longer
+    than timeout_seconds
+    """
+    deadline = time.monotonic() + timeout_seconds
+    while time.monotonic() < deadline:
+        try:
+            return queue.get(timeout=BENCHMARK_WORKER_POLL_SECONDS)
+        except queue_module.Empty:
+            if not process.is_alive():
+                # the result may have been put just before the worker exited
+                try:
+                    return queue.get(timeout=BENCHMARK_WORKER_POLL_SECONDS)
+                except queue_module.Empty:
+                    return {
+                        "error": f"Worker exited with code {process.exitcode} without a result"
+                    }
+
+    process.terminate()
+    return {"error": f"Worker timed out after {timeout_seconds} seconds"}
+
+
+def run_benchmark(
+    cache_dir: str,
+    stock_symbol: str,
+    strategies: List[str] = list(BENCHMARK_STRATEGIES),
+    runs_counts: List[int] = DEFAULT_BENCHMARK_RUNS,
+    concurrency_levels: List[int] = DEFAULT_BENCHMARK_CONCURRENCY,
+    requests: int = DEFAULT_BENCHMARK_REQUESTS,
+    async_delay_seconds: float = 0,
+    worker_timeout_seconds: float = BENCHMARK_WORKER_TIMEOUT_SECONDS,
+) -> dict:
+    """
+    Benchmarks every prediction strategy endpoint against the offline price
+    history in cache_dir, one fresh process per strategy, runs and concurrency.
+    """
+    unknown_strategies = set(strategies) - set(BENCHMARK_STRATEGIES)
+    if unknown_strategies:
+        raise ValueError(f"Unknown strategies {sorted(unknown_strategies)}")
+
+    # spawned processes inherit the environment, and read it on import
+    os.environ["PRICE_HISTORY_CACHE_DIR"] = cache_dir
+    os.environ["PRICE_HISTORY_OFFLINE"] = "true"
+    os.environ["PRICE_PREDICTION_ASYNC_DELAY_SECONDS"] = str(async_delay_seconds)
+
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for strategy in strategies:
+        for runs in runs_counts:
+            for concurrency in concurrency_levels:
+                queue = context.Queue()
+                process = context.Process(
+                    target=_measure_strategy_worker,
+                    args=(queue, strategy, stock_symbol, runs, concurrency, requests),
+                )
+                process.start()
+                result = _get_worker_result(queue, process, worker_timeout_seconds)
+                process.join()
+
+                if "error" in result:
+                    result = {
+                        "strategy": strategy,
+                        "runs": runs,
+                        "concurrency": concurrency,
+                        **result,
+                    }
+                else:
+                    logging.info(
+                        f"{strategy:<14} | runs {runs} | concurrency {concurrency:>2} | p50 {result['p50Ms']}ms | p95 {result['p95Ms']}ms | p99 {result['p99Ms']}ms | {result['throughputRps']} req/s"
+                    )
+                results.append(result)
+
+    return {
+        "created": datetime.now(timezone.utc).isoformat(),
+        "machine": {
+            "platform": platform.platform(),
+            "python": platform.python_version(),
+            "cpuCount": os.cpu_count(),
+        },
+        "config": {
+            "stock": stock_symbol,
+            "requests": requests,
+            "asyncDelaySeconds": async_delay_seconds,
+        },
+        "results": results,
+    }
@@ -1,10 +1,11 @@
-from typing import Optional
+from typing import List, Optional
 import pytz
 import uuid
 import logging
 from abc import ABC, abstractmethod
 from bson.objectid import ObjectId
-from api.common.constants import VALID_CURRENCIES
+from api.analysis.backtest import DEFAULT_BACKTEST_HORIZONS, DEFAULT_BACKTEST_WINDOW
+from api.common.constants import STOCK_PLOT_CHART_TYPES, VALID_CURRENCIES
 from api.common.models import BaseModel as CommonBaseModel
 from api.util.util import check_asset_available, get_current_time_utc
 from api.db.setup import db
@@ -124,6 +125,22 @@ class CreateStockPlotRequest(BaseModel):
         return stock
 
 
+class CreateStockPlotsRequest(CreateStockPlotRequest):
+    charts: List[str] = STOCK_PLOT_CHART_TYPES
+
+    @field_validator("charts")
+    @classmethod
+    def check_charts(cls, charts: List[str], info: ValidationInfo) -> List[str]:
+        if not charts:
+            raise ValueError(f"{info.field_name} must not be empty")
+        invalid_charts = [i for i in charts if i not in STOCK_PLOT_CHART_TYPES]
+        if invalid_charts:
+            raise ValueError(
+                f"{info.field_name} must be in {', '.join(STOCK_PLOT_CHART_TYPES)}"
+            )
+        return list(dict.fromkeys(charts))
+
+
 class PricePredictionRequest(BaseModel):
     runs: int
     stock: str
@@ -203,6 +220,51 @@ class CreateStockCumulativeReturnsPlotRequest(BaseModel):
         return stocks
 
 
+class BacktestRequest(BaseModel):
+    stocks: str
+    years: Optional[int] = 3
+    window: Optional[int] = DEFAULT_BACKTEST_WINDOW
+    horizons: Optional[List[int]] = DEFAULT_BACKTEST_HORIZONS
+
+    @field_validator("years")
+    @classmethod
+    def check_years(cls, v: int, info: ValidationInfo) -> int:
+        if v < 1 or v > 10:
+            raise ValueError(f"{info.field_name} must be between 1 and 10 inclusive")
+        return v
+
+    @field_validator("window")
+    @classmethod
+    def check_window(cls, v: int, info: ValidationInfo) -> int:
+        if v < 20 or v > 756:
+            raise ValueError(f"{info.field_name} must be between 20 and 756 inclusive")
+        return v
+
+    @field_validator("horizons")
+    @classmethod
+    def check_horizons(cls, v: List[int], info: ValidationInfo) -> List[int]:
+        if not v or len(v) > 10 or any(i < 1 or i > 504 for i in v):
+            raise ValueError(
+                f"{info.field_name} must contain up to ten horizons between 1 and 504 days"
+            )
+        return v
+
+    @field_validator("stocks")
+    @classmethod
+    def check_stock(cls, stocks: str, info: ValidationInfo) -> str:
+        tickers_list = stocks.split(",")
+
+        if len(tickers_list) > 10:
+            raise ValueError(f"{info.field_name} must contain maximum ten stocks")
+
+        if not all(check_asset_available(stock) for stock in tickers_list):
+            raise ValueError(
+                f"{info.field_name} must contain valid stock symbols in comma separated string"
+            )
+
+        return stocks
+
+
 class AbstractPredictionResult(ABC):
     @abstractmethod
     def return_stock_symbol(self):
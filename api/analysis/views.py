@@ -4,13 +4,13 @@ from datetime import datetime
 from itertools import chain, repeat
 import statistics
 import traceback
-from flask import Blueprint, jsonify, make_response, request
+from flask import Blueprint, jsonify, request
 import httpx
 from matplotlib.dates import relativedelta
 import numpy as np
 from api.db.setup import db
 from bson.objectid import ObjectId
-from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pydantic import ValidationError
 from functools import cmp_to_key
 import time
@@ -19,42 +19,52 @@ import logging
 import heapq
 import json
 import yfinance as yf
-import matplotlib
-import matplotlib.pyplot as plt
 import math
 import multiprocessing
 from google.cloud import pubsub_v1
 from api.auth.auth import auth_required
 from api.common.constants import (
     ANALYSIS_JOB_CREATION_DAILY_LIMIT,
-    ASSETS_PLOTS_BUCKET_NAME,
     DATETIME_FORMATE_CODE,
     DEFAULT_TARGET_PE_RATIO,
     PANDAS_DF_DATE_FORMATE_CODE,
+    PRICE_PREDICTION_ASYNC_DELAY_SECONDS,
     TOPIC_NAME,
     VALID_CURRENCIES,
 )
 from api.util.util import (
     download_with_fallback,
     generate_dividend_yield_df,
+    generate_dividend_yield_df_from_history,
     generate_monthly_mean_close_df,
     generate_response,
     generate_stock_fair_value,
     get_currency_impact_stock_return_df,
     predict_price_linear_regression,
     return_delta,
-    generate_figure_blob_filename,
     get_years_ago_formatted,
     validate_date_string_for_pandas_df,
     value_is_true,
 )
-from api.util.cloud_storage_connector import CloudStorageConnector
+from api.util.csv_stream import generate_csv_stream_response, split_df
+from api.util.plot_cache import plot_cache
+from api.util.price_history import price_history_store
+from api.util.plot_renderer import plot_renderer
+from api.util.series_response import (
+    downsample_series,
+    generate_series_response,
+    get_series_format,
+    get_series_max_points,
+)
 from api.exception.models import BadRequestException
+from api.analysis.backtest import run_backtest
 from api.analysis.models import (
     AnalyseCurrencyImpactOnReturnRequest,
     AnalysisJob,
+    BacktestRequest,
     CreateStockCumulativeReturnsPlotRequest,
     CreateStockPlotRequest,
+    CreateStockPlotsRequest,
     AnalysisJobRequest,
     CustomCounter,
     PredictionResult,
@@ -63,8 +73,6 @@ from api.analysis.models import (
 from api.record.models import Record
 from sklearn.linear_model import LinearRegression
 
-matplotlib.use("agg")
-
 bp = Blueprint("analysis", __name__)
 
 
@@ -465,10 +473,91 @@ def handle_pubsub_subscription_push():
     return ("", 204)
 
 
+def _draw_stock_volatility_plot(fig, data, stock_ticker: str):
+    ax = fig.add_subplot()
+    data[stock_ticker].plot(ax=ax, color="b")
+    ax2 = data.vol.plot(secondary_y=True, ax=ax, color="k")
+
+    ax.set_ylabel("Closing Price")
+    ax2.set_ylabel("Volatility")
+
+    # Plot the grid lines
+    ax.grid(which="major", color="k", linestyle="-.", linewidth=0.5)
+
+    ax.set_title(f"{stock_ticker} Chart", fontsize=16)
+
+
+def _draw_stock_plot(fig, data, tickers_list, rolling_average_days, target_price):
+    ax = fig.add_subplot()
+    ax.plot(data.index, data[tickers_list], label="Close Price")
+
+    if len(tickers_list) == 1:
+        ax.plot(
+            data.index,
+            data["rolling_avg"],
+            label=f"{rolling_average_days}-Day Rolling Average",
+        )
+        if target_price:
+            ax.axhline(
+                y=float(target_price),
+                color="r",
+                label=f"Target Price: ${target_price}",
+            )
+        ax.plot(
+            data.index,
+            data["linear_fit"],
+            label="Linear fit",
+            linestyle="--",
+            lw=1,
+            color="red",
+        )
+        ax.legend()
+    else:
+        ax.legend(tickers_list)
+
+    ax.set_title(f"{','.join(tickers_list)} Chart", fontsize=16)
+
+    # Define the labels
+    ax.set_ylabel("Close Price", fontsize=14)
+    ax.set_xlabel("Time", fontsize=14)
+
+    # Plot the grid lines
+    ax.grid(which="major", color="k", linestyle="-.", linewidth=0.5)
+
+
+def _generate_stock_plot_series(
+    data, tickers_list, secondary_axis: bool, rolling_average_days: int
+):
+    """Adds the volatility, or rolling average and linear fit, of a single stock"""
+    if len(tickers_list) != 1:
+        return data
+
+    first_stock_ticker = tickers_list[0]
+    if secondary_axis:
+        data["vol"] = data[first_stock_ticker].pct_change().rolling(
+            window=21
+        ).std() * math.sqrt(252)
+        return data
+
+    data["rolling_avg"] = (
+        data[first_stock_ticker].rolling(window=rolling_average_days).mean()
+    )
+    x = data.index.values.astype(float).reshape(-1, 1)
+    y = data[first_stock_ticker].values.reshape(-1, 1)
+
+    lm = LinearRegression()
+    lm.fit(x, y)
+    data["linear_fit"] = lm.predict(x).ravel()
+    return data
+
+
 @bp.route("/generate-stock-plot", methods=(["POST"]))
 @auth_required
 def generate_stock_plot_gcs_blob(_):
 
+    series_format = get_series_format()
+    max_points = get_series_max_points()
+
     base_currency = request.args.get("baseCurrency", default=None, type=None)
     quote_currency = request.args.get("quoteCurrency", default=None, type=None)
 
@@ -524,89 +613,46 @@ def generate_stock_plot_gcs_blob(_):
             data = yf.download(tickers_list, get_years_ago_formatted(years_ago))[
                 "Close"
             ]
-        y_label = "Close Price"
-
-        # data.plot(figsize=(10, 6))
-
-        _ = plt.figure(num=1, clear=True, figsize=(10, 6))
-        plt.plot(data.index, data[tickers_list], label="Close Price")
-
-        x = data.index
-
-        if len(tickers_list) == 1:
-
-            if secondary_axis:
-                data["vol"] = data[first_stock_ticker].pct_change().rolling(
-                    window=21
-                ).std() * math.sqrt(252)
 
-                ax = data[first_stock_ticker].plot(color="b")
-                ax2 = data.vol.plot(secondary_y=True, ax=ax, color="k")
-
-                ax.set_ylabel("Closing Price")
-                ax2.set_ylabel("Volatility")
-
-                # Plot the grid lines
-                plt.grid(which="major", color="k", linestyle="-.", linewidth=0.5)
-
-                plt.title(f"{first_stock_ticker} Chart", fontsize=16)
-
-                fig_to_upload = plt.gcf()
-                cloud_storage_connector = CloudStorageConnector(
-                    bucket_name=ASSETS_PLOTS_BUCKET_NAME
-                )
-                file_name = generate_figure_blob_filename("time-series")
-                blob_public_url = cloud_storage_connector.upload_pyplot_figure(
-                    fig_to_upload, file_name
-                )
-                return jsonify({"image_url": blob_public_url}), 200
-
-            data["rolling_avg"] = (
-                data[first_stock_ticker].rolling(window=rolling_average_days).mean()
-            )
-            plt.plot(
-                data.index,
-                data["rolling_avg"],
-                label=f"{rolling_average_days}-Day Rolling Average",
+        data = _generate_stock_plot_series(
+            data, tickers_list, secondary_axis, rolling_average_days
+        )
+        data = downsample_series(data, max_points)
+        if series_format != "png":
+            return generate_series_response(
+                data, series_format, tickers=tickers_list, targetPrice=target_price
             )
-            if target_price:
-                plt.axhline(
-                    y=float(target_price),
-                    color="r",
-                    label=f"Target Price: ${target_price}",
-                )
-            y = data[first_stock_ticker].values.reshape(-1, 1)
-
-            lm = LinearRegression()
-            lm.fit(x.values.reshape(-1, 1), y)
 
-            predictions = lm.predict(x.values.astype(float).reshape(-1, 1))
-            plt.plot(
-                x, predictions, label="Linear fit", linestyle="--", lw=1, color="red"
+        def render():
+            if len(tickers_list) == 1 and secondary_axis:
+                return plot_renderer.render(
+                    _draw_stock_volatility_plot, data, first_stock_ticker
+                )
+            return plot_renderer.render(
+                _draw_stock_plot,
+                data,
+                tickers_list,
+                rolling_average_days,
+                target_price,
             )
-            plt.legend()
-        else:
-            plt.legend(tickers_list)
-
-        plt.title(f"{','.join(tickers_list)} Chart", fontsize=16)
-
-        # Define the labels
-        plt.ylabel(y_label, fontsize=14)
-        plt.xlabel("Time", fontsize=14)
 
-        # Plot the grid lines
-        plt.grid(which="major", color="k", linestyle="-.", linewidth=0.5)
-
-        fig_to_upload = plt.gcf()
-        cloud_storage_connector = CloudStorageConnector(
-            bucket_name=ASSETS_PLOTS_BUCKET_NAME
-        )
-        file_name = generate_figure_blob_filename("time-series")
-        blob_public_url = cloud_storage_connector.upload_pyplot_figure(
-            fig_to_upload, file_name
+        blob_public_url = plot_cache.get_or_create(
+            "time-series",
+            {
+                "tickers": tickers_list,
+                "years": years_ago,
+                "rollingAverageDays": rolling_average_days,
+                "targetPrice": target_price,
+                "secondaryAxis": secondary_axis,
+                "maxPoints": max_points,
+            },
+            data.index.max(),
+            render,
         )
         return jsonify({"image_url": blob_public_url}), 200
 
+    except BadRequestException:
+        raise
     except Exception as e:
         logging.error(e)
         return (
@@ -615,10 +661,26 @@ def generate_stock_plot_gcs_blob(_):
         )
 
 
+def _draw_cumulative_returns_plot(fig, cumulative_returns, title: str):
+    ax = fig.add_subplot()
+    cumulative_returns.plot(ax=ax)
+    ax.set_title(title, fontsize=16)
+    ax.legend()
+
+    # Define the labels
+    ax.set_ylabel("Cumulative Returns", fontsize=14)
+    ax.set_xlabel("Time", fontsize=14)
+
+    # Plot the grid lines
+    ax.grid(which="major", color="k", linestyle="-.", linewidth=0.5)
+
+
 @bp.route("/generate-stocks-cumulative-returns-plot", methods=(["POST"]))
 @auth_required
 def generate_stock_cumulative_returns_plot_gcs_blob(_):
 
+    series_format = get_series_format()
+    max_points = get_series_max_points()
     try:
         plot_request = CreateStockCumulativeReturnsPlotRequest.model_validate_json(
             request.data
@@ -645,31 +707,37 @@ def generate_stock_cumulative_returns_plot_gcs_blob(_):
             daily_returns = data.pct_change()
             sector_returns = daily_returns.T.groupby(sector_map).mean().T
             cumulative_returns = (1 + sector_returns).cumprod()
-            cumulative_returns.plot(figsize=(10, 7))
-            plt.title("Cumulative Stock Returns Grouped by Sector", fontsize=16)
+            title = "Cumulative Stock Returns Grouped by Sector"
         else:
-            ((data.pct_change().fillna(0) + 1).cumprod()).plot(figsize=(10, 7))
-            plt.title("Cumulative Stocks Returns", fontsize=16)
-
-        y_label = "Cumulative Returns"
-        plt.legend()
+            cumulative_returns = (data.pct_change().fillna(0) + 1).cumprod()
+            title = "Cumulative Stocks Returns"
 
-        # Define the labels
-        plt.ylabel(y_label, fontsize=14)
-        plt.xlabel("Time", fontsize=14)
+        cumulative_returns = downsample_series(cumulative_returns, max_points)
+        if series_format != "png":
+            return generate_series_response(
+                cumulative_returns, series_format, title=title
+            )
 
-        # Plot the grid lines
-        plt.grid(which="major", color="k", linestyle="-.", linewidth=0.5)
-        fig_to_upload = plt.gcf()
-        cloud_storage_connector = CloudStorageConnector(
-            bucket_name=ASSETS_PLOTS_BUCKET_NAME
-        )
-        file_name = generate_figure_blob_filename("time-series")
-        blob_public_url = cloud_storage_connector.upload_pyplot_figure(
-            fig_to_upload, file_name
+        blob_public_url = plot_cache.get_or_create(
+            "cumulative-returns",
+            {
+                "tickers": tickers,
+                "years": plot_request.years,
+                "groupBySector": plot_request.groupBySector,
+                "maxPoints": max_points,
+            },
+            data.index.max(),
+            lambda: plot_renderer.render(
+                _draw_cumulative_returns_plot,
+                cumulative_returns,
+                title,
+                figsize=(10, 7),
+            ),
         )
         return jsonify({"image_url": blob_public_url}), 200
 
+    except BadRequestException:
+        raise
     except Exception as e:
         logging.error(e)
         return (
@@ -686,19 +754,13 @@ def export_stock_analysis_csv():
     if not stock_symbol:
         raise BadRequestException("Provide a stock symbol", status_code=400)
 
-    data = yf.Ticker(stock_symbol)
-    df = data.history(period="1y")
+    df = price_history_store.get_history(stock_symbol, 1)
 
-    response = make_response(df.to_csv())
-    response.headers["Content-Disposition"] = (
-        f"attachment; filename={datetime.today().strftime(DATETIME_FORMATE_CODE)}.csv"
-    )
-    response.mimetype = "text/csv"
-    return response
+    return generate_csv_stream_response(split_df(df), index_label="Date")
 
 
 async def predict_price_async(stock_symbol: str):
-    await asyncio.sleep(5)
+    await asyncio.sleep(PRICE_PREDICTION_ASYNC_DELAY_SECONDS)
     price_prediction = round(
         predict_price_linear_regression(
             stock_symbol=stock_symbol, data_years_ago=1, prediction_years_future=1
@@ -743,10 +805,49 @@ async def get_price_prediction_async():
     )
 
 
+@bp.route("/analysis/backtest", methods=(["POST"]))
+@auth_required
+def backtest_price_prediction(_):
+
+    try:
+        backtest_request = BacktestRequest.model_validate_json(request.data)
+    except ValidationError as e:
+        logging.error(e)
+        return jsonify({"message": "Invalid payload"}), 400
+
+    try:
+        results = run_backtest(
+            backtest_request.stocks.split(","),
+            backtest_request.years,
+            window=backtest_request.window,
+            horizons=backtest_request.horizons,
+        )
+    except ValueError as e:
+        raise BadRequestException(str(e), status_code=400)
+
+    return jsonify({"results": results}), 200
+
+
+def _draw_monthly_mean_close_plot(fig, monthly_mean_close_df, stock_symbol: str):
+    ax = fig.add_subplot()
+    ax.plot(
+        monthly_mean_close_df["Date"],
+        monthly_mean_close_df["Monthly Average"],
+        label="Monthly Average Close",
+    )
+
+    ax.set_title(f"{stock_symbol.upper()} Monthly Average Close", fontsize=14)
+    ax.set_xlabel("Month", fontsize=12)
+    ax.set_ylabel("Monthly Average Close", fontsize=12)
+
+    ax.tick_params(axis="x", labelrotation=50, labelsize=10)
+
+
 @bp.route("/generate-stock-mean-close-plot", methods=(["POST"]))
 @auth_required
 def generate_stock_mean_close_plot_gcs_blob(_):
 
+    series_format = get_series_format()
     try:
         create_stock_plot_request = CreateStockPlotRequest.model_validate_json(
             request.data
@@ -763,30 +864,28 @@ def generate_stock_mean_close_plot_gcs_blob(_):
         df = data.history(period=f"{years_ago}y")
         monthly_mean_close_df = generate_monthly_mean_close_df(df)
 
-        plt.figure(figsize=(10, 10))
-
-        plt.plot(
-            monthly_mean_close_df["Date"],
-            monthly_mean_close_df["Monthly Average"],
-            label="Monthly Average Close",
-        )
-
-        plt.title(f"{stock_symbol.upper()} Monthly Average Close", fontsize=14)
-        plt.xlabel("Month", fontsize=12)
-        plt.ylabel("Monthly Average Close", fontsize=12)
-
-        plt.xticks(rotation=50, fontsize=10)
+        if series_format != "png":
+            return generate_series_response(
+                monthly_mean_close_df.set_index("Date"),
+                series_format,
+                stock=stock_symbol,
+            )
 
-        fig_to_upload = plt.gcf()
-        cloud_storage_connector = CloudStorageConnector(
-            bucket_name=ASSETS_PLOTS_BUCKET_NAME
-        )
-        file_name = generate_figure_blob_filename("mean-close")
-        blob_public_url = cloud_storage_connector.upload_pyplot_figure(
-            fig_to_upload, file_name
+        blob_public_url = plot_cache.get_or_create(
+            "mean-close",
+            {"stock": stock_symbol, "years": years_ago},
+            df.index.max(),
+            lambda: plot_renderer.render(
+                _draw_monthly_mean_close_plot,
+                monthly_mean_close_df,
+                stock_symbol,
+                figsize=(10, 10),
+            ),
         )
         return jsonify({"image_url": blob_public_url}), 200
 
+    except BadRequestException:
+        raise
     except Exception as e:
         logging.error(e)
         return jsonify({"message": "Generate stock mean close plot failed"}), 500
@@ -928,10 +1027,39 @@ def get_price_prediction_generator():
     )
 
 
+def _draw_close_daily_return_plot(fig, df, stock_symbol: str):
+    axs = fig.subplots(2)
+    fig.suptitle(f"{stock_symbol} Daily Change")
+
+    axs[0].plot(df.index, df["Daily Return"])
+    axs[1].plot(df.index, df["Volatility"])
+
+    axs[1].set_xlabel("Date")
+
+    axs[0].set_ylabel("Close Percentage Change")
+    axs[1].set_ylabel("Volatility")
+
+    # Plot the grid lines
+    axs[1].grid(which="major", color="k", linestyle="-.", linewidth=0.5)
+    fig.autofmt_xdate()
+
+
+def _generate_close_daily_return_series(df):
+    df["Daily Return"] = round(df["Close"].pct_change() * 100, 2)
+    df["Volatility"] = round(
+        df["Daily Return"].rolling(window=21).std() * math.sqrt(252), 2
+    )
+
+    df.dropna(subset=["Daily Return"])
+    return df[["Close", "Daily Return", "Volatility"]]
+
+
 @bp.route("/generate-stock-close-daily-return-plot", methods=(["POST"]))
 @auth_required
 def generate_stock_close_daily_return_plot_gcs_blob(_):
 
+    series_format = get_series_format()
+    max_points = get_series_max_points()
     try:
         create_stock_plot_request = CreateStockPlotRequest.model_validate_json(
             request.data
@@ -944,39 +1072,28 @@ def generate_stock_close_daily_return_plot_gcs_blob(_):
     years_ago = create_stock_plot_request.years
 
     try:
-        data = yf.Ticker(stock_symbol)
-        df = data.history(period=f"{years_ago}y")
-        df["Daily Return"] = round(df["Close"].pct_change() * 100, 2)
-        df["Volatility"] = round(
-            df["Daily Return"].rolling(window=21).std() * math.sqrt(252), 2
+        df = downsample_series(
+            _generate_close_daily_return_series(
+                yf.Ticker(stock_symbol).history(period=f"{years_ago}y")
+            ),
+            max_points,
         )
 
-        df.dropna(subset=["Daily Return"])
-
-        fig, axs = plt.subplots(2, figsize=(10, 8))
-        fig.suptitle(f"{stock_symbol} Daily Change")
+        if series_format != "png":
+            return generate_series_response(df, series_format, stock=stock_symbol)
 
-        axs[0].plot(df.index, df["Daily Return"])
-        axs[1].plot(df.index, df["Volatility"])
-
-        axs[1].set_xlabel("Date")
-
-        axs[0].set_ylabel("Close Percentage Change")
-        axs[1].set_ylabel("Volatility")
-
-        # Plot the grid lines
-        plt.grid(which="major", color="k", linestyle="-.", linewidth=0.5)
-        fig.autofmt_xdate()
-        fig_to_upload = plt.gcf()
-        cloud_storage_connector = CloudStorageConnector(
-            bucket_name=ASSETS_PLOTS_BUCKET_NAME
-        )
-        file_name = generate_figure_blob_filename("close-daily-change")
-        blob_public_url = cloud_storage_connector.upload_pyplot_figure(
-            fig_to_upload, file_name
+        blob_public_url = plot_cache.get_or_create(
+            "close-daily-change",
+            {"stock": stock_symbol, "years": years_ago, "maxPoints": max_points},
+            df.index.max(),
+            lambda: plot_renderer.render(
+                _draw_close_daily_return_plot, df, stock_symbol, figsize=(10, 8)
+            ),
         )
         return jsonify({"image_url": blob_public_url}), 200
 
+    except BadRequestException:
+        raise
     except Exception as e:
         logging.error(e)
         return (
@@ -1028,10 +1145,29 @@ def analyse_currency_impact_on_return(_):
     )
 
 
+def _draw_currency_impact_plot(fig, data, stock_symbol: str, currency: str):
+    ax = fig.add_subplot()
+    ax.plot(
+        data.index,
+        data[["Cumulative_Local_Return", "Cumulative_USD_Return"]],
+        label="Close Price",
+    )
+
+    ax.set_title(f"{currency} currency impact on {stock_symbol} return", fontsize=16)
+    ax.legend([f"Cumulative {currency} return", "Cumulative USD return"])
+    ax.set_ylabel("Cumulative return percentage", fontsize=14)
+    ax.set_xlabel("Time", fontsize=14)
+
+    # Plot the grid lines
+    ax.grid(which="major", color="k", linestyle="-.", linewidth=0.5)
+
+
 @bp.route("/generate-currency-impact-plot", methods=(["POST"]))
 @auth_required
 def generate_currency_impact_on_return_plot(_):
 
+    series_format = get_series_format()
+    max_points = get_series_max_points()
     try:
         impact_request = AnalyseCurrencyImpactOnReturnRequest.model_validate_json(
             request.data
@@ -1048,28 +1184,27 @@ def generate_currency_impact_on_return_plot(_):
     data.dropna()
     data["Cumulative_Local_Return"] = data["Cumulative_Local_Return"] * 100
     data["Cumulative_USD_Return"] = data["Cumulative_USD_Return"] * 100
-
-    plt.figure(figsize=(10, 6))
-    plt.plot(
-        data.index,
-        data[["Cumulative_Local_Return", "Cumulative_USD_Return"]],
-        label="Close Price",
+    data = downsample_series(
+        data[["Cumulative_Local_Return", "Cumulative_USD_Return"]], max_points
     )
 
-    plt.title(f"{currency} currency impact on {stock_symbol} return", fontsize=16)
-    plt.legend([f"Cumulative {currency} return", "Cumulative USD return"])
-    plt.ylabel("Cumulative return percentage", fontsize=14)
-    plt.xlabel("Time", fontsize=14)
+    if series_format != "png":
+        return generate_series_response(
+            data, series_format, stock=stock_symbol, currency=currency
+        )
 
-    # Plot the grid lines
-    plt.grid(which="major", color="k", linestyle="-.", linewidth=0.5)
-    fig_to_upload = plt.gcf()
-    cloud_storage_connector = CloudStorageConnector(
-        bucket_name=ASSETS_PLOTS_BUCKET_NAME
-    )
-    file_name = generate_figure_blob_filename("currency-impact-return")
-    blob_public_url = cloud_storage_connector.upload_pyplot_figure(
-        fig_to_upload, file_name
+    blob_public_url = plot_cache.get_or_create(
+        "currency-impact-return",
+        {
+            "stock": stock_symbol,
+            "years": years_ago,
+            "currency": currency,
+            "maxPoints": max_points,
+        },
+        data.index.max(),
+        lambda: plot_renderer.render(
+            _draw_currency_impact_plot, data, stock_symbol, currency
+        ),
     )
     return jsonify({"image_url": blob_public_url}), 200
 
@@ -1094,10 +1229,28 @@ def get_stock_dividends_analysis(_):
     )
 
 
+def _draw_dividend_yield_plot(fig, stock_dividends_df, stock_symbol: str):
+    ax = fig.add_subplot()
+    ax.plot(
+        stock_dividends_df.index,
+        stock_dividends_df["TTM_Yield_%"],
+        label="TTM Dividend Yield",
+        linewidth=2,
+    )
+    ax.set_title(f"{stock_symbol.upper()} Dividend Yield History")
+    ax.set_ylabel("Yield (%)")
+    ax.set_xlabel("Date")
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+
+
 @bp.route("/generate-stock-dividends-plot", methods=(["POST"]))
 @auth_required
 def generate_stock_dividends_plot_gcs_blob(_):
 
+    series_format = get_series_format()
+    max_points = get_series_max_points()
     try:
         create_stock_plot_request = CreateStockPlotRequest.model_validate_json(
             request.data
@@ -1108,37 +1261,56 @@ def generate_stock_dividends_plot_gcs_blob(_):
 
     stock_symbol = create_stock_plot_request.stock
     years_ago = create_stock_plot_request.years
-    stock_dividends_df = generate_dividend_yield_df(stock_symbol, years_ago)
-
-    plt.figure(figsize=(10, 6))
-    plt.plot(
-        stock_dividends_df.index,
-        stock_dividends_df["TTM_Yield_%"],
-        label="TTM Dividend Yield",
-        linewidth=2,
-    )
-    plt.title(f"{stock_symbol.upper()} Dividend Yield History")
-    plt.ylabel("Yield (%)")
-    plt.xlabel("Date")
-    plt.legend()
-    plt.grid(True, alpha=0.3)
-    plt.tight_layout()
-
-    fig_to_upload = plt.gcf()
-    cloud_storage_connector = CloudStorageConnector(
-        bucket_name=ASSETS_PLOTS_BUCKET_NAME
+    stock_dividends_df = downsample_series(
+        generate_dividend_yield_df(stock_symbol, years_ago)[
+            ["Close", "TTM_Dividend", "TTM_Yield_%"]
+        ],
+        max_points,
     )
-    file_name = generate_figure_blob_filename("dividends")
-    blob_public_url = cloud_storage_connector.upload_pyplot_figure(
-        fig_to_upload, file_name
+
+    if series_format != "png":
+        return generate_series_response(
+            stock_dividends_df, series_format, stock=stock_symbol
+        )
+
+    blob_public_url = plot_cache.get_or_create(
+        "dividends",
+        {"stock": stock_symbol, "years": years_ago, "maxPoints": max_points},
+        stock_dividends_df.index.max(),
+        lambda: plot_renderer.render(
+            _draw_dividend_yield_plot, stock_dividends_df, stock_symbol
+        ),
     )
     return jsonify({"image_url": blob_public_url}), 200
 
 
+def _draw_roi_plot(fig, data, stock_symbol: str):
+    ax = fig.add_subplot()
+    ax.set_title(f"{stock_symbol} return on investment", fontsize=16)
+    ax.set_ylabel("ROI percentage", fontsize=14)
+    ax.set_xlabel("Time", fontsize=14)
+    ax.plot(data.index, data["Cumulative_ROI"])
+
+    ax.grid(True, alpha=0.3)
+    fig.tight_layout()
+
+
+def _generate_roi_series(data):
+    data["Previous_Close"] = data["Close"].shift(1)
+    data["Daily_Return"] = (data["Close"] - data["Previous_Close"]) / data[
+        "Previous_Close"
+    ]
+
+    data["Cumulative_ROI"] = ((1 + data["Daily_Return"]).cumprod() - 1) * 100
+    return data[["Close", "Cumulative_ROI"]]
+
+
 @bp.route("/generate-stock-roi-plot", methods=(["POST"]))
 @auth_required
 def generate_stock_roi_plot_gcs_blob(_):
 
+    series_format = get_series_format()
+    max_points = get_series_max_points()
     try:
         create_stock_plot_request = CreateStockPlotRequest.model_validate_json(
             request.data
@@ -1150,33 +1322,150 @@ def generate_stock_roi_plot_gcs_blob(_):
     stock_symbol = create_stock_plot_request.stock
     years_ago = create_stock_plot_request.years
 
-    data = yf.Ticker(stock_symbol).history(period=f"{years_ago}y")
+    data = downsample_series(
+        _generate_roi_series(yf.Ticker(stock_symbol).history(period=f"{years_ago}y")),
+        max_points,
+    )
 
-    data["Previous_Close"] = data["Close"].shift(1)
-    data["Daily_Return"] = (data["Close"] - data["Previous_Close"]) / data[
-        "Previous_Close"
-    ]
+    if series_format != "png":
+        return generate_series_response(data, series_format, stock=stock_symbol)
 
-    data["Cumulative_ROI"] = ((1 + data["Daily_Return"]).cumprod() - 1) * 100
+    blob_public_url = plot_cache.get_or_create(
+        "roi",
+        {"stock": stock_symbol, "years": years_ago, "maxPoints": max_points},
+        data.index.max(),
+        lambda: plot_renderer.render(_draw_roi_plot, data, stock_symbol),
+    )
+    return jsonify({"image_url": blob_public_url}), 200
 
-    plt.figure(figsize=(10, 6))
-    plt.title(f"{stock_symbol} return on investment", fontsize=16)
-    plt.ylabel("ROI percentage", fontsize=14)
-    plt.xlabel("Time", fontsize=14)
-    plt.plot(data.index, data["Cumulative_ROI"])
 
-    plt.grid(True, alpha=0.3)
-    plt.tight_layout()
+@bp.route("/generate-stock-plots", methods=(["POST"]))
+@auth_required
+def generate_stock_plots_gcs_blobs(_):
 
-    fig_to_upload = plt.gcf()
-    cloud_storage_connector = CloudStorageConnector(
-        bucket_name=ASSETS_PLOTS_BUCKET_NAME
-    )
-    file_name = generate_figure_blob_filename("roi")
-    blob_public_url = cloud_storage_connector.upload_pyplot_figure(
-        fig_to_upload, file_name
-    )
-    return jsonify({"image_url": blob_public_url}), 200
+    max_points = get_series_max_points()
+    try:
+        create_stock_plots_request = CreateStockPlotsRequest.model_validate_json(
+            request.data
+        )
+    except ValidationError as e:
+        logging.error(e)
+        return jsonify({"message": "Invalid payload"}), 400
+
+    stock_symbol = create_stock_plots_request.stock
+    years_ago = create_stock_plots_request.years
+    inputs = {"stock": stock_symbol, "years": years_ago, "maxPoints": max_points}
+
+    # one download serves every chart, adjusted closes for returns and raw closes
+    # and dividends for yields
+    history = yf.Ticker(stock_symbol).history(period=f"{years_ago}y", auto_adjust=False)
+    if history.empty:
+        raise BadRequestException(
+            f"No data found for ticker {stock_symbol}", status_code=400
+        )
+
+    def adjusted_close():
+        return history[["Adj Close"]].rename(columns={"Adj Close": "Close"})
+
+    def time_series_plot():
+        data = downsample_series(
+            _generate_stock_plot_series(
+                adjusted_close().rename(columns={"Close": stock_symbol}),
+                [stock_symbol],
+                False,
+                50,
+            ),
+            max_points,
+        )
+        return plot_cache.get_or_create(
+            "time-series",
+            {
+                "tickers": [stock_symbol],
+                "years": years_ago,
+                "rollingAverageDays": 50,
+                "targetPrice": None,
+                "secondaryAxis": False,
+                "maxPoints": max_points,
+            },
+            data.index.max(),
+            lambda: plot_renderer.render(
+                _draw_stock_plot, data, [stock_symbol], 50, None
+            ),
+        )
+
+    def roi_plot():
+        data = downsample_series(_generate_roi_series(adjusted_close()), max_points)
+        return plot_cache.get_or_create(
+            "roi",
+            inputs,
+            data.index.max(),
+            lambda: plot_renderer.render(_draw_roi_plot, data, stock_symbol),
+        )
+
+    def close_daily_change_plot():
+        df = downsample_series(
+            _generate_close_daily_return_series(adjusted_close()), max_points
+        )
+        return plot_cache.get_or_create(
+            "close-daily-change",
+            inputs,
+            df.index.max(),
+            lambda: plot_renderer.render(
+                _draw_close_daily_return_plot, df, stock_symbol, figsize=(10, 8)
+            ),
+        )
+
+    def mean_close_plot():
+        monthly_mean_close_df = generate_monthly_mean_close_df(adjusted_close())
+        return plot_cache.get_or_create(
+            "mean-close",
+            {"stock": stock_symbol, "years": years_ago},
+            history.index.max(),
+            lambda: plot_renderer.render(
+                _draw_monthly_mean_close_plot,
+                monthly_mean_close_df,
+                stock_symbol,
+                figsize=(10, 10),
+            ),
+        )
+
+    def dividends_plot():
+        stock_dividends_df = downsample_series(
+            generate_dividend_yield_df_from_history(history, history["Dividends"])[
+                ["Close", "TTM_Dividend", "TTM_Yield_%"]
+            ],
+            max_points,
+        )
+        return plot_cache.get_or_create(
+            "dividends",
+            inputs,
+            stock_dividends_df.index.max(),
+            lambda: plot_renderer.render(
+                _draw_dividend_yield_plot, stock_dividends_df, stock_symbol
+            ),
+        )
+
+    plots = {
+        "time-series": time_series_plot,
+        "roi": roi_plot,
+        "close-daily-change": close_daily_change_plot,
+        "mean-close": mean_close_plot,
+        "dividends": dividends_plot,
+    }
+    charts = create_stock_plots_request.charts
+
+    try:
+        # renders are bounded by the plot renderer, the cache and uploads run here
+        with ThreadPoolExecutor(max_workers=len(charts)) as executor:
+            futures = {chart: executor.submit(plots[chart]) for chart in charts}
+            image_urls = {chart: future.result() for chart, future in futures.items()}
+        return jsonify({"image_urls": image_urls}), 200
+
+    except BadRequestException:
+        raise
+    except Exception as e:
+        logging.error(e)
+        return jsonify({"message": "Generate stock plots failed"}), 500
 
 
 @bp.route("/analysis/price-prediction-heapq", methods=(["POST"]))
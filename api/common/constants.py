@@ -26,7 +26,91 @@ TOPIC_NAME = f"projects/{GCP_PROJECT_ID}/topics/{PUB_SUB_TOPIC}"
 ORDERS_TOPIC_NAME = f"projects/{GCP_PROJECT_ID}/topics/{PUB_SUB_ORDERS_TOPIC}"
 TRADES_TOPIC_NAME = f"projects/{GCP_PROJECT_ID}/topics/{PUB_SUB_TRADES_TOPIC}"
 CHART_LABELS = ["Extreme greed", "Greed", "Neutral", "Fear", "Extreme fear"]
+STOCK_PLOT_CHART_TYPES = [
+    "time-series",
+    "roi",
+    "close-daily-change",
+    "mean-close",
+    "dividends",
+]
+
+ORDER_STATUSES = ("open", "complete")
+ORDERS_QUERY_DEFAULT_LIMIT = 1000
+ORDERS_QUERY_MAX_LIMIT = 10_000
+ORDERS_MATCH_SECONDS = int(os.environ.get("ORDERS_MATCH_SECONDS", 60 * 60))
+ORDERS_RELOAD_SECONDS = int(os.environ.get("ORDERS_RELOAD_SECONDS", 24 * 60 * 60))
+ORDERS_SYNC_OVERLAP_SECONDS = int(os.environ.get("ORDERS_SYNC_OVERLAP_SECONDS", 60))
 
 BIGQUERY_DATASET_ID = gcp_config["BIGQUERY_DATASET_ID"]
 BIGQUERY_TABLE_ID = gcp_config["BIGQUERY_TABLE_ID"]
 BIGQUERY_TABLE_ID_ORDERS = gcp_config["BIGQUERY_TABLE_ID_ORDERS"]
+
+MODEL_REGISTRY_MAX_ENTRIES = int(os.environ.get("MODEL_REGISTRY_MAX_ENTRIES", 32))
+MODEL_REGISTRY_MAX_BYTES = int(
+    os.environ.get("MODEL_REGISTRY_MAX_BYTES", 64 * 1024 * 1024)
+)
+MODEL_REGISTRY_REVALIDATE_SECONDS = int(
+    os.environ.get("MODEL_REGISTRY_REVALIDATE_SECONDS", 0)
+)
+MODEL_REGISTRY_DISK_DIR = os.environ.get("MODEL_REGISTRY_DISK_DIR")
+
+PRICE_HISTORY_CACHE_DIR = os.environ.get("PRICE_HISTORY_CACHE_DIR")
+PRICE_HISTORY_OFFLINE = os.environ.get("PRICE_HISTORY_OFFLINE", "").lower() == "true"
+PRICE_HISTORY_TTL_SECONDS = int(os.environ.get("PRICE_HISTORY_TTL_SECONDS", 60 * 60))
+
+PRICE_PREDICTION_ASYNC_DELAY_SECONDS = float(
+    os.environ.get("PRICE_PREDICTION_ASYNC_DELAY_SECONDS", 5)
+)
+
+PLOT_RENDER_MAX_WORKERS = int(os.environ.get("PLOT_RENDER_MAX_WORKERS", 2))
+PLOT_RENDER_MAX_PENDING = int(os.environ.get("PLOT_RENDER_MAX_PENDING", 8))
+PLOT_RENDER_TIMEOUT_SECONDS = int(os.environ.get("PLOT_RENDER_TIMEOUT_SECONDS", 30))
+
+PLOT_CACHE_TTL_SECONDS = int(os.environ.get("PLOT_CACHE_TTL_SECONDS", 60 * 60))
+PLOT_CACHE_MAX_ENTRIES = int(os.environ.get("PLOT_CACHE_MAX_ENTRIES", 256))
+
+STORAGE_ASYNC_UPLOADS = os.environ.get("STORAGE_ASYNC_UPLOADS", "").lower() == "true"
+STORAGE_UPLOAD_MAX_WORKERS = int(os.environ.get("STORAGE_UPLOAD_MAX_WORKERS", 4))
+STORAGE_UPLOAD_MAX_ATTEMPTS = int(os.environ.get("STORAGE_UPLOAD_MAX_ATTEMPTS", 3))
+STORAGE_UPLOAD_RETRY_BACKOFF_SECONDS = float(
+    os.environ.get("STORAGE_UPLOAD_RETRY_BACKOFF_SECONDS", 0.5)
+)
+
+SERIES_MAX_POINTS = int(os.environ.get("SERIES_MAX_POINTS", 1000))
+SERIES_DOWNSAMPLE_METHOD = os.environ.get("SERIES_DOWNSAMPLE_METHOD", "lttb")
+
+RECORDS_BATCH_SIZE = int(os.environ.get("RECORDS_BATCH_SIZE", 5000))
+RECORDS_DEBUG = os.environ.get("RECORDS_DEBUG", "").lower() == "true"
+
+LATEST_RECORD_RECONCILE_SECONDS = int(
+    os.environ.get("LATEST_RECORD_RECONCILE_SECONDS", 5 * 60)
+)
+RECORD_SERIES_REFRESH_SECONDS = int(
+    os.environ.get("RECORD_SERIES_REFRESH_SECONDS", 5 * 60)
+)
+RECORD_SERIES_RELOAD_SECONDS = int(
+    os.environ.get("RECORD_SERIES_RELOAD_SECONDS", 24 * 60 * 60)
+)
+# periods start at London midnight, on Mondays and on the first of the month
+RECORDS_RESAMPLE_RULES = {"daily": "D", "weekly": "W-MON", "monthly": "MS"}
+RECORDS_RESAMPLE_DEFAULT_WINDOW = 4
+RECORDS_RESAMPLE_MAX_WINDOW = 366
+
+CSV_STREAM_CHUNK_ROWS = int(os.environ.get("CSV_STREAM_CHUNK_ROWS", 1000))
+
+WAREHOUSE_BACKEND = os.environ.get("WAREHOUSE_BACKEND", "bigquery")
+WAREHOUSE_SQLITE_PATH = os.environ.get("WAREHOUSE_SQLITE_PATH", ":memory:")
+WAREHOUSE_LOAD_BATCH_ROWS = int(os.environ.get("WAREHOUSE_LOAD_BATCH_ROWS", 50_000))
+WAREHOUSE_QUERY_CACHE_TTL_SECONDS = int(
+    os.environ.get("WAREHOUSE_QUERY_CACHE_TTL_SECONDS", 5 * 60)
+)
+WAREHOUSE_QUERY_CACHE_MAX_ENTRIES = int(
+    os.environ.get("WAREHOUSE_QUERY_CACHE_MAX_ENTRIES", 64)
+)
+
+RECORD_HISTOGRAMS_REFRESH_SECONDS = int(
+    os.environ.get("RECORD_HISTOGRAMS_REFRESH_SECONDS", 60 * 60)
+)
+RECORD_HISTOGRAMS_REFRESH_DAYS = int(
+    os.environ.get("RECORD_HISTOGRAMS_REFRESH_DAYS", 2)
+)
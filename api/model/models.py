@@ -1,5 +1,16 @@
+import json
 from datetime import datetime
-from pydantic import BaseModel, ValidationInfo, field_validator
+from io import BytesIO
+from typing import List, Optional
+import numpy as np
+import pandas as pd
+from pydantic import (
+    BaseModel,
+    ConfigDict,
+    ValidationInfo,
+    field_validator,
+    model_validator,
+)
 
 from api.common.constants import PANDAS_DF_DATE_FORMATE_CODE
 from api.util.util import (
@@ -7,10 +18,28 @@ from api.util.util import (
     validate_date_string_for_pandas_df,
 )
 
+MODEL_FORMATS = ("pkl", "json", "npz")
+MAX_BATCH_PREDICTION_MODELS = 10
+MAX_BATCH_PREDICTION_DATES = 3 * 366
+
+
+def validate_future_date(v: str) -> str:
+    if not (validate_date_string_for_pandas_df(v)):
+        raise ValueError("Invalid date input. Must be in format DD-MM-YYYY")
+
+    now = datetime.now()
+    future_days = (datetime.strptime(v, PANDAS_DF_DATE_FORMATE_CODE) - now).days
+
+    if future_days < 1:
+        raise ValueError("Futre date must be at least one full day in future!")
+
+    return v
+
 
 class ExportModelRequest(BaseModel):
     years: int
     stock: str
+    format: Optional[str] = "pkl"
 
     @field_validator("years")
     @classmethod
@@ -26,25 +55,52 @@ class ExportModelRequest(BaseModel):
             raise ValueError(f"{info.field_name} is not a valid stock symbol")
         return stock
 
+    @field_validator("format")
+    @classmethod
+    def check_format(cls, model_format: str, info: ValidationInfo) -> str:
+        if model_format not in MODEL_FORMATS:
+            raise ValueError(f"{info.field_name} must be one of {MODEL_FORMATS}")
+        return model_format
+
 
 class PredictStockFromModelRequest(BaseModel):
+    model_config = ConfigDict(protected_namespaces=())
+
     future_date: str
     stock: str
     pkl_model_id: str
+    model_format: Optional[str] = "pkl"
 
     @field_validator("future_date")
     @classmethod
     def check_years(cls, v: str) -> str:
-        if not (validate_date_string_for_pandas_df(v)):
-            raise ValueError("Invalid date input. Must be in format DD-MM-YYYY")
+        return validate_future_date(v)
 
-        now = datetime.now()
-        future_days = (datetime.strptime(v, PANDAS_DF_DATE_FORMATE_CODE) - now).days
+    @field_validator("stock")
+    @classmethod
+    def check_stock(cls, stock: str, info: ValidationInfo) -> str:
+        if not check_asset_available(stock):
+            raise ValueError(f"{info.field_name} is not a valid stock symbol")
+        return stock
 
-        if future_days < 1:
-            raise ValueError("Futre date must be at least one full day in future!")
+    @field_validator("model_format")
+    @classmethod
+    def check_model_format(cls, model_format: str, info: ValidationInfo) -> str:
+        if model_format not in MODEL_FORMATS:
+            raise ValueError(f"{info.field_name} must be one of {MODEL_FORMATS}")
+        return model_format
 
-        return v
+
+class PredictStockFromModelBatchRequest(BaseModel):
+    model_config = ConfigDict(protected_namespaces=())
+
+    stock: str
+    pkl_model_ids: List[str]
+    model_format: Optional[str] = "pkl"
+    future_dates: Optional[List[str]] = None
+    start_date: Optional[str] = None
+    end_date: Optional[str] = None
+    step_days: int = 1
 
     @field_validator("stock")
     @classmethod
@@ -52,3 +108,121 @@ class PredictStockFromModelRequest(BaseModel):
         if not check_asset_available(stock):
             raise ValueError(f"{info.field_name} is not a valid stock symbol")
         return stock
+
+    @field_validator("pkl_model_ids")
+    @classmethod
+    def check_pkl_model_ids(cls, v: List[str], info: ValidationInfo) -> List[str]:
+        if not v or len(v) > MAX_BATCH_PREDICTION_MODELS:
+            raise ValueError(
+                f"{info.field_name} must contain between 1 and {MAX_BATCH_PREDICTION_MODELS} model IDs"
+            )
+        if len(v) != len(set(v)):
+            raise ValueError(f"{info.field_name} contains duplicated model ID!")
+        return v
+
+    @field_validator("model_format")
+    @classmethod
+    def check_model_format(cls, model_format: str, info: ValidationInfo) -> str:
+        if model_format not in MODEL_FORMATS:
+            raise ValueError(f"{info.field_name} must be one of {MODEL_FORMATS}")
+        return model_format
+
+    @field_validator("future_dates")
+    @classmethod
+    def check_future_dates(cls, v: Optional[List[str]]) -> Optional[List[str]]:
+        if v is None:
+            return v
+        return [validate_future_date(i) for i in v]
+
+    @field_validator("start_date", "end_date")
+    @classmethod
+    def check_range_date(cls, v: Optional[str]) -> Optional[str]:
+        if v is None:
+            return v
+        return validate_future_date(v)
+
+    @field_validator("step_days")
+    @classmethod
+    def check_step_days(cls, v: int, info: ValidationInfo) -> int:
+        if v < 1 or v > 31:
+            raise ValueError(f"{info.field_name} must be between 1 and 31 inclusive")
+        return v
+
+    @model_validator(mode="after")
+    def check_dates(self):
+        if bool(self.future_dates) == bool(self.start_date and self.end_date):
+            raise ValueError(
+                "Provide either future_dates or both start_date and end_date"
+            )
+        if len(self.get_future_dates()) > MAX_BATCH_PREDICTION_DATES:
+            raise ValueError(
+                f"Maximum {MAX_BATCH_PREDICTION_DATES} future dates per request"
+            )
+        return self
+
+    def get_future_dates(self) -> List[datetime]:
+        if self.future_dates:
+            return [
+                datetime.strptime(i, PANDAS_DF_DATE_FORMATE_CODE)
+                for i in self.future_dates
+            ]
+        start_date = datetime.strptime(self.start_date, PANDAS_DF_DATE_FORMATE_CODE)
+        end_date = datetime.strptime(self.end_date, PANDAS_DF_DATE_FORMATE_CODE)
+        if end_date < start_date:
+            raise ValueError("end_date must not be before start_date")
+        return list(
+            pd.date_range(
+                start_date, end_date, freq=f"{self.step_days}D"
+            ).to_pydatetime()
+        )
+
+
+class LinearTrendModel:
+    """
+    Compact alternative to a pickled LinearRegression, close price is
+    intercept + slope * days since the epoch origin.
+    """
+
+    def __init__(self, slope: float, intercept: float, origin: int):
+        self.slope = float(slope)
+        self.intercept = float(intercept)
+        self.origin = int(origin)
+
+    @classmethod
+    def from_linear_regression(cls, model, origin: datetime):
+        return cls(
+            slope=np.ravel(model.coef_)[0],
+            intercept=np.ravel(model.intercept_)[0],
+            origin=origin.timestamp(),
+        )
+
+    def days_since_origin(self, dates) -> np.ndarray:
+        """Whole days from the origin to each date, naive dates are taken as UTC"""
+        dates = np.asarray(dates, dtype="datetime64[s]")
+        return (dates - np.datetime64(self.origin, "s")) // np.timedelta64(1, "D")
+
+    def predict(self, x):
+        days = np.asarray(x, dtype=float).reshape(-1)
+        return self.intercept + self.slope * days
+
+    def to_dict(self) -> dict:
+        return {"slope": self.slope, "intercept": self.intercept, "origin": self.origin}
+
+    def to_json_bytes(self) -> bytes:
+        return json.dumps(self.to_dict(), separators=(",", ":")).encode("utf-8")
+
+    @classmethod
+    def from_json_bytes(cls, data: bytes):
+        return cls(**json.loads(data))
+
+    def to_npz_bytes(self) -> bytes:
+        buf = BytesIO()
+        np.savez(buf, slope=self.slope, intercept=self.intercept, origin=self.origin)
+        return buf.getvalue()
+
+    @classmethod
+    def from_npz_bytes(cls, data: bytes):
+        with np.load(BytesIO(data)) as npz:
+            return cls(
+                slope=npz["slope"], intercept=npz["intercept"], origin=npz["origin"]
+            )
@@ -0,0 +1,207 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from io import BytesIO
+
+import joblib
+
+from api.common.constants import (
+    ASSETS_PLOTS_BUCKET_NAME,
+    MODEL_REGISTRY_DISK_DIR,
+    MODEL_REGISTRY_MAX_BYTES,
+    MODEL_REGISTRY_MAX_ENTRIES,
+    MODEL_REGISTRY_REVALIDATE_SECONDS,
+)
+from api.model.models import LinearTrendModel
+from api.util.cloud_storage_connector import CloudStorageConnector
+
+
+def deserialize_model(model_file_name: str, model_bytes: bytes):
+    if model_file_name.endswith(".json"):
+        return LinearTrendModel.from_json_bytes(model_bytes)
+    if model_file_name.endswith(".npz"):
+        return LinearTrendModel.from_npz_bytes(model_bytes)
+    # create a file-like object in memory from the bytes
+    return joblib.load(BytesIO(model_bytes))
+
+
+class ModelRegistryEntry:
+    def __init__(self, model, generation: int, size: int):
+        self.model = model
+        self.generation = generation
+        self.size = size
+        self.validated_at = time.monotonic()
+
+
+class ModelRegistry:
+    """
+    Keeps recently used models deserialized in memory, bounded by count and size.
+
+    Misses fall through to an optional local disk tier and then to Cloud Storage.
+    Disk entries are named by a hash of the stock symbol and file name, so request
+    input never becomes a path, and by blob generation number, so a re-uploaded
+    blob is never served from a stale local copy.
+    """
+
+    def __init__(
+        self,
+        bucket_name: str,
+        max_entries: int = MODEL_REGISTRY_MAX_ENTRIES,
+        max_bytes: int = MODEL_REGISTRY_MAX_BYTES,
+        disk_dir: str = None,
+        revalidate_seconds: int = 0,
+        cloud_storage_connector: CloudStorageConnector = None,
+    ) -> None:
+        self.bucket_name = bucket_name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.disk_dir = disk_dir
+        self.revalidate_seconds = revalidate_seconds
+        self._cloud_storage_connector = cloud_storage_connector
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def cloud_storage_connector(self) -> CloudStorageConnector:
+        if self._cloud_storage_connector is None:
+            self._cloud_storage_connector = CloudStorageConnector(
+                bucket_name=self.bucket_name
+            )
+        return self._cloud_storage_connector
+
+    @staticmethod
+    def _key(stock_symbol: str, model_file_name: str) -> str:
+        return f"{stock_symbol}/{model_file_name}"
+
+    def get_model(self, stock_symbol: str, model_file_name: str):
+        """Returns the deserialized model, or None if the blob does not exist"""
+        key = self._key(stock_symbol, model_file_name)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and not self._needs_revalidation(entry):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry.model
+
+        blob = self.cloud_storage_connector.get_model_blob(
+            stock_symbol, model_file_name
+        )
+        if blob is None:
+            self.evict(stock_symbol, model_file_name)
+            return None
+
+        if entry and entry.generation == blob.generation:
+            with self._lock:
+                entry.validated_at = time.monotonic()
+                self.hits += 1
+            return entry.model
+
+        model_bytes = self._read_from_disk(key, blob.generation)
+        if model_bytes is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            model_bytes = blob.download_as_bytes(if_generation_match=blob.generation)
+            self._write_to_disk(key, blob.generation, model_bytes)
+
+        model = deserialize_model(model_file_name, model_bytes)
+        self._put(key, ModelRegistryEntry(model, blob.generation, len(model_bytes)))
+        logging.info(
+            f"Loaded model {key} generation {blob.generation} into registry ({len(model_bytes)} bytes)"
+        )
+        return model
+
+    def evict(self, stock_symbol: str, model_file_name: str):
+        key = self._key(stock_symbol, model_file_name)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry:
+                self._total_bytes -= entry.size
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "bytes": self._total_bytes,
+                "hits": self.hits,
+                "diskHits": self.disk_hits,
+                "misses": self.misses,
+            }
+
+    def _needs_revalidation(self, entry: ModelRegistryEntry) -> bool:
+        return (
+            self.revalidate_seconds > 0
+            and time.monotonic() - entry.validated_at > self.revalidate_seconds
+        )
+
+    def _put(self, key: str, entry: ModelRegistryEntry):
+        if entry.size > self.max_bytes:
+            logging.info(f"Model {key} exceeds registry size limit, not cached")
+            return
+
+        with self._lock:
+            previous_entry = self._entries.pop(key, None)
+            if previous_entry:
+                self._total_bytes -= previous_entry.size
+
+            self._entries[key] = entry
+            self._total_bytes += entry.size
+
+            while (
+                len(self._entries) > self.max_entries
+                or self._total_bytes > self.max_bytes
+            ):
+                evicted_key, evicted_entry = self._entries.popitem(last=False)
+                self._total_bytes -= evicted_entry.size
+                logging.info(f"Evicted model {evicted_key} from registry")
+
+    @staticmethod
+    def _disk_name(key: str) -> str:
+        return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+    def _disk_path(self, key: str, generation: int) -> str:
+        return os.path.join(self.disk_dir, f"{self._disk_name(key)}.{generation}")
+
+    def _read_from_disk(self, key: str, generation: int):
+        if not self.disk_dir:
+            return None
+        try:
+            with open(self._disk_path(key, generation), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_to_disk(self, key: str, generation: int, model_bytes: bytes):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key, generation)
+        try:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+            # remove copies of previous generations of the same blob
+            prefix = f"{self._disk_name(key)}."
+            for file_name in os.listdir(self.disk_dir):
+                if file_name.startswith(prefix):
+                    os.remove(os.path.join(self.disk_dir, file_name))
+
+            tmp_path = f"{path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(model_bytes)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.error(f"Failed to write model {key} to disk tier - {e}")
+
+
+model_registry = ModelRegistry(
+    bucket_name=ASSETS_PLOTS_BUCKET_NAME,
+    disk_dir=MODEL_REGISTRY_DISK_DIR,
+    revalidate_seconds=MODEL_REGISTRY_REVALIDATE_SECONDS,
+)
@@ -1,14 +1,22 @@
 from datetime import datetime
 import uuid
 from io import BytesIO
+from typing import List
 from flask import Blueprint, jsonify, request
 from pydantic import ValidationError
 import logging
+import numpy as np
 import yfinance as yf
 from api.auth.auth import auth_required
 from api.common.constants import ASSETS_PLOTS_BUCKET_NAME, PANDAS_DF_DATE_FORMATE_CODE
 from api.exception.models import BadRequestException
-from api.model.models import ExportModelRequest, PredictStockFromModelRequest
+from api.model.models import (
+    ExportModelRequest,
+    LinearTrendModel,
+    PredictStockFromModelBatchRequest,
+    PredictStockFromModelRequest,
+)
+from api.model.registry import model_registry
 from api.util.cloud_storage_connector import CloudStorageConnector
 from api.util.util import (
     create_stock_close_linear_regression_model,
@@ -18,6 +26,12 @@ import joblib
 
 bp = Blueprint("model", __name__)
 
+MODEL_CONTENT_TYPES = {
+    "pkl": "application/octet-stream",
+    "json": "application/json",
+    "npz": "application/octet-stream",
+}
+
 
 @bp.route("/models/export-to-blob", methods=(["POST"]))
 @auth_required
@@ -38,14 +52,32 @@ def export_model_to_gcs_blob(_):
     model = create_stock_close_linear_regression_model(df)
 
     model_id = uuid.uuid4()
-    pkl_filename = f"{model_id}.pkl"
-    joblib.dump(model, pkl_filename)
+    model_format = export_model_request.format
+    model_filename = f"{model_id}.{model_format}"
+
+    # serialize into memory and stream straight to the blob
+    buf = BytesIO()
+    response = {"model_id": model_id, "format": model_format}
+    if model_format == "pkl":
+        joblib.dump(model, buf)
+    else:
+        trend_model = LinearTrendModel.from_linear_regression(model, df.index.min())
+        if model_format == "json":
+            buf.write(trend_model.to_json_bytes())
+        else:
+            buf.write(trend_model.to_npz_bytes())
+        response["model"] = trend_model.to_dict()
 
     cloud_storage_connector = CloudStorageConnector(
         bucket_name=ASSETS_PLOTS_BUCKET_NAME
     )
-    cloud_storage_connector.upload_pkl(stock_symbol, pkl_filename, pkl_filename)
-    return jsonify({"model_id": model_id}), 200
+    cloud_storage_connector.upload_model(
+        stock_symbol,
+        model_filename,
+        buf,
+        content_type=MODEL_CONTENT_TYPES[model_format],
+    )
+    return jsonify(response), 200
 
 
 @bp.route("/models/predict-from-blob", methods=(["POST"]))
@@ -62,33 +94,22 @@ def predict_stock_from_gcs_blob_model(_):
     stock_symbol = predict_model_request.stock
     future_date = predict_model_request.future_date
     model_id = predict_model_request.pkl_model_id
-    pkl_filename = f"{model_id}.pkl"
+    model_filename = f"{model_id}.{predict_model_request.model_format}"
 
-    cloud_storage_connector = CloudStorageConnector(
-        bucket_name=ASSETS_PLOTS_BUCKET_NAME
-    )
+    model = model_registry.get_model(stock_symbol, model_filename)
 
-    if not cloud_storage_connector.pkl_exists(stock_symbol, pkl_filename):
+    if model is None:
         raise BadRequestException(
-            f"Blob for stock {stock_symbol} with model ID {pkl_filename} does not exist!",
+            f"Blob for stock {stock_symbol} with model ID {model_filename} does not exist!",
             status_code=400,
         )
 
-    blob_bytes = cloud_storage_connector.download_pkl(stock_symbol, pkl_filename)
-
-    model = joblib.load(
-        BytesIO(blob_bytes)
-    )  # create a file-like object in memory from the bytes
-
-    now = datetime.now()
-    future_days = (
-        datetime.strptime(future_date, PANDAS_DF_DATE_FORMATE_CODE) - now
-    ).days
-
-    future_days = 365 + future_days
+    future_days = _get_future_days(
+        model, [datetime.strptime(future_date, PANDAS_DF_DATE_FORMATE_CODE)]
+    )
 
     # Predict the price for the future date
-    future_price = model.predict([[future_days]])[0]
+    future_price = model.predict(future_days.reshape(-1, 1))[0]
     logging.info(f"Price prediction 1: {future_price}")
     return (
         jsonify(
@@ -96,3 +117,60 @@ def predict_stock_from_gcs_blob_model(_):
         ),
         200,
     )
+
+
+@bp.route("/models/predict-from-blob/batch", methods=(["POST"]))
+@auth_required
+def predict_stock_from_gcs_blob_models_batch(_):
+    try:
+        predict_batch_request = PredictStockFromModelBatchRequest.model_validate_json(
+            request.data
+        )
+    except ValidationError as e:
+        logging.error(e)
+        return jsonify({"message": "Invalid payload"}), 400
+
+    stock_symbol = predict_batch_request.stock
+    future_dates = predict_batch_request.get_future_dates()
+
+    predictions = {}
+    for model_id in predict_batch_request.pkl_model_ids:
+        model_filename = f"{model_id}.{predict_batch_request.model_format}"
+        model = model_registry.get_model(stock_symbol, model_filename)
+
+        if model is None:
+            raise BadRequestException(
+                f"Blob for stock {stock_symbol} with model ID {model_filename} does not exist!",
+                status_code=400,
+            )
+
+        # one vectorized predict call for every future date
+        future_days = _get_future_days(model, future_dates)
+        future_prices = model.predict(future_days.reshape(-1, 1))
+        predictions[model_id] = np.round(future_prices, 2).ravel().tolist()
+
+    logging.info(
+        f"Predicted {len(future_dates)} dates for {len(predictions)} {stock_symbol} models"
+    )
+    return (
+        jsonify(
+            {
+                "stock_symbol": stock_symbol,
+                "dates": [
+                    i.strftime(PANDAS_DF_DATE_FORMATE_CODE) for i in future_dates
+                ],
+                "price_predictions": predictions,
+            }
+        ),
+        200,
+    )
+
+
+def _get_future_days(model, future_dates: List[datetime]) -> np.ndarray:
+    if isinstance(model, LinearTrendModel):
+        return model.days_since_origin(future_dates)
+
+    # pickled models are fitted on days since one year ago
+    future_datetimes = np.asarray(future_dates, dtype="datetime64[s]")
+    now = np.datetime64(datetime.now(), "s")
+    return 365 + (future_datetimes - now) // np.timedelta64(1, "D")
@@ -0,0 +1,359 @@
+import heapq
+import itertools
+import json
+import logging
+import threading
+
+from datetime import timedelta
+
+from google.cloud import pubsub_v1
+from pymongo import UpdateOne
+from pymongo.errors import PyMongoError
+
+from api.common.constants import ORDERS_SYNC_OVERLAP_SECONDS, TRADES_TOPIC_NAME
+from api.db.setup import db
+from api.util.util import get_current_time_utc
+
+
+class OrderBook:
+    """
+    Open orders of one stock in price-time priority: bids highest price first,
+    asks lowest price first, and orders at the same price in the order they were
+    added. Heap entries of filled, removed or replaced orders are skipped when
+    they reach the top.
+    """
+
+    def __init__(self, stock_symbol: str) -> None:
+        self.stock_symbol = stock_symbol
+        self.orders = {}
+        self._bids = []
+        self._asks = []
+        self._sequence = itertools.count()
+
+    def add(self, order: dict):
+        order = dict(order)
+        self.orders[order["_id"]] = order
+        if order["order_type"] == "BUY":
+            heapq.heappush(self._bids, (-order["price"], next(self._sequence), order))
+        else:
+            heapq.heappush(self._asks, (order["price"], next(self._sequence), order))
+
+    def remove(self, order_id):
+        self.orders.pop(order_id, None)
+
+    def match(self) -> list:
+        """
+        Fills every crossing bid and ask, best prices first, at the lower of the
+        two prices. Orders are not filled against orders of the same user, which
+        keep their place in the book.
+        """
+        fills = []
+        held_bids = []
+        while True:
+            bid_entry = self._pop(self._bids)
+            if bid_entry is None:
+                break
+            bid = bid_entry[-1]
+            best_ask = self._peek(self._asks)
+            if best_ask is None or best_ask["price"] > bid["price"]:
+                held_bids.append(bid_entry)
+                break
+
+            held_asks = []
+            while bid["quantity"] > 0:
+                ask_entry = self._pop(self._asks)
+                if ask_entry is None:
+                    break
+                ask = ask_entry[-1]
+                held_asks.append(ask_entry)
+                if ask["price"] > bid["price"]:
+                    break
+                if str(ask["created_by"]) == str(bid["created_by"]):
+                    continue
+
+                quantity = min(ask["quantity"], bid["quantity"])
+                fills.append(self._generate_fill(ask, bid, quantity))
+                ask["quantity"] -= quantity
+                bid["quantity"] -= quantity
+                if not ask["quantity"]:
+                    held_asks.pop()
+                    self.remove(ask["_id"])
+
+            for i in held_asks:
+                heapq.heappush(self._asks, i)
+            if bid["quantity"]:
+                held_bids.append(bid_entry)
+            else:
+                self.remove(bid["_id"])
+
+        for i in held_bids:
+            heapq.heappush(self._bids, i)
+        return fills
+
+    def _generate_fill(self, sell_order: dict, buy_order: dict, quantity: int) -> dict:
+        return {
+            "stock_symbol": self.stock_symbol,
+            "price": min(sell_order["price"], buy_order["price"]),
+            "quantity": quantity,
+            "sell_order_id": sell_order["_id"],
+            "buy_order_id": buy_order["_id"],
+            "sell_order_user_id": str(sell_order["created_by"]),
+            "buy_order_user_id": str(buy_order["created_by"]),
+        }
+
+    def _peek(self, heap: list):
+        while heap and self.orders.get(heap[0][-1]["_id"]) is not heap[0][-1]:
+            heapq.heappop(heap)
+        return heap[0][-1] if heap else None
+
+    def _pop(self, heap: list):
+        return heapq.heappop(heap) if self._peek(heap) is not None else None
+
+
+class MatchingEngine:
+    """
+    Keeps an order book per stock in memory and matches open orders.
+
+    The books are loaded from every open order on the first matching cycle and
+    after reload, and each later cycle applies only the orders created or
+    modified since shortly before the last one. The fills and quantity and
+    status changes of a cycle are written with one bulk_write, on the condition
+    that each order is still open with the quantity the book had. If any order
+    has changed or been deleted elsewhere, or the write fails, only the fills
+    written to both orders are kept and published, and the books are loaded
+    again on the next cycle.
+    """
+
+    def __init__(self, collection_name: str = "orders") -> None:
+        self.collection_name = collection_name
+        self._books = {}
+        self._synced_at = None
+        self._lock = threading.Lock()
+        self.cycles = 0
+        self.fills = 0
+        self.reloads = 0
+
+    def match(self) -> list:
+        with self._lock:
+            if self._synced_at is None:
+                self._load()
+            else:
+                self._sync()
+
+            quantities = {
+                order_id: order["quantity"]
+                for book in self._books.values()
+                for order_id, order in book.orders.items()
+            }
+            fills = list(
+                itertools.chain.from_iterable(
+                    book.match() for book in self._books.values()
+                )
+            )
+            self.cycles += 1
+            if not fills:
+                return fills
+
+            updates = self._generate_order_updates(fills, quantities)
+            try:
+                result = db[self.collection_name].bulk_write(updates, ordered=False)
+                is_written = result.matched_count == len(updates)
+            except PyMongoError as e:
+                logging.error(e)
+                is_written = False
+            if not is_written:
+                logging.warning("Orders changed while matching, reloading order books")
+                self._synced_at = None
+                fills = self._reconcile_fills(fills, quantities)
+                if not fills:
+                    return fills
+
+            self.fills += len(fills)
+            logging.info(f"Matched {len(fills)} fills across {len(updates)} orders")
+            _publish_trades(fills)
+            return fills
+
+    def reload(self):
+        """Loads the order books from every open order on the next cycle"""
+        with self._lock:
+            self._synced_at = None
+
+    def remove_order(self, order_id):
+        with self._lock:
+            for book in self._books.values():
+                book.remove(order_id)
+
+    def stats(self) -> dict:
+        return {
+            "symbols": len(self._books),
+            "openOrders": sum(len(i.orders) for i in self._books.values()),
+            "cycles": self.cycles,
+            "fills": self.fills,
+            "reloads": self.reloads,
+        }
+
+    def _load(self):
+        self._synced_at = get_current_time_utc()
+        self._books = {}
+        for order in db[self.collection_name].find(
+            {"status": "open"}, sort=[("created", 1)]
+        ):
+            self._get_book(order["stock_symbol"]).add(order)
+        self.reloads += 1
+        logging.info(f"Loaded order books {self.stats()}")
+
+    def _sync(self):
+        synced_at = get_current_time_utc()
+        # orders written just before the last sync may only have become visible
+        # after it, so they are read again
+        modified_since = self._synced_at - timedelta(
+            seconds=ORDERS_SYNC_OVERLAP_SECONDS
+        )
+        for order in db[self.collection_name].find(
+            {"last_modified": {"$gte": modified_since}}, sort=[("created", 1)]
+        ):
+            book = self._get_book(order["stock_symbol"])
+            current = book.orders.get(order["_id"])
+            if order["status"] != "open":
+                book.remove(order["_id"])
+            elif (
+                current is None
+                or current["price"] != order["price"]
+                or current["quantity"] != order["quantity"]
+            ):
+                book.add(order)
+        self._synced_at = synced_at
+
+    def _get_book(self, stock_symbol: str) -> OrderBook:
+        if stock_symbol not in self._books:
+            self._books[stock_symbol] = OrderBook(stock_symbol)
+        return self._books[stock_symbol]
+
+    def _reconcile_fills(self, fills: list, quantities: dict) -> list:
+        """
+        Returns the fills written to both orders, and takes the other fills back
+        out of the orders they were written to. An order and its counterparty
+        are filled against each other at most once, so a fill is found in an
+        order by its counterparty.
+        """
+        order_fills = _generate_order_fills(fills)
+        written = set()
+        for order in db[self.collection_name].find(
+            {"_id": {"$in": list(order_fills)}},
+            {"fills.counterparty_order_id": 1},
+        ):
+            counterparty_order_ids = {
+                i["counterparty_order_id"] for i in order.get("fills", [])
+            }
+            if any(
+                i["counterparty_order_id"] in counterparty_order_ids
+                for i in order_fills[order["_id"]]
+            ):
+                written.add(order["_id"])
+
+        now = get_current_time_utc()
+        for order_id, fills_of_order in order_fills.items():
+            failed_fills = [
+                i for i in fills_of_order if i["counterparty_order_id"] not in written
+            ]
+            if order_id not in written or not failed_fills:
+                continue
+            result = db[self.collection_name].update_one(
+                {
+                    "_id": order_id,
+                    "quantity": quantities[order_id]
+                    - sum(i["quantity"] for i in fills_of_order),
+                },
+                {
+                    "$inc": {"quantity": sum(i["quantity"] for i in failed_fills)},
+                    "$set": {"status": "open", "last_modified": now},
+                    "$pull": {
+                        "fills": {
+                            "counterparty_order_id": {
+                                "$in": [
+                                    i["counterparty_order_id"] for i in failed_fills
+                                ]
+                            }
+                        }
+                    },
+                },
+            )
+            if not result.matched_count:
+                logging.error(f"Could not take failed fills out of order {order_id}")
+
+        return [
+            i
+            for i in fills
+            if i["sell_order_id"] in written and i["buy_order_id"] in written
+        ]
+
+    def _generate_order_updates(self, fills: list, quantities: dict) -> list:
+        order_fills = _generate_order_fills(fills)
+        now = get_current_time_utc()
+        updates = []
+        for order_id, fills_of_order in order_fills.items():
+            quantity = quantities[order_id] - sum(i["quantity"] for i in fills_of_order)
+            updates.append(
+                UpdateOne(
+                    {
+                        "_id": order_id,
+                        "status": "open",
+                        "quantity": quantities[order_id],
+                    },
+                    {
+                        "$set": {
+                            "quantity": quantity,
+                            "status": "open" if quantity else "complete",
+                            "last_modified": now,
+                        },
+                        "$push": {
+                            "fills": {
+                                "$each": [{**i, "created": now} for i in fills_of_order]
+                            }
+                        },
+                    },
+                )
+            )
+        return updates
+
+
+def _generate_order_fills(fills: list) -> dict:
+    """Returns the fills of each order, with the counterparty order"""
+    order_fills = {}
+    for fill in fills:
+        for order_id, counterparty_order_id in (
+            (fill["sell_order_id"], fill["buy_order_id"]),
+            (fill["buy_order_id"], fill["sell_order_id"]),
+        ):
+            order_fills.setdefault(order_id, []).append(
+                {
+                    "price": fill["price"],
+                    "quantity": fill["quantity"],
+                    "counterparty_order_id": counterparty_order_id,
+                }
+            )
+    return order_fills
+
+
+def _publish_trades(fills: list):
+    try:
+        publisher = pubsub_v1.PublisherClient()
+        futures = []
+        for fill in fills:
+            trade_details = {
+                "stock_symbol": fill["stock_symbol"],
+                "price": fill["price"],
+                "quantity": fill["quantity"],
+                "sell_order_user_id": fill["sell_order_user_id"],
+                "buy_order_user_id": fill["buy_order_user_id"],
+            }
+            logging.info(trade_details)
+            message_data_encode = json.dumps(trade_details, indent=2).encode("utf-8")
+            futures.append(publisher.publish(TRADES_TOPIC_NAME, message_data_encode))
+        for future in futures:
+            future.result()
+    except Exception as e:
+        logging.error(e)
+
+
+matching_engine = MatchingEngine()
@@ -1,21 +1,14 @@
 from datetime import datetime, timedelta
 from enum import Enum
 from functools import wraps
-import json
 import logging
 import uuid
-from google.cloud import pubsub_v1
 from bson import ObjectId
 from pydantic import BaseModel, ValidationInfo, field_validator
-from api.common.constants import TRADES_TOPIC_NAME
 from api.common.models import BaseModel as CommonBaseModel
 from api.db.setup import db
 from api.exception.models import UnauthorizedException
-from api.util.util import (
-    check_asset_available,
-    get_current_time_utc,
-    get_stock_current_price,
-)
+from api.util.util import check_asset_available, get_current_time_utc
 
 
 class OrderType(str, Enum):
@@ -130,166 +123,6 @@ class Order(CommonBaseModel):
     def get_order_by_id(order_id: uuid.UUID):
         return db["orders"].find_one({"_id": ObjectId(order_id)})
 
-    @staticmethod
-    @ensure_order_exists
-    def update_order_status(_, order_id: uuid.UUID, new_status: str = "complete"):
-        update_order_operation = {
-            "$set": {
-                "status": new_status,
-                "last_modified": get_current_time_utc(),
-            }
-        }
-        return db["orders"].update_one(
-            {"_id": ObjectId(order_id)}, update_order_operation, True
-        )
-
-    @staticmethod
-    @ensure_order_exists
-    def increment_order_quantity(_, order_id: uuid.UUID, increment_amount: int):
-        return db["orders"].update_one(
-            {"_id": ObjectId(order_id)},
-            {
-                "$inc": {"quantity": increment_amount},
-                "$set": {
-                    "last_modified": get_current_time_utc(),
-                },
-            },
-            True,
-        )
-
-    @staticmethod
-    def process_sell_and_buy_orders(sell_order_id: uuid.UUID, buy_order_id: uuid.UUID):
-
-        sell_order = Order.get_order_by_id(sell_order_id)
-        logging.info(
-            f"Sell order for stock {sell_order['stock_symbol']} at price {sell_order['price']} for quantity {sell_order['quantity']}"
-        )
-        buy_order = Order.get_order_by_id(buy_order_id)
-        logging.info(
-            f"Buy order for stock {buy_order['stock_symbol']} at price {buy_order['price']} for quantity {buy_order['quantity']}"
-        )
-
-        trade_quantity = min(sell_order["quantity"], buy_order["quantity"])
-        trade_details = {
-            "stock_symbol": sell_order["stock_symbol"],
-            "price": min(sell_order["price"], buy_order["price"]),
-            "quantity": trade_quantity,
-            "sell_order_user_id": str(sell_order["created_by"]),
-            "buy_order_user_id": str(buy_order["created_by"]),
-        }
-        logging.info(trade_details)
-
-        Order.increment_order_quantity(sell_order_id, trade_quantity * -1)
-        Order.increment_order_quantity(buy_order_id, trade_quantity * -1)
-
-        if sell_order["quantity"] == trade_quantity:
-            Order.update_order_status(sell_order_id, "complete")
-        if buy_order["quantity"] == trade_quantity:
-            Order.update_order_status(buy_order_id, "complete")
-
-        try:
-            publisher = pubsub_v1.PublisherClient()
-            message_data_encode = json.dumps(trade_details, indent=2).encode("utf-8")
-            future = publisher.publish(TRADES_TOPIC_NAME, message_data_encode)
-            message_id = future.result()
-            return message_id
-        except Exception as e:
-            logging.error(e)
-
-    @staticmethod
-    def match_orders():
-        open_orders_distinct_stock_symbols = (
-            db["orders"].find({"status": "open"}).distinct("stock_symbol")
-        )
-        logging.info(f"Open orders stock symbol: {open_orders_distinct_stock_symbols}")
-
-        for i in open_orders_distinct_stock_symbols:
-            stock_sell_orders_query = {
-                "stock_symbol": i,
-                "order_type": "SELL",
-                "status": "open",
-            }
-            stock_buy_orders_query = {
-                "stock_symbol": i,
-                "order_type": "BUY",
-                "status": "open",
-            }
-
-            stock_sell_orders = list(db["orders"].find(stock_sell_orders_query))
-            stock_buy_orders = list(db["orders"].find(stock_buy_orders_query))
-
-            current_price = get_stock_current_price(i)
-
-            logging.info(f"{i} current price: {current_price}")
-
-            if not stock_sell_orders or not stock_buy_orders:
-                logging.info(f"No matching open orders for stock symbol: {i}")
-            else:
-                logging.info(f"Process matching orders for stock symbol: {i}...")
-                min_sell_price_pipeline = [
-                    {"$match": {"stock_symbol": i}},
-                    {"$match": {"status": "open"}},
-                    {"$match": {"order_type": "SELL"}},
-                    {
-                        "$group": {
-                            "_id": "$stock_symbol",
-                            "minPrice": {"$min": "$price"},
-                        }
-                    },
-                ]
-                min_sell_price = list(db["orders"].aggregate(min_sell_price_pipeline))[
-                    0
-                ]["minPrice"]
-                logging.info(f"{i} minimum sell price is {min_sell_price}")
-
-                matching_buy_orders_pipeline = [
-                    {"$match": {"stock_symbol": i}},
-                    {"$match": {"status": "open"}},
-                    {"$match": {"order_type": "BUY"}},
-                    {"$match": {"price": {"$gt": min_sell_price}}},
-                    {"$sort": {"_id": 1}},
-                ]
-
-                matching_buy_orders = list(
-                    db["orders"].aggregate(matching_buy_orders_pipeline)
-                )
-                for j in matching_buy_orders:
-                    logging.info(
-                        f"Buy order with ID {j['_id']} at price {j['price']} is above minimum sell price"
-                    )
-
-                if matching_buy_orders:
-                    sell_order_at_min_price_pipeline = [
-                        {"$match": {"stock_symbol": i}},
-                        {"$match": {"status": "open"}},
-                        {
-                            "$match": {
-                                "created_by": {
-                                    "$ne": matching_buy_orders[0]["created_by"]
-                                }
-                            }
-                        },
-                        {"$sort": {"price": 1}},
-                        {
-                            "$group": {
-                                "_id": "$stock_symbol",
-                                "order_id": {"$first": "$_id"},
-                                "price": {"$first": "$price"},
-                            }
-                        },
-                    ]
-                    sell_order_at_min_price = list(
-                        db["orders"].aggregate(sell_order_at_min_price_pipeline)
-                    )[0]
-                    logging.info(
-                        f"Sell order with ID {sell_order_at_min_price['order_id']} at price {sell_order_at_min_price['price']} to be matched with first buy order."
-                    )
-
-                    Order.process_sell_and_buy_orders(
-                        sell_order_at_min_price["order_id"],
-                        matching_buy_orders[0]["_id"],
-                    )
-
     @staticmethod
     def delete_complete_orders_last_modified_days_ago(days_ago: int = 5):
         return db["orders"].delete_many(
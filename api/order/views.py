@@ -3,11 +3,9 @@ from datetime import date, datetime, timezone
 import json
 import logging
 import math
-from google.cloud import storage
 from bson import ObjectId
 from flask import Blueprint, jsonify, make_response, request
 from google.cloud import pubsub_v1
-from google.cloud import bigquery
 import pandas as pd
 import pytz
 from api.db.setup import db
@@ -15,15 +13,19 @@ from pydantic import ValidationError
 from api.auth.auth import auth_required, super_user_required
 from api.common.constants import (
     ASSETS_UPLOADS_BUCKET_NAME,
-    BIGQUERY_DATASET_ID,
     BIGQUERY_TABLE_ID_ORDERS,
     DATETIME_FORMATE_CODE,
-    GCP_PROJECT_ID,
+    ORDER_STATUSES,
+    ORDERS_QUERY_DEFAULT_LIMIT,
+    ORDERS_QUERY_MAX_LIMIT,
     ORDERS_TOPIC_NAME,
 )
 from api.exception.models import BadRequestException, UnauthorizedException
+from api.order.matching_engine import matching_engine
 from api.order.models import CreateOrderRequest, Order, UpdateOrderRequest
 from api.user.models import User
+from api.util.cloud_storage_connector import get_storage_client
+from api.util.warehouse import WarehouseQuery, get_warehouse_client
 from api.util.util import (
     generate_response,
     get_stock_price,
@@ -166,6 +168,7 @@ def delete_order_by_id(user, order_id):
 
     try:
         res = db["orders"].delete_one({"_id": ObjectId(order_id)})
+        matching_engine.remove_order(ObjectId(order_id))
         if res.deleted_count:
             return jsonify({"message": "Order deleted"}), 200
 
@@ -235,8 +238,6 @@ def handle_orders_subscription_push():
         new_order_id = new_order.save_to_db()
         logging.info(f"Created new order with id: {new_order_id}")
 
-        bq_client = bigquery.Client(project=GCP_PROJECT_ID)
-
         row_to_insert = [
             {
                 "created": datetime.now(timezone.utc).isoformat(),
@@ -249,9 +250,9 @@ def handle_orders_subscription_push():
                 "total_value": price * quantity,
             },
         ]
-        table_ref = f"{GCP_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID_ORDERS}"
-
-        errors = bq_client.insert_rows_json(table_ref, row_to_insert)
+        errors = get_warehouse_client().insert_rows(
+            BIGQUERY_TABLE_ID_ORDERS, row_to_insert
+        )
         if errors == []:
             logging.info("Added row to BigQuery")
         else:
@@ -338,7 +339,7 @@ def handle_trades_subscription_push():
 
 @bp.route("/orders/match", methods=(["POST"]))
 def match_orders():
-    Order.match_orders()
+    matching_engine.match()
     return ("", 204)
 
 
@@ -374,8 +375,7 @@ def export_orders_csv(_):
 
     response = make_response(csv_string)
 
-    storage_client = storage.Client()
-    bucket = storage_client.bucket(ASSETS_UPLOADS_BUCKET_NAME)
+    bucket = get_storage_client().bucket(ASSETS_UPLOADS_BUCKET_NAME)
 
     timestamp = datetime.now(timezone.utc).astimezone(GB).strftime("%Y%m%d%H%M%S")
     blob_name = f"{timestamp}-orders.csv"
@@ -386,24 +386,8 @@ def export_orders_csv(_):
     gcs_uri = f"gs://{ASSETS_UPLOADS_BUCKET_NAME}/{blob_name}"
     logging.info(f"Uploaded CSV string to {gcs_uri}")
 
-    bq_client = bigquery.Client(project=GCP_PROJECT_ID)
-
-    table_ref = f"{GCP_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID_ORDERS}"
-
-    job_config = bigquery.LoadJobConfig(
-        source_format=bigquery.SourceFormat.CSV,
-        skip_leading_rows=1,  # skip header
-        autodetect=True,
-        write_disposition="WRITE_TRUNCATE",
-    )
-
-    load_job = bq_client.load_table_from_uri(gcs_uri, table_ref, job_config=job_config)
-
-    logging.info("Starting job...")
-    load_job.result()  # Waits for job to complete
-
-    logging.info(f"Loaded {gcs_uri} → {table_ref}")
-    logging.info(f"Total rows loaded: {load_job.output_rows:,}")
+    rows_loaded = get_warehouse_client().replace_dataframe(BIGQUERY_TABLE_ID_ORDERS, df)
+    logging.info(f"Total rows loaded: {rows_loaded:,}")
 
     response.headers["Content-Disposition"] = (
         f"attachment; filename={datetime.today().strftime(DATETIME_FORMATE_CODE)}.csv"
@@ -452,7 +436,7 @@ def get_orders_from_bigquery(user):
 
     logging.info(f"Requestor email: {user['email']}")
 
-    bq_client = bigquery.Client(project=GCP_PROJECT_ID)
+    warehouse_client = get_warehouse_client()
 
     columns = [
         "created",
@@ -465,22 +449,16 @@ def get_orders_from_bigquery(user):
         "total_value",
     ]
 
-    query = f"""
-SELECT {','.join(columns)}
-FROM `{GCP_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID_ORDERS}`
-LIMIT 1000
-"""
-    query_job = bq_client.query(
-        query,
-    )
-
-    # Wait and get results
-    df = query_job.to_dataframe()  # ← very convenient if you like pandas
-    df = df.set_index("created")
-    logging.info(df.head())
+    limit = request.args.get("limit", default=ORDERS_QUERY_DEFAULT_LIMIT, type=int)
+    if not 0 < limit <= ORDERS_QUERY_MAX_LIMIT:
+        raise BadRequestException(
+            f"Limit must be between 1 and {ORDERS_QUERY_MAX_LIMIT}", status_code=400
+        )
 
-    logging.info(
-        f"Most common stock order: {df['stock_symbol'].mode()[0]} with count {df['stock_symbol'].value_counts().nlargest(1).iloc[0]}"
+    query = (
+        WarehouseQuery(BIGQUERY_TABLE_ID_ORDERS, columns)
+        .order_by("created", descending=True)
+        .limit(limit)
     )
 
     start_date_arg = request.args.get("startDate")
@@ -496,26 +474,44 @@ LIMIT 1000
                 "Invalid date input. Must be in format YYYY-MM-DD", status_code=400
             )
 
-        start_date = pd.to_datetime(start_date_arg, utc=True)
-        end_date = pd.to_datetime(end_date_arg, utc=True)
-        sliced_df = df[(df.index >= start_date) & (df.index <= end_date)]
-    else:
-        sliced_df = df.loc[:]
+        start_date = pd.Timestamp(start_date_arg, tz="UTC")
+        end_date = pd.Timestamp(end_date_arg, tz="UTC")
+        # created_date bounds let BigQuery prune partitions on the date column
+        query.where("created_date", ">=", start_date.date()).where(
+            "created_date", "<=", end_date.date()
+        )
+        query.where("created", ">=", start_date.to_pydatetime()).where(
+            "created", "<=", end_date.to_pydatetime()
+        )
 
     stock_symbol_arg = request.args.get("stock")
     if stock_symbol_arg:
-        sliced_df = sliced_df[sliced_df["stock_symbol"] == stock_symbol_arg]
+        query.where("stock_symbol", "=", stock_symbol_arg)
 
-    logging.info(f"Count of sliced dataframe: {len(sliced_df.index)}")
-    logging.info(
-        f"Query cost: {query_job.total_bytes_processed / 1_000_000_000:.2f} GB"
-    )
+    status_arg = request.args.get("status")
+    if status_arg:
+        if status_arg not in ORDER_STATUSES:
+            raise BadRequestException(
+                f"Status must be one of {', '.join(ORDER_STATUSES)}", status_code=400
+            )
+        query.where("status", "=", status_arg)
+
+    query_result = warehouse_client.run_query(query)
+    df = query_result.df.set_index("created")
+    logging.info(df.head())
+
+    if not df.empty:
+        logging.info(
+            f"Most common stock order: {df['stock_symbol'].mode()[0]} with count {df['stock_symbol'].value_counts().nlargest(1).iloc[0]}"
+        )
 
     return jsonify(
         {
             "recordsCount": len(df.index),
             "startDate": df.index.min(),
             "endDate": df.index.max(),
-            "orders": json.loads(sliced_df.to_json(orient="table")),
+            "bytesProcessed": query_result.bytes_processed,
+            "cached": query_result.cached,
+            "orders": json.loads(df.to_json(orient="table")),
         }
     )
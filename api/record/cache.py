@@ -0,0 +1,78 @@
+import threading
+import time
+from typing import Callable
+
+from api.common.constants import LATEST_RECORD_RECONCILE_SECONDS
+
+
+class LatestRecordCache:
+    """
+    Keeps the most recent record in memory.
+
+    Inserts from this process update it straight away. Records inserted elsewhere
+    are picked up by reconcile, which calls loader for the newest record and runs
+    on a schedule, or on read once the cached record is reconcile_seconds old.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[], dict],
+        reconcile_seconds: int = LATEST_RECORD_RECONCILE_SECONDS,
+    ) -> None:
+        self.loader = loader
+        self.reconcile_seconds = reconcile_seconds
+        self._record = None
+        self._reconciled_at = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.updates = 0
+        self.reconciles = 0
+
+    def get(self) -> dict:
+        with self._lock:
+            if self._record is not None and not self._is_stale():
+                self.hits += 1
+                return dict(self._record)
+        return self.reconcile()
+
+    def update(self, record: dict):
+        """Replaces the cached record if record is at least as recent"""
+        with self._lock:
+            if self._record is None or not self._is_newer(self._record, record):
+                self._record = dict(record)
+                self.updates += 1
+
+    def reconcile(self) -> dict:
+        record = self.loader()
+        with self._lock:
+            # an insert may have landed while the loader was running
+            if self._record is None or not self._is_newer(self._record, record):
+                self._record = dict(record) if record is not None else None
+            self._reconciled_at = time.monotonic()
+            self.reconciles += 1
+            return dict(self._record) if self._record is not None else None
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "updates": self.updates,
+                "reconciles": self.reconciles,
+                "secondsSinceReconcile": (
+                    round(time.monotonic() - self._reconciled_at, 3)
+                    if self._reconciled_at is not None
+                    else None
+                ),
+            }
+
+    def _is_stale(self) -> bool:
+        return (
+            self._reconciled_at is None
+            or time.monotonic() - self._reconciled_at > self.reconcile_seconds
+        )
+
+    @staticmethod
+    def _is_newer(record: dict, other: dict) -> bool:
+        if other is None:
+            return True
+        return record["created"] > other["created"]
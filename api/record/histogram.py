@@ -0,0 +1,151 @@
+import logging
+from datetime import date, datetime, time, timedelta
+
+import numpy as np
+import pandas as pd
+import pytz
+from pymongo import UpdateOne
+
+from api.common.constants import RECORD_HISTOGRAMS_REFRESH_DAYS
+from api.db.setup import db
+
+GB = pytz.timezone("Europe/London")
+RECORD_HISTOGRAMS_COLLECTION = "record_histograms"
+RECORD_INDEX_VALUES = 101
+# upper bounds of the first four description bands, each closed on the right
+DESCRIPTION_BAND_EDGES = np.array([25, 45, 55, 75])
+
+
+def description_band_codes(index_values) -> np.ndarray:
+    """Returns the description band, 0 for Extreme Fear to 4 for Extreme Greed"""
+    return np.searchsorted(DESCRIPTION_BAND_EDGES, index_values, side="left")
+
+
+def increment_record_histograms(days: list, index_values: list):
+    """
+    Adds records to the per-day counters, with one upserted $inc per day. Days are
+    London dates, and every counter document holds the count of each index value.
+    """
+    counts = pd.DataFrame({"day": days, "index": index_values}).value_counts()
+    if counts.empty:
+        return
+
+    operations = [
+        UpdateOne(
+            {"_id": day.isoformat()},
+            {
+                "$inc": {
+                    f"values.{index}": int(count)
+                    for (_, index), count in day_counts.items()
+                }
+            },
+            upsert=True,
+        )
+        for day, day_counts in counts.groupby(level="day")
+    ]
+    db[RECORD_HISTOGRAMS_COLLECTION].bulk_write(operations, ordered=False)
+
+
+def refresh_record_histograms(days: int = RECORD_HISTOGRAMS_REFRESH_DAYS):
+    """
+    Recounts the counters of today and the previous days from the records
+    collection, or of every day if days is None, picking up records inserted by
+    the scraper. Whole London days are recounted, as each counter is replaced.
+
+    Records inserted by the API while a refresh runs can be counted twice, or
+    missed, for that day until the next refresh.
+    """
+    if days is not None:
+        start_day = datetime.now(GB).date() - timedelta(days=days)
+        created_match = {"$gte": GB.localize(datetime.combine(start_day, time()))}
+    else:
+        created_match = {"$type": "date"}
+    pipeline = [
+        {"$match": {"created": created_match}},
+        {
+            "$project": {
+                "_id": 0,
+                "day": {
+                    "$dateToString": {
+                        "format": "%Y-%m-%d",
+                        "date": "$created",
+                        "timezone": "Europe/London",
+                    }
+                },
+                "index": {
+                    "$convert": {
+                        "input": "$index",
+                        "to": "int",
+                        "onError": None,
+                        "onNull": None,
+                    }
+                },
+            }
+        },
+        {"$match": {"index": {"$gte": 0, "$lt": RECORD_INDEX_VALUES}}},
+        {
+            "$group": {
+                "_id": {"day": "$day", "index": "$index"},
+                "count": {"$sum": 1},
+            }
+        },
+        {
+            "$group": {
+                "_id": "$_id.day",
+                "values": {"$push": {"k": {"$toString": "$_id.index"}, "v": "$count"}},
+            }
+        },
+        {"$project": {"values": {"$arrayToObject": "$values"}}},
+        {
+            "$merge": {
+                "into": RECORD_HISTOGRAMS_COLLECTION,
+                "whenMatched": "replace",
+                "whenNotMatched": "insert",
+            }
+        },
+    ]
+    db["records"].aggregate(pipeline)
+    logging.info(f"Refreshed record histograms for the last {days} days")
+
+
+def get_value_counts(start_date: date, end_date: date) -> np.ndarray:
+    """
+    Returns the number of records with each index value from 0 to 100, created
+    from start_date up to end_date, London time, summed from the daily counters
+    """
+    value_counts = np.zeros(RECORD_INDEX_VALUES, dtype=np.int64)
+    for day_counts in db[RECORD_HISTOGRAMS_COLLECTION].find(
+        {"_id": {"$gte": start_date.isoformat(), "$lt": end_date.isoformat()}},
+        {"values": 1},
+    ):
+        for index, count in day_counts["values"].items():
+            value_counts[int(index)] += count
+    return value_counts
+
+
+def generate_histogram(value_counts: np.ndarray, bins: int):
+    """
+    Same as np.histogram of the records' index values, with bins spanning the
+    lowest to the highest value present
+    """
+    present_values = np.flatnonzero(value_counts)
+    value_range = (
+        (present_values[0], present_values[-1]) if len(present_values) else None
+    )
+    counts, edges = np.histogram(
+        np.arange(len(value_counts)), bins=bins, range=value_range, weights=value_counts
+    )
+    return counts.astype(np.int64), edges
+
+
+def generate_band_counts(value_counts: np.ndarray) -> np.ndarray:
+    return np.bincount(
+        description_band_codes(np.arange(len(value_counts))),
+        weights=value_counts,
+        minlength=len(DESCRIPTION_BAND_EDGES) + 1,
+    ).astype(np.int64)
+
+
+def generate_decile_counts(value_counts: np.ndarray) -> np.ndarray:
+    """Counts per lower bound 0, 10, ..., 100, with 100 on its own"""
+    return np.add.reduceat(value_counts, np.arange(0, RECORD_INDEX_VALUES, 10))
@@ -0,0 +1,80 @@
+import logging
+
+import bson
+import pandas as pd
+
+from api.common.constants import RECORDS_BATCH_SIZE
+from api.db.setup import db
+
+RECORDS_TIME_SERIES_OPTIONS = {"timeField": "created", "granularity": "hours"}
+
+
+def convert_created_to_datetime(records: list) -> list:
+    """
+    Returns the records with ISO string created values converted to UTC
+    datetimes, dropping records without a parseable created timestamp
+    """
+    created = pd.to_datetime(
+        pd.Series([i.get("created") for i in records], dtype=object),
+        format="ISO8601",
+        utc=True,
+        errors="coerce",
+    )
+    converted_records = []
+    for record, created_datetime in zip(records, created):
+        if pd.isna(created_datetime):
+            continue
+        record.pop("creatd", None)
+        converted_records.append(
+            {**record, "created": created_datetime.to_pydatetime()}
+        )
+    return converted_records
+
+
+def _is_time_series(collection_name: str) -> bool:
+    collections = list(db.list_collections(filter={"name": collection_name}))
+    return bool(collections) and collections[0].get("type") == "timeseries"
+
+
+def migrate_records_to_time_series(
+    collection_name: str = "records",
+    legacy_collection_name: str = "records_legacy",
+    batch_size: int = RECORDS_BATCH_SIZE,
+) -> dict:
+    """
+    Moves the records collection aside, recreates it as a time-series collection
+    on created with an index, and copies every record across in batches with
+    created converted from an ISO string to a BSON datetime.
+
+    A run that failed part way is resumed by running it again: while the legacy
+    collection exists, records whose _id has not been copied yet are copied.
+    """
+    collection_names = db.list_collection_names()
+    if _is_time_series(collection_name):
+        if legacy_collection_name not in collection_names:
+            logging.info(f"{collection_name} is already a time-series collection")
+            return {"migrated": 0, "skipped": 0, "existing": 0}
+        logging.info(f"Resuming migration of {legacy_collection_name}")
+    else:
+        if collection_name in collection_names:
+            if legacy_collection_name in collection_names:
+                raise ValueError(f"{legacy_collection_name} already exists")
+            db[collection_name].rename(legacy_collection_name)
+            logging.info(f"Renamed {collection_name} to {legacy_collection_name}")
+
+        db.create_collection(collection_name, timeseries=RECORDS_TIME_SERIES_OPTIONS)
+        db[collection_name].create_index([("created", 1)])
+
+    existing_ids = {i["_id"] for i in db[collection_name].find({}, {"_id": 1})}
+    migrated = 0
+    skipped = 0
+    for batch in db[legacy_collection_name].find_raw_batches(batch_size=batch_size):
+        records = [i for i in bson.decode_all(batch) if i["_id"] not in existing_ids]
+        converted_records = convert_created_to_datetime(records)
+        if converted_records:
+            db[collection_name].insert_many(converted_records, ordered=False)
+        migrated += len(converted_records)
+        skipped += len(records) - len(converted_records)
+        logging.info(f"Migrated {migrated} records, skipped {skipped}")
+
+    return {"migrated": migrated, "skipped": skipped, "existing": len(existing_ids)}
@@ -1,19 +1,60 @@
 from functools import wraps
 import uuid
+import bson
 from bson import ObjectId
+from bson.codec_options import CodecOptions
+import numpy as np
+import pandas as pd
 import pytz
 import logging
-from datetime import datetime, timezone, timedelta
+from datetime import date, datetime, time, timedelta, timezone
+from pymongo.results import UpdateResult
+from api.common.constants import RECORDS_BATCH_SIZE
 from api.db.setup import db
+from api.record.cache import LatestRecordCache
+from api.record.histogram import increment_record_histograms
+from api.record.series import RecordSeries
 
 GB = pytz.timezone("Europe/London")
+RECORDS_CODEC_OPTIONS = CodecOptions(tz_aware=True, tzinfo=GB)
+
+
+def records_collection():
+    """Records collection returning created as Europe/London aware datetimes"""
+    return db["records"].with_options(codec_options=RECORDS_CODEC_OPTIONS)
+
+
+def to_gb_datetime(value) -> datetime:
+    """Dates are midnight in London, naive datetimes are London local time"""
+    if not isinstance(value, datetime):
+        value = datetime.combine(value, time())
+    if value.tzinfo is None:
+        return GB.localize(value)
+    return value.astimezone(GB)
+
+
+def _add_to_record_summaries(records: list):
+    """Adds records inserted by this process to the histograms and record series"""
+    index_values = pd.to_numeric(
+        pd.Series([i["index"] for i in records], dtype=object), errors="coerce"
+    )
+    is_valid = (index_values.between(0, 100) & (index_values % 1 == 0)).to_numpy()
+    index_values = index_values[is_valid].astype(int)
+    increment_record_histograms(
+        [to_gb_datetime(i["created"]).date() for i, j in zip(records, is_valid) if j],
+        index_values.tolist(),
+    )
+    created = pd.to_datetime([i["created"] for i in records], utc=True)
+    record_series.add(
+        created.as_unit("ms").asi8[is_valid], index_values.to_numpy(dtype=np.uint8)
+    )
 
 
 def ensure_record_exists(f):
     @wraps(f)
     def decorator(*args, **kwargs):
         record_id = args[0]
-        record = db["records"].find_one({"_id": ObjectId(record_id)})
+        record = records_collection().find_one({"_id": ObjectId(record_id)})
 
         if not record:
             raise ValueError(f"record {record_id} not found!")
@@ -24,56 +65,154 @@ def ensure_record_exists(f):
 
 
 class Record:
-    def __init__(
-        self, index, created=datetime.now(timezone.utc).astimezone(GB).isoformat()
-    ):
+    def __init__(self, index, created: datetime = None):
         self.index = index
-        self.created = created
+        self.created = created or datetime.now(timezone.utc).astimezone(GB)
 
     def save_to_database(self):
-        db["records"].insert_one(vars(self))
+        records_collection().insert_one(vars(self))
+        latest_record_cache.update(vars(self))
+        _add_to_record_summaries([vars(self)])
         logging.info(f"Saved record to database - {self.index}")
 
     @staticmethod
     def get_most_recent_record():
-        return list(db["records"].find().sort("created", -1).limit(0))[0]
+        return latest_record_cache.get()
+
+    @staticmethod
+    def find_most_recent_record():
+        return records_collection().find_one(sort=[("created", -1)])
 
     @staticmethod
-    def _get_records_created_within_next_days(start_date: datetime, next_days: int = 1):
-        return list(
-            db["records"].find(
-                {
-                    "created": {
-                        "$gte": start_date.isoformat(),
-                        "$lte": (start_date + timedelta(days=next_days)).isoformat(),
-                    }
+    def find_first_record_on_date(record_date: date):
+        """Returns the earliest record created on record_date, London time"""
+        return records_collection().find_one(
+            {
+                "created": {
+                    "$gte": to_gb_datetime(record_date),
+                    "$lt": to_gb_datetime(record_date + timedelta(days=1)),
                 }
-            )
+            },
+            sort=[("created", 1)],
         )
 
     @staticmethod
-    def import_from_dataframe(df) -> int:
-        inserted = 0
-        for index, row in df.iterrows():
-            date = index
-            index_value = row["Index"]
-            count = len(Record._get_records_created_within_next_days(date))
-            if count:
-                logging.info(
-                    f"Skipping inserting record for {date} - {index_value} - count of records next day: {count}"
-                )
-            else:
-                python_datetime = date.to_pydatetime()
-                logging.info(f"Inserting record for {date} - {index_value}")
-                logging.info(
-                    f"Index of type {type(date)} to be converted to Python type {type(python_datetime)}"
+    def iter_index_batches_created_after(
+        created_after: datetime = None, batch_size: int = RECORDS_BATCH_SIZE
+    ):
+        """
+        Yields the created epoch milliseconds and integer index values of every
+        record created strictly after created_after, or every record if it is None,
+        oldest first, as NumPy arrays per batch. Filtering, projection and type
+        conversions run in MongoDB, and results are read in raw BSON batches.
+        """
+        return Record._iter_index_batches(
+            {"$gt": created_after} if created_after else {"$type": "date"},
+            0,
+            100,
+            batch_size,
+        )
+
+    @staticmethod
+    def _iter_index_batches(
+        created_match: dict, min_index: int, max_index: int, batch_size: int
+    ):
+        pipeline = [
+            {"$match": {"created": created_match}},
+            {"$sort": {"created": 1}},
+            {
+                "$project": {
+                    "_id": 0,
+                    "created": {"$toLong": "$created"},
+                    "index": {
+                        "$convert": {
+                            "input": "$index",
+                            "to": "int",
+                            "onError": None,
+                            "onNull": None,
+                        }
+                    },
+                }
+            },
+            {"$match": {"index": {"$gte": min_index, "$lte": max_index}}},
+        ]
+
+        for batch in db["records"].aggregate_raw_batches(
+            pipeline, batchSize=batch_size
+        ):
+            records = bson.decode_all(batch)
+            yield (
+                np.fromiter(
+                    (i["created"] for i in records), dtype=np.int64, count=len(records)
+                ),
+                np.fromiter(
+                    (i["index"] for i in records), dtype=np.int64, count=len(records)
+                ),
+            )
+
+    @staticmethod
+    def import_from_dataframe(
+        df, dry_run: bool = False, chunk_size: int = RECORDS_BATCH_SIZE
+    ) -> dict:
+        """
+        Inserts a record for every CSV row unless a record already exists from that
+        date to the next day. Existing timestamps for the whole date span are
+        loaded with one query and matched with a binary search, and new records
+        are written with unordered insert_many calls of chunk_size records.
+        """
+        rows_count = len(df.index)
+        df = df[~df.index.duplicated(keep="first")].sort_index()
+        if df.empty:
+            return {"inserted": 0, "skipped": rows_count}
+
+        dates = df.index
+        if dates.tz is None:
+            dates = dates.tz_localize(GB, ambiguous=True, nonexistent="shift_forward")
+        dates = dates.tz_convert(GB)
+        next_day = pd.Timedelta(days=1)
+
+        existing = records_collection().find(
+            {
+                "created": {
+                    "$gte": dates.min().to_pydatetime(),
+                    "$lte": (dates.max() + next_day).to_pydatetime(),
+                }
+            },
+            {"_id": 0, "created": 1},
+        )
+        existing_created = np.sort(
+            pd.to_datetime([i["created"] for i in existing], utc=True).asi8
+        )
+
+        # first existing timestamp at or after each date, if within the next day
+        positions = np.searchsorted(existing_created, dates.asi8, side="left")
+        has_next = positions < len(existing_created)
+        is_duplicate = np.zeros(len(dates), dtype=bool)
+        is_duplicate[has_next] = (
+            existing_created[positions[has_next]] <= (dates + next_day).asi8[has_next]
+        )
+
+        new_records = [
+            vars(Record(str(index_value), created=created.to_pydatetime()))
+            for created, index_value in zip(
+                dates[~is_duplicate], df["Index"].to_numpy()[~is_duplicate]
+            )
+        ]
+        skipped = rows_count - len(new_records)
+        logging.info(
+            f"Importing {len(new_records)} records, skipping {skipped} that already exist"
+        )
+
+        if not dry_run:
+            for i in range(0, len(new_records), chunk_size):
+                records_collection().insert_many(
+                    new_records[slice(i, i + chunk_size)], ordered=False
                 )
-                # record = Record(
-                #     str(index_value), created=python_datetime.astimezone(GB).isoformat()
-                # )
-                # record.save_to_database()
-                inserted += 1
-        return inserted
+            if new_records:
+                latest_record_cache.update(new_records[-1])
+                _add_to_record_summaries(new_records)
+
+        return {"inserted": len(new_records), "skipped": skipped}
 
     @staticmethod
     @ensure_record_exists
@@ -81,6 +220,11 @@ class Record:
         record,
         record_id: uuid.UUID,
     ):
+        # migrated records already have a datetime, and time-series collections
+        # do not allow updating the time field
+        if isinstance(record["created"], datetime):
+            return UpdateResult({"n": 1, "nModified": 0}, acknowledged=True)
+
         update_record_operation = {
             "$set": {
                 "created": datetime.fromisoformat(record["created"]),
@@ -89,3 +233,7 @@ class Record:
         return db["records"].update_one(
             {"_id": ObjectId(record_id)}, update_record_operation, True
         )
+
+
+latest_record_cache = LatestRecordCache(loader=Record.find_most_recent_record)
+record_series = RecordSeries(loader=Record.iter_index_batches_created_after)
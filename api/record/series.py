@@ -0,0 +1,179 @@
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Callable, Iterable
+
+import numpy as np
+import pandas as pd
+
+from api.common.constants import RECORD_SERIES_REFRESH_SECONDS
+
+
+def to_epoch_ms(value: datetime) -> int:
+    return int(value.timestamp() * 1000)
+
+
+class RecordSeries:
+    """
+    Every record held once per process as two NumPy arrays, created as int64
+    epoch milliseconds and the index as uint8, sorted by created.
+
+    loader(created_after) yields (created, index) array batches of the records
+    created after a datetime, or of every record for None. refresh loads the
+    records newer than the last one loaded, and runs on a schedule or on read once
+    the series is refresh_seconds old. Records inserted by this process are added
+    straight away. Records sharing a created millisecond are kept once.
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[datetime], Iterable],
+        refresh_seconds: int = RECORD_SERIES_REFRESH_SECONDS,
+    ) -> None:
+        self.loader = loader
+        self.refresh_seconds = refresh_seconds
+        # replaced as a whole, so readers always see matching arrays
+        self._arrays = (np.array([], dtype=np.int64), np.array([], dtype=np.uint8))
+        self._loaded_until = None
+        self._refreshed_at = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self.refreshes = 0
+        self.reloads = 0
+
+    def arrays(self):
+        """Returns the created and index arrays, which must not be modified"""
+        if self._is_stale():
+            self.refresh()
+        return self._arrays
+
+    def slice(
+        self,
+        start: datetime,
+        end: datetime,
+        min_index: int = 0,
+        max_index: int = 100,
+    ):
+        """Records created from start up to end with an index in the given range"""
+        created, index = self.arrays()
+        start_position, end_position = np.searchsorted(
+            created, [to_epoch_ms(start), to_epoch_ms(end)], side="left"
+        )
+        created = created[slice(start_position, end_position)]
+        index = index[slice(start_position, end_position)]
+        if min_index > 0 or max_index < 100:
+            is_in_range = (index >= min_index) & (index <= max_index)
+            created, index = created[is_in_range], index[is_in_range]
+        return created, index
+
+    def first(self, start: datetime, end: datetime):
+        """The created and index of the first record from start up to end, or None"""
+        created, index = self.arrays()
+        position = np.searchsorted(created, to_epoch_ms(start), side="left")
+        if position == len(created) or created[position] >= to_epoch_ms(end):
+            return None
+        return int(created[position]), int(index[position])
+
+    def created_after(self, value: datetime = None):
+        """Records created strictly after value, or every record for None"""
+        created, index = self.arrays()
+        if value is None:
+            return created, index
+        position = np.searchsorted(created, to_epoch_ms(value), side="right")
+        return created[slice(position, None)], index[slice(position, None)]
+
+    def add(self, created: np.ndarray, index: np.ndarray):
+        self._add([(created, index)])
+
+    def refresh(self):
+        with self._refresh_lock:
+            loaded_until = (
+                datetime.fromtimestamp(self._loaded_until / 1000, tz=timezone.utc)
+                if self._loaded_until is not None
+                else None
+            )
+            batches = list(self.loader(loaded_until))
+            self._add(batches)
+            self._update_loaded_until(batches)
+            self._refreshed_at = time.monotonic()
+            self.refreshes += 1
+
+    def reload(self):
+        """Loads every record again, picking up older records inserted elsewhere"""
+        with self._refresh_lock:
+            batches = list(self.loader(None))
+            with self._lock:
+                self._arrays = self._merge(
+                    (np.array([], dtype=np.int64), np.array([], dtype=np.uint8)),
+                    batches,
+                )
+            self._loaded_until = None
+            self._update_loaded_until(batches)
+            self._refreshed_at = time.monotonic()
+            self.reloads += 1
+
+    def stats(self) -> dict:
+        created, index = self._arrays
+        return {
+            "records": len(created),
+            "bytes": created.nbytes + index.nbytes,
+            "refreshes": self.refreshes,
+            "reloads": self.reloads,
+            "secondsSinceRefresh": (
+                round(time.monotonic() - self._refreshed_at, 3)
+                if self._refreshed_at is not None
+                else None
+            ),
+        }
+
+    def _add(self, batches: list):
+        with self._lock:
+            self._arrays = self._merge(self._arrays, batches)
+
+    @staticmethod
+    def _merge(arrays: tuple, batches: list) -> tuple:
+        batches = [i for i in batches if len(i[0])]
+        if not batches:
+            return arrays
+        created = np.concatenate([arrays[0]] + [i[0] for i in batches])
+        index = np.concatenate([arrays[1]] + [i[1] for i in batches])
+        # sorts by created and keeps the first record of each millisecond
+        created, positions = np.unique(created, return_index=True)
+        return created, index[positions].astype(np.uint8)
+
+    def _update_loaded_until(self, batches: list):
+        for created, _ in batches:
+            if len(created) and (
+                self._loaded_until is None or created[-1] > self._loaded_until
+            ):
+                self._loaded_until = int(created[-1])
+
+    def _is_stale(self) -> bool:
+        return (
+            self._refreshed_at is None
+            or time.monotonic() - self._refreshed_at > self.refresh_seconds
+        )
+
+
+def generate_resampled_stats(values: pd.Series, rule: str, window: int) -> pd.DataFrame:
+    """
+    Mean, min, max and count of the index values per period of rule, starting
+    at each period's left edge in the timezone of the values' index, and the
+    mean, min and max of the records in each run of window periods, which are
+    NaN until window periods have passed. Periods without records have NaN
+    statistics and a count of 0.
+    """
+    periods = values.resample(rule, label="left", closed="left")
+    stats = periods.agg(["mean", "min", "max", "count", "sum"])
+
+    rolling_count = stats["count"].rolling(window, min_periods=1).sum()
+    stats["rollingMean"] = (
+        stats["sum"].rolling(window, min_periods=1).sum() / rolling_count
+    ).where(rolling_count > 0)
+    stats["rollingMin"] = stats["min"].rolling(window, min_periods=1).min()
+    stats["rollingMax"] = stats["max"].rolling(window, min_periods=1).max()
+    stats.iloc[
+        slice(0, window - 1),
+        stats.columns.get_indexer(["rollingMean", "rollingMin", "rollingMax"]),
+    ] = np.nan
+    return stats.drop(columns="sum")
@@ -1,48 +1,67 @@
+from itertools import chain
 import json
-from flask import Blueprint, request, make_response, jsonify
-import pandas_gbq
+from flask import Blueprint, request, jsonify
 from api.common.constants import (
     ASSETS_UPLOADS_BUCKET_NAME,
     CHART_LABELS,
+    CSV_STREAM_CHUNK_ROWS,
     DATETIME_FORMATE_CODE,
-    GCP_PROJECT_ID,
     PANDAS_DF_DATE_FORMATE_CODE,
-    ASSETS_PLOTS_BUCKET_NAME,
-    BIGQUERY_DATASET_ID,
+    RECORDS_DEBUG,
+    RECORDS_RESAMPLE_DEFAULT_WINDOW,
+    RECORDS_RESAMPLE_MAX_WINDOW,
+    RECORDS_RESAMPLE_RULES,
     BIGQUERY_TABLE_ID,
 )
-from api.db.setup import db
 from api.util.util import (
     generate_response,
     validate_date_string,
     is_allowed_file,
     generate_df_from_csv,
-    generate_figure_blob_filename,
+    summarise_records_csv,
     validate_date_string_for_pandas_df,
 )
-from api.util.cloud_storage_connector import CloudStorageConnector
+from api.util.cloud_storage_connector import get_storage_client
+from api.util.csv_stream import generate_csv_stream_response
+from api.util.plot_cache import plot_cache
+from api.util.plot_renderer import plot_renderer
+from api.util.warehouse import WarehouseQuery, get_warehouse_client
+from api.util.series_response import (
+    downsample_series,
+    generate_series_response,
+    get_series_format,
+    get_series_max_points,
+)
 from api.exception.models import BadRequestException
-from api.record.models import Record
+from api.record.histogram import (
+    description_band_codes,
+    generate_band_counts,
+    generate_decile_counts,
+    generate_histogram,
+    get_value_counts,
+)
+from api.record.models import (
+    GB,
+    Record,
+    record_series,
+    records_collection,
+    to_gb_datetime,
+)
+from api.record.series import generate_resampled_stats
+from api.record.warehouse_sync import sync_records_to_warehouse
 from api.auth.auth import auth_required, super_user_required
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from api.rate_limiter.rate_limiter import limiter
 from dateutil.relativedelta import relativedelta
-from google.cloud import storage
-from google.cloud import bigquery
 import logging
 import yaml
 import os
 import io
 import pandas as pd
 import numpy as np
-import matplotlib
-import matplotlib.pyplot as plt
 import seaborn as sns
 
 
-matplotlib.use("agg")
-
-
 bp = Blueprint("records", __name__)
 limiter.limit("25/minute")(bp)
 
@@ -73,44 +92,28 @@ def get_records(_):
                 status_code=400,
             )
         logging.info(f"Getting record for {record_date}")
-        filtered_df = _generate_filtered_dataframe()
-        filtered_df["created_date"] = filtered_df.index.date
-        logging.info(filtered_df.tail())
+        if RECORDS_DEBUG:
+            _log_record_date_diagnostics(record_date)
 
-        logging.info(f"{'Max index:':<20}{filtered_df['fear_greed_index'].max()}")
-        logging.info(f"{'Min index:':<20}{filtered_df['fear_greed_index'].min()}")
-        logging.info(
-            f"{'Mean index:':<20}{'{:.2f}'.format(filtered_df['fear_greed_index'].mean())}"
+        day = datetime.strptime(record_date, PANDAS_DF_DATE_FORMATE_CODE).date()
+        record = record_series.first(
+            to_gb_datetime(day), to_gb_datetime(day + timedelta(days=1))
         )
-
-        filtered_df = filtered_df.sort_index()
-
-        filtered_series = filtered_df.loc[record_date:record_date, "fear_greed_index"]
-        logging.info(filtered_series)
-        filtered_df_loc = filtered_df.loc[
-            record_date:record_date, ["fear_greed_index", "description"]
-        ]
-        logging.info(filtered_df_loc)
-
-        filtered_df_loc_specific_date = filtered_df.loc[
-            record_date, ["fear_greed_index", "description"]
-        ]
-        logging.info(filtered_df_loc_specific_date)
-
-        older_than_record_date_mask = filtered_df.index >= record_date
-
-        filtered_df_loc_masked = filtered_df[older_than_record_date_mask]
-        logging.info(filtered_df_loc_masked.head())
-
-        if not len(filtered_series):
-            return jsonify({"message": "Record for date not found"}), 404
+        if record:
+            _, index = record
+        else:
+            # older records imported by another process reach the series on reload
+            record = Record.find_first_record_on_date(day)
+            if not record:
+                return jsonify({"message": "Record for date not found"}), 404
+            index = int(record["index"])
         return jsonify(
             {
                 "date": record_date,
-                "index": int(
-                    filtered_series.iloc[0]
-                ),  # or int(filtered_series.values[0])
-                "description": str(filtered_df_loc.iloc[0]["description"]),
+                "index": index,
+                "description": yaml_content["columns"][
+                    int(description_band_codes(index))
+                ],
             }
         )
 
@@ -118,70 +121,142 @@ def get_records(_):
     sort_direction = (
         1 if "order" in request.args and request.args["order"] == "asc" else -1
     )
-    records = list(db["records"].find().sort("created", sort_direction).limit(count))
+    records = list(
+        records_collection().find().sort("created", sort_direction).limit(count)
+    )
+    for record in records:
+        record["created"] = record["created"].isoformat()
     return generate_response(records)
 
 
+def _log_record_date_diagnostics(record_date: str):
+    filtered_df = _generate_filtered_dataframe()
+    filtered_df["created_date"] = filtered_df.index.date
+    logging.info(filtered_df.tail())
+
+    logging.info(f"{'Max index:':<20}{filtered_df['fear_greed_index'].max()}")
+    logging.info(f"{'Min index:':<20}{filtered_df['fear_greed_index'].min()}")
+    logging.info(
+        f"{'Mean index:':<20}{'{:.2f}'.format(filtered_df['fear_greed_index'].mean())}"
+    )
+
+    filtered_df = filtered_df.sort_index()
+
+    logging.info(filtered_df.loc[record_date:record_date, "fear_greed_index"])
+    logging.info(
+        filtered_df.loc[record_date:record_date, ["fear_greed_index", "description"]]
+    )
+    logging.info(filtered_df.loc[record_date, ["fear_greed_index", "description"]])
+
+    older_than_record_date_mask = filtered_df.index >= record_date
+    logging.info(filtered_df[older_than_record_date_mask].head())
+
+
 @bp.route("/records-count", methods=(["GET"]))
 def get_records_count_bin():
-    pipeline = [
-        {"$project": {"_id": 0, "indexNumber": {"$toInt": "$index"}}},
-        {
-            "$project": {
-                "indexLowerBound": {
-                    "$subtract": ["$indexNumber", {"$mod": ["$indexNumber", 10]}]
-                }
-            }
-        },
-        {"$group": {"_id": "$indexLowerBound", "count": {"$sum": 1}}},
-        {"$sort": {"_id": -1}},
-    ]
-    res = db["records"].aggregate(pipeline)
-    return jsonify(list(res))
+    decile_counts = generate_decile_counts(
+        get_value_counts(date.min, datetime.today().date() + timedelta(days=1))
+    )
+    return jsonify(
+        [
+            {"_id": int(lower_bound), "count": int(count)}
+            for lower_bound, count in zip(range(100, -1, -10), decile_counts[::-1])
+            if count
+        ]
+    )
 
 
 @bp.route("/records/export-csv", methods=(["POST"]))
 def get_records_csv():
-    filtered_df = _generate_filtered_dataframe()
-    mean_index = filtered_df.loc[:, "fear_greed_index"].mean()
-    logging.info(f"Mean index is {mean_index:.2f}")
+    chunks = _generate_filtered_dataframe_chunks()
+    try:
+        first_chunk = next(chunks)
+    except StopIteration:
+        raise BadRequestException("No records found for date range", status_code=400)
 
-    logging.info(
-        filtered_df.groupby([filtered_df.index.strftime("%b %Y")])["fear_greed_index"]
-        .mean()
-        .reset_index(name="Monthly Average")
-    )
+    def generate_chunks_with_stats():
+        records_count = 0
+        index_sum = 0
+        description_counts = pd.Series(dtype=np.int64)
+        monthly_sums = pd.DataFrame(columns=["sum", "count"], dtype=np.int64)
+
+        for chunk in chain([first_chunk], chunks):
+            yield chunk
+            records_count += len(chunk.index)
+            index_sum += int(chunk["fear_greed_index"].sum())
+            description_counts = description_counts.add(
+                chunk["description"].value_counts(), fill_value=0
+            )
+            monthly_sums = monthly_sums.add(
+                chunk.groupby(chunk.index.tz_localize(None).to_period("M"))[
+                    "fear_greed_index"
+                ].agg(["sum", "count"]),
+                fill_value=0,
+            )
 
-    logging.info(f"Unique description values: {filtered_df['description'].unique()}")
+        logging.info(f"Mean index is {index_sum / records_count:.2f}")
+        logging.info(
+            (monthly_sums["sum"] / monthly_sums["count"])
+            .rename(index=lambda i: i.strftime("%b %Y"))
+            .reset_index(name="Monthly Average")
+        )
+        logging.info(f"Description counts: {description_counts.astype(int).to_dict()}")
+        most_common_description = description_counts.idxmax()
+        logging.info(
+            f"Most common description {most_common_description} has count {int(description_counts[most_common_description])}"
+        )
 
-    neutral_values_df = (
-        filtered_df.groupby("description")
-        .agg({"fear_greed_index": lambda x: list(x)})
-        .filter(items=["Neutral"], axis=0)
+    return generate_csv_stream_response(
+        generate_chunks_with_stats(), index_label="created"
     )
 
-    logging.info(
-        f"Neutral index values: {neutral_values_df['fear_greed_index'].values[0]}"
-    )
 
-    most_common_description_series = (
-        filtered_df["description"].value_counts()[:1].sort_values(ascending=False)
-    )
-    most_common_description = most_common_description_series.index[0]
-    most_common_description_count = most_common_description_series.loc[
-        most_common_description
-    ]
+@bp.route("/records/resample", methods=(["GET"]))
+@auth_required
+def get_records_resample(_):
+    frequency = request.args.get("frequency", "weekly")
+    if frequency not in RECORDS_RESAMPLE_RULES:
+        raise BadRequestException(
+            f"Invalid frequency {frequency}. Must be one of {', '.join(RECORDS_RESAMPLE_RULES)}",
+            status_code=400,
+        )
 
-    logging.info(
-        f"Most common description {most_common_description} has count {most_common_description_count}"
-    )
+    window = request.args.get("window", str(RECORDS_RESAMPLE_DEFAULT_WINDOW))
+    if not window.isdigit() or not 1 <= int(window) <= RECORDS_RESAMPLE_MAX_WINDOW:
+        raise BadRequestException(
+            f"Invalid window. Must be between 1 and {RECORDS_RESAMPLE_MAX_WINDOW}",
+            status_code=400,
+        )
+
+    created, fear_greed_index = _get_filtered_series()
+    if not len(created):
+        raise BadRequestException("No records found for date range", status_code=400)
 
-    response = make_response(filtered_df.to_csv())
-    response.headers["Content-Disposition"] = (
-        f"attachment; filename={datetime.today().strftime(DATETIME_FORMATE_CODE)}.csv"
+    values = pd.Series(
+        fear_greed_index.astype(np.int64),
+        index=pd.to_datetime(created, unit="ms", utc=True).tz_convert(GB),
+    )
+    stats = generate_resampled_stats(
+        values, RECORDS_RESAMPLE_RULES[frequency], int(window)
+    )
+    return jsonify(
+        {
+            "frequency": frequency,
+            "window": int(window),
+            "periods": _generate_resampled_periods(stats),
+        }
     )
-    response.mimetype = "text/csv"
-    return response
+
+
+def _generate_resampled_periods(stats: pd.DataFrame) -> list:
+    integer_columns = ["min", "max", "count", "rollingMin", "rollingMax"]
+    values = stats.round(2).astype(object)
+    values[integer_columns] = stats[integer_columns].astype("Int64").astype(object)
+    values = values.where(stats.notna(), None)
+    return [
+        {"start": start.strftime(PANDAS_DF_DATE_FORMATE_CODE), **period}
+        for start, period in zip(values.index, values.to_dict("records"))
+    ]
 
 
 @bp.route("/records/upload-csv", methods=(["POST"]))
@@ -193,49 +268,33 @@ def upload_records_csv(_):
         raise BadRequestException("Please upload a CSV file", status_code=400)
 
     try:
-        df = pd.read_csv(
-            file, encoding="utf-8", index_col=["Date"], parse_dates=["Date"]
-        )
-    except Exception as e:
+        records_summary = summarise_records_csv(file.stream)
+    except ValueError as e:
         raise BadRequestException(f"Failed to read CSV {e}", status_code=400)
-    if "Index" in df.columns:
-        logging.info("CSV has required columns.")
-    logging.info(
-        f"Count of records: {len(df.index)} Start date: {df.index.min().strftime(DATETIME_FORMATE_CODE)} End date: {df.index.max().strftime(DATETIME_FORMATE_CODE)}"
-    )
 
-    first_row_date = df.index[0]
-    first_row_fear_greed_index_value = df.loc[first_row_date, "Index"]
-    last_row_fear_greed_index_value = df.loc[df.index[-1], "Index"]
     logging.info(
-        f"First row with date {first_row_date.strftime(DATETIME_FORMATE_CODE)} has index value: {first_row_fear_greed_index_value}"
+        f"Count of records: {records_summary['recordsCount']} Start date: {records_summary['startDate'].strftime(DATETIME_FORMATE_CODE)} End date: {records_summary['endDate'].strftime(DATETIME_FORMATE_CODE)}"
     )
 
-    return jsonify(
-        {
-            "recordsCount": len(df.index),
-            "startDate": df.index.min(),
-            "startDateIndexValue": int(first_row_fear_greed_index_value),
-            "endDate": df.index.max(),
-            "endDateIndexValue": int(last_row_fear_greed_index_value),
-        }
-    )
+    return jsonify(records_summary)
 
 
 @bp.route("/records/import-from-csv", methods=(["POST"]))
 @auth_required
 def import_records_from_csv(_):
     object_url = request.get_json()["objectUrl"]
-    storage_client = storage.Client()
     blob_name = object_url.split("/")[-1]
-    bucket = storage_client.bucket(ASSETS_UPLOADS_BUCKET_NAME)
+    bucket = get_storage_client().bucket(ASSETS_UPLOADS_BUCKET_NAME)
     blob = bucket.blob(blob_name)
     data = blob.download_as_bytes()
     df = generate_df_from_csv(io.BytesIO(data))
-    records_imported = Record.import_from_dataframe(df)
+    import_result = Record.import_from_dataframe(
+        df, dry_run=bool(request.get_json().get("dryRun", False))
+    )
     return jsonify(
         {
-            "recordsImported": records_imported,
+            "recordsImported": import_result["inserted"],
+            "recordsSkipped": import_result["skipped"],
             "recordsCount": len(df.index),
             "startDate": df.index.min(),
             "endDate": df.index.max(),
@@ -246,6 +305,8 @@ def import_records_from_csv(_):
 @bp.route("/records/generate-plot", methods=(["POST"]))
 @auth_required
 def generate_plot_gcs_blob(_):
+    series_format = get_series_format()
+    max_points = get_series_max_points()
     chart_type = request.args["chartType"] if "chartType" in request.args else "scatter"
     bins_size = request.args["binSize"] if "binSize" in request.args else 5
 
@@ -255,61 +316,116 @@ def generate_plot_gcs_blob(_):
         logging.error(e)
         raise BadRequestException("Invalid bin size", status_code=400)
 
-    df = _generate_filtered_dataframe()
+    if chart_type not in ("scatter", "histogram", "pie", "bar"):
+        return jsonify({"message": f"Invalid chart type {chart_type}"}), 500
 
-    plt.figure(figsize=(10, 6))
+    if chart_type == "scatter":
+        df = _generate_filtered_dataframe()
+        data_version = [df.index.max(), len(df.index)]
+        df = downsample_series(df, max_points)
+    else:
+        # histograms and description counts are summed from the daily counters
+        start_date, end_date, min_index, max_index = _get_filter_args()
+        value_counts = get_value_counts(start_date, end_date)
+        value_counts[slice(0, max(min_index, 0))] = 0
+        value_counts[slice(max(max_index + 1, 0), None)] = 0
+        if not value_counts.any():
+            raise BadRequestException(
+                "No records found for date range", status_code=400
+            )
+        df = pd.Series(value_counts, name="count")
+        data_version = value_counts.tolist()
+
+    if series_format != "png":
+        return generate_series_response(
+            _generate_records_plot_series(df, chart_type, int(bins_size)),
+            series_format,
+            chartType=chart_type,
+        )
+
+    # the filter arguments and the latest record decide what the plot shows
+    blob_public_url = plot_cache.get_or_create(
+        chart_type,
+        {**request.args.to_dict(), "maxPoints": max_points},
+        data_version,
+        lambda: plot_renderer.render(
+            _draw_records_plot, df, chart_type, int(bins_size)
+        ),
+    )
+    return jsonify({"image_url": blob_public_url}), 200
+
+
+def _generate_description_counts(value_counts: pd.Series) -> pd.Series:
+    return pd.Series(
+        generate_band_counts(value_counts.to_numpy()),
+        index=pd.Index(yaml_content["columns"], name="description"),
+        name="count",
+    ).sort_values(ascending=False, kind="stable")
+
+
+def _generate_records_plot_series(data, chart_type: str, bins_size: int):
+    """
+    Returns the values a chart type plots, without drawing it. data is the
+    records for a scatter plot, and the count of each index value otherwise.
+    """
+    if chart_type == "scatter":
+        return data[["fear_greed_index"]]
+
+    if chart_type == "histogram":
+        counts, edges = generate_histogram(data.to_numpy(), bins_size)
+        return pd.DataFrame(
+            {"count": counts},
+            index=pd.Index(np.round(0.5 * (edges[1:] + edges[:-1]), 4)),
+        )
+
+    description_counts = _generate_description_counts(data)
+    if chart_type == "pie":
+        return (description_counts / description_counts.sum()).to_frame("proportion")
+    return description_counts.to_frame()
+
+
+def _draw_records_plot(fig, df, chart_type: str, bins_size: int):
+    ax = fig.add_subplot()
 
     if chart_type == "scatter":
         sns.scatterplot(
-            x=df.index, y=df["fear_greed_index"], color="blue", label="Index"
+            x=df.index, y=df["fear_greed_index"], color="blue", label="Index", ax=ax
         )
-        plt.title("Fear & Greed Index Scatter Plot", fontsize=14)
-        plt.xlabel("Created", fontsize=12)
-        plt.ylabel("Index", fontsize=12)
+        ax.set_title("Fear & Greed Index Scatter Plot", fontsize=14)
+        ax.set_xlabel("Created", fontsize=12)
+        ax.set_ylabel("Index", fontsize=12)
 
     elif chart_type == "histogram":
-        n, x, _ = plt.hist(df["fear_greed_index"], bins=int(bins_size), histtype="step")
-        bin_centers = 0.5 * (x[1:] + x[:-1])
-        plt.plot(bin_centers, n)
-        plt.title("Fear & Greed Index Histogram", fontsize=12)
-        plt.xlabel("Index", fontsize=12)
-        plt.ylabel("Count", fontsize=12)
+        counts, edges = generate_histogram(df.to_numpy(), bins_size)
+        ax.stairs(counts, edges)
+        bin_centers = 0.5 * (edges[1:] + edges[:-1])
+        ax.plot(bin_centers, counts)
+        ax.set_title("Fear & Greed Index Histogram", fontsize=12)
+        ax.set_xlabel("Index", fontsize=12)
+        ax.set_ylabel("Count", fontsize=12)
 
     elif chart_type == "pie":
-        description_counts = df["description"].value_counts()
+        description_counts = _generate_description_counts(df)
         description_proportions = description_counts / description_counts.sum()
-        plt.pie(
+        ax.pie(
             description_proportions,
             labels=CHART_LABELS,
             autopct="%1.1f%%",
         )
-        plt.title("Distribution of index by labels")
+        ax.set_title("Distribution of index by labels")
 
     elif chart_type == "bar":
-        description_counts = df["description"].value_counts()
-        plt.bar(
+        description_counts = _generate_description_counts(df)
+        ax.bar(
             CHART_LABELS,
             description_counts,
         )
-        plt.xlabel("Index", fontsize=12)
-        plt.ylabel("Count", fontsize=12)
-        plt.title("Distribution of index by labels")
-
-    else:
-        return jsonify({"message": f"Invalid chart type {chart_type}"}), 500
+        ax.set_xlabel("Index", fontsize=12)
+        ax.set_ylabel("Count", fontsize=12)
+        ax.set_title("Distribution of index by labels")
 
-    fig_to_upload = plt.gcf()
-    cloud_storage_connector = CloudStorageConnector(
-        bucket_name=ASSETS_PLOTS_BUCKET_NAME
-    )
-    file_name = generate_figure_blob_filename(chart_type)
-    blob_public_url = cloud_storage_connector.upload_pyplot_figure(
-        fig_to_upload, file_name
-    )
-    return jsonify({"image_url": blob_public_url}), 200
 
-
-def _generate_filtered_dataframe():
+def _get_filter_args():
     min_index = int(request.args["min"]) if "min" in request.args else 0
     max_index = int(request.args["max"]) if "max" in request.args else 100
 
@@ -338,53 +454,55 @@ def _generate_filtered_dataframe():
     if datetime.strptime(end_date, DATETIME_FORMATE_CODE) > datetime.today():
         raise BadRequestException("End date cannot be after today", status_code=400)
 
-    if start_date and end_date:
-        records = list(
-            db["records"].find(
-                {
-                    "created": {
-                        "$gte": datetime.strptime(start_date, DATETIME_FORMATE_CODE)
-                        .date()
-                        .isoformat(),
-                        "$lt": datetime.strptime(end_date, DATETIME_FORMATE_CODE)
-                        .date()
-                        .isoformat(),
-                    }
-                }
-            )
-        )
-    else:
-        records = list(db["records"].find())
+    return (
+        datetime.strptime(start_date, DATETIME_FORMATE_CODE).date(),
+        datetime.strptime(end_date, DATETIME_FORMATE_CODE).date(),
+        min_index,
+        max_index,
+    )
 
-    if not records:
-        raise BadRequestException("No records found for date range", status_code=400)
 
-    df = pd.DataFrame(records)
+def _generate_records_df(created: np.ndarray, fear_greed_index: np.ndarray):
+    df = pd.DataFrame(
+        {"fear_greed_index": fear_greed_index.astype(np.int64)},
+        index=pd.DatetimeIndex(
+            pd.to_datetime(created, unit="ms", utc=True), name="created"
+        ),
+    )
+
+    df["description"] = pd.Categorical.from_codes(
+        description_band_codes(fear_greed_index),
+        categories=tuple(yaml_content["columns"]),
+    )
+    return df
 
-    # drop redundant columns
-    df = df.drop(columns=["_id"])
-    if "creatd" in df.columns:
-        df = df.drop(columns=["creatd"])
 
-    # re-name column
-    df.rename(columns={"index": "fear_greed_index"}, inplace=True)
+def _get_filtered_series():
+    """The created and index arrays of the filtered records from record_series"""
+    start_date, end_date, min_index, max_index = _get_filter_args()
+    return record_series.slice(
+        to_gb_datetime(start_date),
+        to_gb_datetime(end_date),
+        min_index=min_index,
+        max_index=max_index,
+    )
 
-    # remove rows with empty created timestamp
-    df["created"] = df["created"].replace("", np.nan)
-    df.dropna(subset=["created"], inplace=True)
 
-    # set created column as data frame index
-    df["created"] = pd.to_datetime(df["created"], format="ISO8601", utc=True)
-    df = df.set_index("created")
+def _generate_filtered_dataframe_chunks():
+    """Yields the filtered records CSV_STREAM_CHUNK_ROWS at a time"""
+    created, fear_greed_index = _get_filtered_series()
+    for i in range(0, len(created), CSV_STREAM_CHUNK_ROWS):
+        rows = slice(i, i + CSV_STREAM_CHUNK_ROWS)
+        yield _generate_records_df(created[rows], fear_greed_index[rows])
 
-    df = df.astype({"fear_greed_index": int})
 
-    # also fill NaN values using an interpolation method
-    df.interpolate(method="linear", axis=1)
+def _generate_filtered_dataframe():
+    created, fear_greed_index = _get_filtered_series()
 
-    bins = (0, 25, 45, 55, 75, 100)
-    group_names = tuple(yaml_content["columns"])
-    df["description"] = pd.cut(df["fear_greed_index"], bins, labels=group_names)
+    if not len(created):
+        raise BadRequestException("No records found for date range", status_code=400)
+
+    df = _generate_records_df(created, fear_greed_index)
 
     df_value_counts_description = df.value_counts(["description"]).reset_index(
         name="count"
@@ -394,9 +512,7 @@ def _generate_filtered_dataframe():
         count = row["count"]
         logging.info(f"{description} has count {count}")
 
-    return df.loc[
-        (df["fear_greed_index"] >= min_index) & (df["fear_greed_index"] <= max_index)
-    ]
+    return df
 
 
 def _generate_random_dataframe():
@@ -410,22 +526,15 @@ def _generate_random_dataframe():
 
 @bp.route("/records/sync-bq", methods=(["POST"]))
 def sync_records_to_bigquery():
-    filtered_df = _generate_filtered_dataframe()
-
-    bq_df = filtered_df.drop("description", axis=1)
-
-    # microsecond precision
-    bq_df.index = pd.to_datetime(bq_df.index.round("us"))
-
-    pandas_gbq.to_gbq(
-        bq_df,
-        f"{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}",
-        project_id=GCP_PROJECT_ID,
-        if_exists="replace",
+    sync_result = sync_records_to_warehouse(get_warehouse_client())
+    return jsonify(
+        {
+            "recordsSynced": sync_result["synced"],
+            "loadJobs": sync_result["loadJobs"],
+            "watermark": sync_result["watermark"],
+        }
     )
 
-    return "Ok", 200
-
 
 @bp.route("/records/<record_id>", methods=["PATCH"])
 @auth_required
@@ -448,9 +557,11 @@ def get_records_from_bigquery(user):
 
     logging.info(f"Requestor email: {user['email']}")
 
-    bq_client = bigquery.Client(project=GCP_PROJECT_ID)
+    warehouse_client = get_warehouse_client()
 
-    columns = ["created", "fear_greed_index"]
+    query = WarehouseQuery(BIGQUERY_TABLE_ID, ["created", "fear_greed_index"]).order_by(
+        "created", descending=True
+    )
 
     start_date_arg = request.args.get("startDate")
     end_date_arg = request.args.get("endDate")
@@ -465,33 +576,15 @@ def get_records_from_bigquery(user):
                 "Invalid date input. Must be in format YYYY-MM-DD", status_code=400
             )
 
-        query = f"""
-SELECT {','.join(columns)}
-FROM `{GCP_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}`
-WHERE created > '{start_date_arg}'
-AND created < '{end_date_arg}'
-ORDER BY created DESC
-"""
-    else:
-        query = f"""
-SELECT {','.join(columns)}
-FROM `{GCP_PROJECT_ID}.{BIGQUERY_DATASET_ID}.{BIGQUERY_TABLE_ID}`
-ORDER BY created DESC
-"""
-
-    query_job = bq_client.query(
-        query,
-    )
+        query.where(
+            "created", ">", pd.Timestamp(start_date_arg, tz="UTC").to_pydatetime()
+        ).where("created", "<", pd.Timestamp(end_date_arg, tz="UTC").to_pydatetime())
 
-    # Wait and get results
-    df = query_job.to_dataframe()  # ← very convenient if you like pandas
+    query_result = warehouse_client.run_query(query)
+    df = query_result.df
     df = df.set_index("created")
     logging.info(df.head())
 
-    logging.info(
-        f"Query cost: {query_job.total_bytes_processed / 1_000_000_000:.2f} GB"
-    )
-
     df_copy = df.copy()
     df_copy["rolling_average"] = df_copy["fear_greed_index"].rolling(window=25).mean()
     df_copy["is_above_average"] = (
@@ -505,6 +598,8 @@ ORDER BY created DESC
             "recordsCount": len(df.index),
             "startDate": df.index.min(),
             "endDate": df.index.max(),
+            "bytesProcessed": query_result.bytes_processed,
+            "cached": query_result.cached,
             "orders": json.loads(df.to_json(orient="table")),
         }
     )
@@ -0,0 +1,55 @@
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+from api.common.constants import BIGQUERY_TABLE_ID, WAREHOUSE_LOAD_BATCH_ROWS
+from api.record.models import record_series
+from api.record.series import RecordSeries
+from api.util.warehouse import WarehouseClient
+
+_sync_lock = threading.Lock()
+
+
+def _generate_load_df(created: np.ndarray, index: np.ndarray) -> pd.DataFrame:
+    return pd.DataFrame(
+        {"fear_greed_index": index.astype(np.int64)},
+        index=pd.DatetimeIndex(
+            pd.to_datetime(created, unit="ms", utc=True), name="created"
+        ),
+    )
+
+
+def sync_records_to_warehouse(
+    warehouse_client: WarehouseClient,
+    table_id: str = BIGQUERY_TABLE_ID,
+    load_batch_rows: int = WAREHOUSE_LOAD_BATCH_ROWS,
+    series: RecordSeries = record_series,
+) -> dict:
+    """
+    Appends records created after the newest created value already in the table.
+
+    The high-water mark is read from the table itself, and records are sliced
+    from the refreshed record series oldest first, in load jobs of up to
+    load_batch_rows rows that each succeed or fail as a whole, so a sync retried
+    after a failure carries on from the last loaded batch without duplicating rows.
+    """
+    with _sync_lock:
+        watermark = warehouse_client.get_max_value(table_id, "created")
+        logging.info(f"Syncing records created after {watermark} to {table_id}")
+
+        series.refresh()
+        created, index = series.created_after(watermark)
+        synced = 0
+        load_jobs = 0
+        for i in range(0, len(created), load_batch_rows):
+            rows = slice(i, i + load_batch_rows)
+            synced += warehouse_client.append_dataframe(
+                table_id, _generate_load_df(created[rows], index[rows])
+            )
+            load_jobs += 1
+
+        watermark = warehouse_client.get_max_value(table_id, "created")
+        logging.info(f"Synced {synced} records in {load_jobs} load jobs")
+        return {"synced": synced, "loadJobs": load_jobs, "watermark": watermark}
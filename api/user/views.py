@@ -1,22 +1,25 @@
 from flask import Blueprint, request, jsonify
-from matplotlib import pyplot as plt
 from pydantic import ValidationError
 from werkzeug.security import check_password_hash
-from google.cloud import storage
 from bson.objectid import ObjectId
-from api.common.constants import (
-    ASSETS_PLOTS_BUCKET_NAME,
-    ASSETS_UPLOADS_BUCKET_NAME,
-    GCP_PROJECT_ID,
-)
+from api.common.constants import ASSETS_UPLOADS_BUCKET_NAME
 from api.db.setup import db
-from api.util.cloud_storage_connector import CloudStorageConnector
-from api.util.util import generate_figure_blob_filename, generate_response
+from api.util.cloud_storage_connector import get_storage_client
+from api.util.plot_cache import plot_cache
+from api.util.plot_renderer import plot_renderer
+from api.util.series_response import (
+    downsample_series,
+    generate_series_response,
+    get_series_format,
+    get_series_max_points,
+)
+from api.util.util import generate_response
 from api.auth.auth import auth_required, validate_google_oauth_token
 from api.exception.models import UnauthorizedException, BadRequestException
 import os
 import jwt
 import logging
+import pandas as pd
 from datetime import datetime, timedelta, timezone
 import pytz
 from .models import PlotPortfolioRoiRequest, UpdateUserPortfolioRequest, User, Currency
@@ -152,8 +155,7 @@ def update_user_by_id(current_user, user_id):
 @bp.route("/upload-file", methods=(["POST"]))
 def upload_image():
     try:
-        storage_client = storage.Client(project=GCP_PROJECT_ID)
-        bucket = storage_client.get_bucket(ASSETS_UPLOADS_BUCKET_NAME)
+        bucket = get_storage_client().bucket(ASSETS_UPLOADS_BUCKET_NAME)
         file = request.files["file"]
         GB = pytz.timezone("Europe/London")
         timestamp = datetime.now(timezone.utc).astimezone(GB).timestamp()
@@ -266,6 +268,8 @@ def get_user_portfolio_analysis(_, user_id):
 @auth_required
 def generate_portfolio_roi_plot_gcs_blob(_, user_id):
 
+    series_format = get_series_format()
+    max_points = get_series_max_points()
     try:
         plot_portfolio_roi_request = PlotPortfolioRoiRequest.model_validate_json(
             request.data
@@ -278,23 +282,49 @@ def generate_portfolio_roi_plot_gcs_blob(_, user_id):
         user_id=user_id, benchmark=plot_portfolio_roi_request.benchmark_stock_symbol
     )
 
-    _ = plt.figure(num=1, clear=True, figsize=(10, 6))
-
-    plt.plot(portfolio_roi, label="My Portfolio ROI", linewidth=1, color="blue")
-    plt.plot(benchmark_roi, label="S&P 500 ROI", linestyle="--", color="red")
+    # holdings change the series without moving their latest timestamp
+    data_version = [
+        portfolio_roi.index.max(),
+        int(pd.util.hash_pandas_object(portfolio_roi).sum()),
+    ]
+    roi_df = downsample_series(
+        pd.concat(
+            {"portfolioRoi": portfolio_roi, "benchmarkRoi": benchmark_roi}, axis=1
+        ),
+        max_points,
+    )
 
-    plt.title("Portfolio ROI vs. S&P 500 Benchmark")
-    plt.ylabel("Growth (Base 1.0)")
-    plt.legend()
-    plt.grid(True, alpha=0.3)
-    plt.tight_layout()
+    if series_format != "png":
+        return generate_series_response(
+            roi_df,
+            series_format,
+            benchmark=plot_portfolio_roi_request.benchmark_stock_symbol,
+        )
 
-    fig_to_upload = plt.gcf()
-    cloud_storage_connector = CloudStorageConnector(
-        bucket_name=ASSETS_PLOTS_BUCKET_NAME
-    )
-    file_name = generate_figure_blob_filename("portfolio_roi")
-    blob_public_url = cloud_storage_connector.upload_pyplot_figure(
-        fig_to_upload, file_name
+    blob_public_url = plot_cache.get_or_create(
+        "portfolio_roi",
+        {
+            "user": user_id,
+            "benchmark": plot_portfolio_roi_request.benchmark_stock_symbol,
+            "maxPoints": max_points,
+        },
+        data_version,
+        lambda: plot_renderer.render(
+            _draw_portfolio_roi_plot,
+            roi_df["portfolioRoi"].dropna(),
+            roi_df["benchmarkRoi"].dropna(),
+        ),
     )
     return jsonify({"image_url": blob_public_url}), 200
+
+
+def _draw_portfolio_roi_plot(fig, portfolio_roi, benchmark_roi):
+    ax = fig.add_subplot()
+    ax.plot(portfolio_roi, label="My Portfolio ROI", linewidth=1, color="blue")
+    ax.plot(benchmark_roi, label="S&P 500 ROI", linestyle="--", color="red")
+
+    ax.set_title("Portfolio ROI vs. S&P 500 Benchmark")
+    ax.set_ylabel("Growth (Base 1.0)")
+    ax.legend()
+    ax.grid(True, alpha=0.3)
+    fig.tight_layout()
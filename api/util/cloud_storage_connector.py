@@ -1,25 +1,148 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
 from google.cloud import storage
-import io
 
+from api.common.constants import (
+    STORAGE_UPLOAD_MAX_ATTEMPTS,
+    STORAGE_UPLOAD_MAX_WORKERS,
+    STORAGE_UPLOAD_RETRY_BACKOFF_SECONDS,
+)
+
+_storage_client = None
+_storage_client_lock = threading.Lock()
+
+
+def get_storage_client() -> storage.Client:
+    """
+    Returns the process-wide storage client, so credentials are resolved once and
+    HTTP connections are reused. Set STORAGE_EMULATOR_HOST to point it at a local
+    fake GCS server, in which case no credentials are needed.
+    """
+    global _storage_client
+    with _storage_client_lock:
+        if _storage_client is None:
+            _storage_client = storage.Client()
+        return _storage_client
+
+
+class BackgroundUploader:
+    """Runs uploads on a small thread pool, retrying failures with backoff"""
 
-class CloudStorageConnector:
     def __init__(
         self,
-        bucket_name,
+        max_workers: int = STORAGE_UPLOAD_MAX_WORKERS,
+        max_attempts: int = STORAGE_UPLOAD_MAX_ATTEMPTS,
+        backoff_seconds: float = STORAGE_UPLOAD_RETRY_BACKOFF_SECONDS,
     ) -> None:
+        self.max_workers = max_workers
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self._executor = None
+        self._lock = threading.Lock()
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.retries = 0
+        self.upload_seconds_total = 0.0
 
-        self.bucket_name = bucket_name
-        self.storage_client = storage.Client()
+    def submit(self, upload: Callable, blob_name: str, on_failure: Callable = None):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="gcs-upload"
+                )
+            self.submitted += 1
+        return self._executor.submit(self._run, upload, blob_name, on_failure)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "retries": self.retries,
+                "pending": self.submitted - self.completed - self.failed,
+                "uploadSecondsTotal": round(self.upload_seconds_total, 3),
+            }
+
+    def _run(self, upload: Callable, blob_name: str, on_failure: Callable):
+        start_time = time.perf_counter()
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                upload()
+                break
+            except Exception as e:
+                if attempt == self.max_attempts:
+                    logging.error(f"Upload of {blob_name} failed - {e}")
+                    with self._lock:
+                        self.failed += 1
+                    if on_failure:
+                        on_failure()
+                    return
+                logging.info(f"Retrying upload of {blob_name} - {e}")
+                with self._lock:
+                    self.retries += 1
+                time.sleep(self.backoff_seconds * 2 ** (attempt - 1))
+
+        with self._lock:
+            self.completed += 1
+            self.upload_seconds_total += time.perf_counter() - start_time
+
+
+background_uploader = BackgroundUploader()
+
+
+def _reset_after_fork():
+    # pooled connections and upload threads are not shared with forked processes
+    global _storage_client, _storage_client_lock
+    _storage_client = None
+    _storage_client_lock = threading.Lock()
+    background_uploader._executor = None
+    background_uploader._lock = threading.Lock()
 
-    def upload_pyplot_figure(self, figure, blob_name: str) -> str:
-        buf = io.BytesIO()
-        figure.savefig(buf, format="png")
 
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+class CloudStorageConnector:
+    def __init__(self, bucket_name, storage_client: storage.Client = None) -> None:
+
+        self.bucket_name = bucket_name
+        self.storage_client = storage_client or get_storage_client()
+
+    def upload_png(
+        self,
+        png_bytes: bytes,
+        blob_name: str,
+        wait: bool = True,
+        on_failure: Callable = None,
+    ) -> str:
+        """
+        Uploads the PNG and returns its public URL. With wait=False the URL is
+        returned straight away and the upload completes in the background.
+        """
         bucket = self.storage_client.bucket(self.bucket_name)
         blob = bucket.blob(blob_name)
-        blob.upload_from_file(buf, content_type="image/png", rewind=True)
+
+        def upload():
+            blob.upload_from_string(png_bytes, content_type="image/png")
+
+        if wait:
+            upload()
+        else:
+            background_uploader.submit(upload, blob_name, on_failure=on_failure)
         return blob.public_url
 
+    def get_blob(self, blob_name: str):
+        """Returns the blob with its metadata, or None if it does not exist"""
+        bucket = self.storage_client.bucket(self.bucket_name)
+        return bucket.get_blob(blob_name)
+
     def upload_json_file(self, json_file_name: str, json_file_path: str) -> str:
         bucket = self.storage_client.bucket(self.bucket_name)
         blob = bucket.blob(f"data/{json_file_name}")
@@ -27,11 +150,16 @@ class CloudStorageConnector:
             blob.upload_from_file(f, content_type="application/json")
         return blob.public_url
 
-    def upload_pkl(self, stock_symbol: str, pkl_file_name: str, pkl_file_path: str):
+    def upload_model(
+        self,
+        stock_symbol: str,
+        model_file_name: str,
+        model_file,
+        content_type: str = "application/octet-stream",
+    ):
         bucket = self.storage_client.bucket(self.bucket_name)
-        blob = bucket.blob(f"models/{stock_symbol}/{pkl_file_name}")
-        with open(pkl_file_path, "rb") as f:
-            blob.upload_from_file(f)
+        blob = bucket.blob(f"models/{stock_symbol}/{model_file_name}")
+        blob.upload_from_file(model_file, content_type=content_type, rewind=True)
 
     def download_pkl(self, stock_symbol: str, pkl_file_name: str):
         bucket = self.storage_client.bucket(self.bucket_name)
@@ -42,3 +170,8 @@ class CloudStorageConnector:
         bucket = self.storage_client.bucket(self.bucket_name)
         blob = bucket.blob(f"models/{stock_symbol}/{pkl_file_name}")
         return blob.exists()
+
+    def get_model_blob(self, stock_symbol: str, model_file_name: str):
+        """Returns the model blob with its metadata, or None if it does not exist"""
+        bucket = self.storage_client.bucket(self.bucket_name)
+        return bucket.get_blob(f"models/{stock_symbol}/{model_file_name}")
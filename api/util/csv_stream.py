@@ -0,0 +1,44 @@
+from datetime import datetime
+from typing import Iterable, Iterator
+
+import pandas as pd
+from flask import Response, stream_with_context
+
+from api.common.constants import CSV_STREAM_CHUNK_ROWS, DATETIME_FORMATE_CODE
+
+
+def generate_csv_chunks(
+    chunks: Iterable[pd.DataFrame], index_label: str = None
+) -> Iterator[str]:
+    """
+    Yields the CSV text of each DataFrame chunk, with the header only on the
+    first one, so only one chunk is ever formatted in memory
+    """
+    header = True
+    for chunk in chunks:
+        yield chunk.to_csv(header=header, index_label=index_label)
+        header = False
+
+
+def split_df(
+    df: pd.DataFrame, chunk_rows: int = CSV_STREAM_CHUNK_ROWS
+) -> Iterator[pd.DataFrame]:
+    for i in range(0, len(df.index), chunk_rows):
+        yield df.iloc[slice(i, i + chunk_rows)]
+
+
+def generate_csv_stream_response(
+    chunks: Iterable[pd.DataFrame], index_label: str = None
+) -> Response:
+    """
+    Returns a CSV attachment response written as chunks are produced. Without a
+    Content-Length the server sends it with chunked transfer encoding.
+    """
+    response = Response(
+        stream_with_context(generate_csv_chunks(chunks, index_label=index_label)),
+        mimetype="text/csv",
+    )
+    response.headers["Content-Disposition"] = (
+        f"attachment; filename={datetime.today().strftime(DATETIME_FORMATE_CODE)}.csv"
+    )
+    return response
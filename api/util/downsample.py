@@ -0,0 +1,96 @@
+import numpy as np
+import pandas as pd
+
+DOWNSAMPLE_METHODS = ("lttb", "minmax")
+
+
+def _bucket_edges(start: int, stop: int, buckets: int) -> np.ndarray:
+    return np.linspace(start, stop, buckets + 1).astype(int)
+
+
+def _bucket_means(values: np.ndarray, edges: np.ndarray) -> np.ndarray:
+    """Means of values[edges[i]:edges[i + 1]], ignoring NaN"""
+    is_valid = ~np.isnan(values)
+    sums = np.add.reduceat(np.where(is_valid, values, 0), edges[:-1])
+    counts = np.add.reduceat(is_valid.astype(int), edges[:-1])
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return sums / counts
+
+
+def lttb_indices(x: np.ndarray, y: np.ndarray, max_points: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: keeps the first and last points, and from
+    every bucket in between the point forming the largest triangle with the
+    point kept from the previous bucket and the mean of the next bucket.
+    Each bucket is one NumPy operation, only the walk over buckets is in Python.
+    """
+    n = len(y)
+    if max_points >= n or max_points < 3:
+        return np.arange(n)
+
+    edges = _bucket_edges(1, n - 1, max_points - 2)
+    next_x = np.append(_bucket_means(x[:-1], edges)[1:], x[-1])
+    next_y = np.append(_bucket_means(y[:-1], edges)[1:], y[-1])
+
+    indices = np.empty(max_points, dtype=np.int64)
+    indices[0], indices[-1] = 0, n - 1
+    selected = 0
+    for bucket in range(max_points - 2):
+        start, stop = edges[bucket], edges[bucket + 1]
+        area = np.abs(
+            (x[selected] - next_x[bucket]) * (y[start:stop] - y[selected])
+            - (x[selected] - x[start:stop]) * (next_y[bucket] - y[selected])
+        )
+        selected = start + int(np.argmax(np.nan_to_num(area, nan=-1.0)))
+        indices[bucket + 1] = selected
+    return indices
+
+
+def minmax_indices(y: np.ndarray, max_points: int) -> np.ndarray:
+    """Keeps the minimum and maximum of max_points // 2 equal buckets"""
+    n = len(y)
+    buckets = max_points // 2
+    if max_points >= n or buckets < 1:
+        return np.arange(n)
+
+    edges = _bucket_edges(0, n, buckets)
+    bucket_ids = np.repeat(np.arange(buckets), np.diff(edges))
+    # NaN never wins a bucket unless the whole bucket is NaN
+    filled = np.where(np.isnan(y), np.nanmean(y) if (~np.isnan(y)).any() else 0, y)
+    order = np.lexsort((filled, bucket_ids))
+    return np.unique(
+        np.concatenate([[0, n - 1], order[edges[:-1]], order[edges[1:] - 1]])
+    )
+
+
+def downsample_df(
+    df: pd.DataFrame, max_points: int, method: str = "lttb"
+) -> pd.DataFrame:
+    """
+    Returns the rows of df needed to draw every numeric column with about
+    max_points points, sharing one index. max_points of 0 keeps every row.
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsample method {method}")
+
+    columns = df.select_dtypes(include="number").columns
+    if not max_points or len(df.index) <= max_points or not len(columns):
+        return df
+
+    if isinstance(df.index, pd.DatetimeIndex):
+        x = df.index.asi8.astype(float)
+    elif pd.api.types.is_numeric_dtype(df.index):
+        x = df.index.to_numpy(dtype=float)
+    else:
+        x = np.arange(len(df.index), dtype=float)
+
+    column_points = max(3, max_points // len(columns))
+    indices = [
+        (
+            lttb_indices(x, df[column].to_numpy(dtype=float), column_points)
+            if method == "lttb"
+            else minmax_indices(df[column].to_numpy(dtype=float), column_points)
+        )
+        for column in columns
+    ]
+    return df.iloc[np.unique(np.concatenate(indices))]
@@ -0,0 +1,167 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Callable
+
+from api.common.constants import (
+    ASSETS_PLOTS_BUCKET_NAME,
+    PLOT_CACHE_MAX_ENTRIES,
+    PLOT_CACHE_TTL_SECONDS,
+    STORAGE_ASYNC_UPLOADS,
+)
+from api.util.cloud_storage_connector import CloudStorageConnector
+
+
+def generate_plot_cache_key(chart_type: str, inputs: dict, data_version) -> str:
+    payload = json.dumps(
+        {"chartType": chart_type, "inputs": inputs, "dataVersion": data_version},
+        sort_keys=True,
+        default=str,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class PlotCache:
+    """
+    Maps a hash of the plot inputs and data version to the public URL of a PNG.
+
+    Blob names are derived from the hash, so a recent blob uploaded by another
+    instance is reused too. Only misses render and upload, and concurrent requests
+    for the same hash wait for the first one instead of rendering again.
+    """
+
+    def __init__(
+        self,
+        bucket_name: str,
+        ttl_seconds: int = PLOT_CACHE_TTL_SECONDS,
+        max_entries: int = PLOT_CACHE_MAX_ENTRIES,
+        async_uploads: bool = False,
+        cloud_storage_connector: CloudStorageConnector = None,
+    ) -> None:
+        self.bucket_name = bucket_name
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.async_uploads = async_uploads
+        self._cloud_storage_connector = cloud_storage_connector
+        self._urls = OrderedDict()
+        self._key_locks = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.storage_hits = 0
+        self.misses = 0
+
+    @property
+    def cloud_storage_connector(self) -> CloudStorageConnector:
+        if self._cloud_storage_connector is None:
+            self._cloud_storage_connector = CloudStorageConnector(
+                bucket_name=self.bucket_name
+            )
+        return self._cloud_storage_connector
+
+    @staticmethod
+    def blob_name(chart_type: str, key: str) -> str:
+        return f"plots/{chart_type}/{key}.png"
+
+    def get_or_create(
+        self, chart_type: str, inputs: dict, data_version, render: Callable[[], bytes]
+    ) -> str:
+        """
+        Returns the public URL of the plot, calling render only when no recent
+        blob exists. data_version is the latest data timestamp, or anything else
+        that changes whenever the plotted data does.
+        """
+        key = generate_plot_cache_key(chart_type, inputs, data_version)
+
+        url = self._get(key)
+        if url:
+            return url
+
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+
+        # set by a background upload that fails, even before its URL is cached
+        upload_failed = threading.Event()
+
+        def on_upload_failure():
+            upload_failed.set()
+            self._evict(key)
+
+        try:
+            with key_lock:
+                url = self._get(key)
+                if url:
+                    return url
+
+                blob_name = self.blob_name(chart_type, key)
+                blob = self.cloud_storage_connector.get_blob(blob_name)
+                if blob is not None and self._is_recent(blob.time_created):
+                    with self._lock:
+                        self.storage_hits += 1
+                    url = blob.public_url
+                else:
+                    with self._lock:
+                        self.misses += 1
+                    url = self.cloud_storage_connector.upload_png(
+                        render(),
+                        blob_name,
+                        wait=not self.async_uploads,
+                        on_failure=on_upload_failure,
+                    )
+                    logging.info(f"Uploaded {chart_type} plot {key}")
+
+                self._put(key, url, upload_failed)
+                return url
+        finally:
+            with self._lock:
+                self._key_locks.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "entries": len(self._urls),
+                "hits": self.hits,
+                "storageHits": self.storage_hits,
+                "misses": self.misses,
+            }
+
+    def _is_recent(self, time_created: datetime) -> bool:
+        return time_created is not None and datetime.now(
+            timezone.utc
+        ) - time_created < timedelta(seconds=self.ttl_seconds)
+
+    def _get(self, key: str):
+        with self._lock:
+            entry = self._urls.get(key)
+            if entry is None:
+                return None
+
+            url, stored_at = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._urls[key]
+                return None
+
+            self._urls.move_to_end(key)
+            self.hits += 1
+            return url
+
+    def _evict(self, key: str):
+        with self._lock:
+            self._urls.pop(key, None)
+
+    def _put(self, key: str, url: str, upload_failed: threading.Event):
+        with self._lock:
+            if upload_failed.is_set():
+                return
+            self._urls[key] = (url, time.monotonic())
+            self._urls.move_to_end(key)
+            while len(self._urls) > self.max_entries:
+                self._urls.popitem(last=False)
+
+
+plot_cache = PlotCache(
+    bucket_name=ASSETS_PLOTS_BUCKET_NAME, async_uploads=STORAGE_ASYNC_UPLOADS
+)
@@ -0,0 +1,126 @@
+import io
+import logging
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from typing import Callable, Tuple
+
+import matplotlib
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+from api.common.constants import (
+    PLOT_RENDER_MAX_PENDING,
+    PLOT_RENDER_MAX_WORKERS,
+    PLOT_RENDER_TIMEOUT_SECONDS,
+)
+from api.exception.models import BadRequestException
+
+# pandas and seaborn import pyplot when plotting onto our axes
+matplotlib.use("agg")
+
+
+class PlotRenderer:
+    """
+    Renders figures to PNG bytes on a bounded pool of worker threads.
+
+    Every render gets its own matplotlib Figure with an Agg canvas, so nothing is
+    drawn through pyplot global state, and the figure is cleared as soon as it has
+    been saved. At most max_workers + max_pending renders are accepted at once.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = PLOT_RENDER_MAX_WORKERS,
+        max_pending: int = PLOT_RENDER_MAX_PENDING,
+        timeout_seconds: int = PLOT_RENDER_TIMEOUT_SECONDS,
+    ) -> None:
+        self.max_workers = max_workers
+        self.timeout_seconds = timeout_seconds
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="plot-renderer"
+        )
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._lock = threading.Lock()
+        self.renders = 0
+        self.failures = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.render_seconds_total = 0.0
+        self.render_seconds_max = 0.0
+        self.live_figures = 0
+
+    def render(
+        self, draw: Callable, *args, figsize: Tuple[int, int] = (10, 6), **kwargs
+    ) -> bytes:
+        """Calls draw(figure, *args, **kwargs) on a worker thread and returns the PNG"""
+        if not self._slots.acquire(timeout=self.timeout_seconds):
+            with self._lock:
+                self.rejected += 1
+            raise BadRequestException("Plot renderer is busy", status_code=503)
+
+        try:
+            future = self._executor.submit(self._render, draw, figsize, args, kwargs)
+        except Exception:
+            self._slots.release()
+            raise
+        # the slot is held until the render finishes, even if the caller times out
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            return future.result(timeout=self.timeout_seconds)
+        except TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise BadRequestException("Plot render timed out", status_code=503)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "renders": self.renders,
+                "failures": self.failures,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+                "liveFigures": self.live_figures,
+                "renderSecondsTotal": round(self.render_seconds_total, 3),
+                "renderSecondsMax": round(self.render_seconds_max, 3),
+                "renderSecondsAvg": (
+                    round(self.render_seconds_total / self.renders, 3)
+                    if self.renders
+                    else 0
+                ),
+            }
+
+    def _figure_released(self):
+        with self._lock:
+            self.live_figures -= 1
+
+    def _render(self, draw: Callable, figsize: Tuple[int, int], args, kwargs) -> bytes:
+        start_time = time.perf_counter()
+        figure = Figure(figsize=figsize)
+        FigureCanvasAgg(figure)
+        with self._lock:
+            self.live_figures += 1
+        weakref.finalize(figure, self._figure_released)
+
+        try:
+            draw(figure, *args, **kwargs)
+            buf = io.BytesIO()
+            figure.savefig(buf, format="png")
+        except Exception:
+            with self._lock:
+                self.failures += 1
+            raise
+        finally:
+            figure.clear()
+
+        render_seconds = time.perf_counter() - start_time
+        with self._lock:
+            self.renders += 1
+            self.render_seconds_total += render_seconds
+            self.render_seconds_max = max(self.render_seconds_max, render_seconds)
+        logging.info(f"Rendered {draw.__name__} in {render_seconds:.3f}s")
+        return buf.getvalue()
+
+
+plot_renderer = PlotRenderer()
@@ -0,0 +1,117 @@
+import logging
+import os
+import threading
+import time
+
+import pandas as pd
+import yfinance as yf
+
+from api.common.constants import (
+    PRICE_HISTORY_CACHE_DIR,
+    PRICE_HISTORY_OFFLINE,
+    PRICE_HISTORY_TTL_SECONDS,
+)
+
+
+class PriceHistoryEntry:
+    def __init__(self, df: pd.DataFrame, years: int):
+        self.df = df
+        self.years = years
+        self.fetched_at = time.monotonic()
+
+
+class PriceHistoryStore:
+    """
+    Caches daily price history per stock symbol in memory.
+
+    When a cache directory is configured every download is also written to
+    {cache_dir}/{stock_symbol}.csv. In offline mode those files are the only data
+    source and no network requests are made.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = None,
+        offline: bool = False,
+        ttl_seconds: int = PRICE_HISTORY_TTL_SECONDS,
+    ) -> None:
+        self.cache_dir = cache_dir
+        self.offline = offline
+        self.ttl_seconds = ttl_seconds
+        self._histories = {}
+        self._lock = threading.Lock()
+
+    def get_history(self, stock_symbol: str, years: int) -> pd.DataFrame:
+        """Returns a copy of the daily history for the last given years"""
+        with self._lock:
+            entry = self._histories.get(stock_symbol)
+
+        if entry is None or not self._covers(entry, years):
+            download_years = max(years, entry.years) if entry else years
+            if self.offline:
+                df = self._read_from_disk(stock_symbol)
+            else:
+                df = self._download(stock_symbol, download_years)
+                self._write_to_disk(stock_symbol, df)
+
+            entry = PriceHistoryEntry(df, download_years)
+            with self._lock:
+                self._histories[stock_symbol] = entry
+
+        return self._slice(entry.df, years)
+
+    def is_available(self, stock_symbol: str) -> bool:
+        """Offline mode only knows the stock symbols cached in memory or on disk"""
+        with self._lock:
+            if stock_symbol in self._histories:
+                return True
+        return bool(self.cache_dir) and os.path.exists(self._disk_path(stock_symbol))
+
+    def clear(self):
+        with self._lock:
+            self._histories.clear()
+
+    def _covers(self, entry: PriceHistoryEntry, years: int) -> bool:
+        if self.offline:
+            return True
+        expired = time.monotonic() - entry.fetched_at > self.ttl_seconds
+        return not expired and entry.years >= years
+
+    @staticmethod
+    def _slice(df: pd.DataFrame, years: int) -> pd.DataFrame:
+        if df.empty:
+            return df.copy()
+        start_date = df.index.max() - pd.DateOffset(years=years)
+        return df[df.index >= start_date].copy()
+
+    @staticmethod
+    def _download(stock_symbol: str, years: int) -> pd.DataFrame:
+        logging.info(f"Downloading {years}y price history for {stock_symbol}...")
+        return yf.Ticker(stock_symbol).history(period=f"{years}y")
+
+    def _disk_path(self, stock_symbol: str) -> str:
+        return os.path.join(self.cache_dir, f"{stock_symbol}.csv")
+
+    def _read_from_disk(self, stock_symbol: str) -> pd.DataFrame:
+        if not self.cache_dir or not os.path.exists(self._disk_path(stock_symbol)):
+            raise ValueError(f"No offline price history for {stock_symbol}")
+
+        df = pd.read_csv(self._disk_path(stock_symbol), index_col="Date")
+        df.index = pd.to_datetime(df.index, utc=True)
+        return df
+
+    def _write_to_disk(self, stock_symbol: str, df: pd.DataFrame):
+        if not self.cache_dir or df.empty:
+            return
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            tmp_path = f"{self._disk_path(stock_symbol)}.tmp"
+            df.to_csv(tmp_path)
+            os.replace(tmp_path, self._disk_path(stock_symbol))
+        except OSError as e:
+            logging.error(f"Failed to write {stock_symbol} price history - {e}")
+
+
+price_history_store = PriceHistoryStore(
+    cache_dir=PRICE_HISTORY_CACHE_DIR, offline=PRICE_HISTORY_OFFLINE
+)
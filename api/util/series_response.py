@@ -0,0 +1,86 @@
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from flask import jsonify, make_response, request
+
+from api.common.constants import SERIES_DOWNSAMPLE_METHOD, SERIES_MAX_POINTS
+from api.exception.models import BadRequestException
+from api.util.downsample import downsample_df
+
+SERIES_FORMATS = ("png", "json", "arrow")
+ARROW_STREAM_MIMETYPE = "application/vnd.apache.arrow.stream"
+
+
+def get_series_format() -> str:
+    series_format = request.args.get("format", default="png", type=str).lower()
+    if series_format not in SERIES_FORMATS:
+        raise BadRequestException(
+            f"format must be one of {', '.join(SERIES_FORMATS)}", status_code=400
+        )
+    return series_format
+
+
+def get_series_max_points() -> int:
+    max_points = request.args.get("maxPoints", str(SERIES_MAX_POINTS))
+    if not max_points.isdecimal() or 0 < int(max_points) < 3:
+        raise BadRequestException("maxPoints must be 0 or at least 3", status_code=400)
+    return int(max_points)
+
+
+def downsample_series(df: pd.DataFrame, max_points: int) -> pd.DataFrame:
+    """Downsamples the plotted series, after any rolling or fitted columns"""
+    return downsample_df(df, max_points, method=SERIES_DOWNSAMPLE_METHOD)
+
+
+def _index_values(index: pd.Index) -> np.ndarray:
+    """Datetime indexes become epoch milliseconds, anything else is kept as is"""
+    if isinstance(index, pd.DatetimeIndex):
+        return index.as_unit("ms").asi8
+    return index.to_numpy()
+
+
+def _column_values(column: pd.Series, decimals: int) -> list:
+    if pd.api.types.is_float_dtype(column):
+        column = column.round(decimals)
+    return column.astype(object).where(column.notna(), None).tolist()
+
+
+def generate_series_response(
+    df: pd.DataFrame, series_format: str, decimals: int = 4, **metadata
+):
+    """
+    Returns the columns of df as compact columnar arrays sharing one index,
+    as JSON or as an Arrow IPC stream with the metadata in the schema.
+    """
+    if series_format == "arrow":
+        table = pa.table(
+            {
+                "index": _index_values(df.index),
+                **{str(name): df[name].to_numpy() for name in df.columns},
+            }
+        )
+        table = table.replace_schema_metadata(
+            {key: str(value) for key, value in metadata.items()}
+        )
+        sink = io.BytesIO()
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+
+        response = make_response(sink.getvalue())
+        response.mimetype = ARROW_STREAM_MIMETYPE
+        return response, 200
+
+    return (
+        jsonify(
+            {
+                **metadata,
+                "index": _index_values(df.index).tolist(),
+                "series": {
+                    str(name): _column_values(df[name], decimals) for name in df.columns
+                },
+            }
+        ),
+        200,
+    )
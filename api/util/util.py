@@ -9,7 +9,12 @@ from typing import List, Tuple
 
 import psutil
 import subprocess
-from api.common.constants import DATETIME_FORMATE_CODE, PANDAS_DF_DATE_FORMATE_CODE
+from api.common.constants import (
+    CSV_STREAM_CHUNK_ROWS,
+    DATETIME_FORMATE_CODE,
+    PANDAS_DF_DATE_FORMATE_CODE,
+)
+from api.util.price_history import price_history_store
 import asyncio
 import pandas as pd
 import random
@@ -130,6 +135,56 @@ def generate_df_from_csv(data):
     )
 
 
+def summarise_records_csv(data, chunk_rows: int = CSV_STREAM_CHUNK_ROWS) -> dict:
+    """
+    Returns the row count, earliest and latest dates, and first and last index
+    values of a records CSV, reading chunk_rows rows at a time. Raises ValueError
+    at the first row with an invalid date, or an index that is not a whole
+    number from 0 to 100.
+    """
+    records_count = 0
+    start_date = end_date = None
+    first_index_value = last_index_value = None
+
+    with pd.read_csv(
+        data, encoding="utf-8", usecols=["Date", "Index"], chunksize=chunk_rows
+    ) as reader:
+        for chunk in reader:
+            dates = pd.to_datetime(chunk["Date"], dayfirst=True, errors="coerce")
+            index_values = pd.to_numeric(chunk["Index"], errors="coerce")
+            is_invalid = (
+                dates.isna()
+                | index_values.isna()
+                | (index_values % 1 != 0)
+                | ~index_values.between(0, 100)
+            )
+            if is_invalid.any():
+                position = int(is_invalid.to_numpy().argmax())
+                row = chunk.iloc[position]
+                raise ValueError(
+                    f"Invalid row {records_count + position + 2}: {row['Date']},{row['Index']}"
+                )
+
+            if first_index_value is None:
+                first_index_value = int(index_values.iloc[0])
+                start_date = end_date = dates.iloc[0]
+            last_index_value = int(index_values.iloc[-1])
+            start_date = min(start_date, dates.min())
+            end_date = max(end_date, dates.max())
+            records_count += len(chunk.index)
+
+    if not records_count:
+        raise ValueError("CSV has no records")
+
+    return {
+        "recordsCount": records_count,
+        "startDate": start_date,
+        "startDateIndexValue": first_index_value,
+        "endDate": end_date,
+        "endDateIndexValue": last_index_value,
+    }
+
+
 def return_delta(fair_value: int, most_recent_close: int) -> float:
     return float("{:.2f}".format((fair_value - most_recent_close) / most_recent_close))
 
@@ -182,8 +237,11 @@ def predict_price_linear_regression(
     stock_symbol: str, data_years_ago: int, prediction_years_future: int
 ) -> Tuple[float]:
     try:
-        data = yf.Ticker(stock_symbol)
-        df = data.history(period=f"{data_years_ago}y")
+        # live predictions use fresh prices, the store serves offline benchmarks
+        if price_history_store.offline:
+            df = price_history_store.get_history(stock_symbol, data_years_ago)
+        else:
+            df = yf.Ticker(stock_symbol).history(period=f"{data_years_ago}y")
 
         # Create a numerical representation of the time index
         model1 = create_stock_close_linear_regression_model(df)
@@ -296,6 +354,8 @@ def generate_monthly_mean_close_df(df: pd.DataFrame):
 
 
 def check_asset_available(asset: str) -> bool:
+    if price_history_store.offline:
+        return price_history_store.is_available(asset)
     info = yf.Ticker(asset).history(period="7d", interval="1d")
     return len(info) > 0
 
@@ -342,8 +402,13 @@ def generate_dividend_yield_df(stock_symbol: str, years_ago: int) -> pd.DataFram
         raise ValueError(f"No data found for ticker {stock_symbol}")
 
     # Dividends (Series indexed by date)
-    dividends = ticker.dividends
+    return generate_dividend_yield_df_from_history(hist, ticker.dividends)
+
 
+def generate_dividend_yield_df_from_history(
+    hist: pd.DataFrame, dividends: pd.Series
+) -> pd.DataFrame:
+    """generate_dividend_yield_df for price history that has already been fetched"""
     df = hist[["Close"]].copy()
 
     # Resample dividends to daily frequency (forward-fill the amount)
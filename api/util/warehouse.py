@@ -0,0 +1,407 @@
+import logging
+import sqlite3
+from abc import ABC, abstractmethod
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+from typing import Callable
+
+import pandas as pd
+from google.api_core.exceptions import NotFound
+from google.cloud import bigquery
+
+from api.common.constants import (
+    BIGQUERY_DATASET_ID,
+    BIGQUERY_TABLE_ID,
+    BIGQUERY_TABLE_ID_ORDERS,
+    GCP_PROJECT_ID,
+    WAREHOUSE_BACKEND,
+    WAREHOUSE_QUERY_CACHE_MAX_ENTRIES,
+    WAREHOUSE_QUERY_CACHE_TTL_SECONDS,
+    WAREHOUSE_SQLITE_PATH,
+)
+
+WAREHOUSE_BACKENDS = ("bigquery", "sqlite")
+WAREHOUSE_TABLE_SCHEMAS = {
+    BIGQUERY_TABLE_ID: {"created": "TIMESTAMP", "fear_greed_index": "INTEGER"},
+    BIGQUERY_TABLE_ID_ORDERS: {
+        "created": "TIMESTAMP",
+        "stock_symbol": "TEXT",
+        "order_type": "TEXT",
+        "quantity": "INTEGER",
+        "price": "REAL",
+        "status": "TEXT",
+        "created_date": "DATE",
+        "total_value": "REAL",
+    },
+}
+SQLITE_TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S.%f+00:00"
+QUERY_OPERATORS = ("=", ">", ">=", "<", "<=")
+
+
+class WarehouseQuery:
+    """
+    A SELECT on one warehouse table with every predicate value passed as a query
+    parameter, so filtering and limits run in the warehouse instead of pandas
+    """
+
+    def __init__(self, table_id: str, columns: list) -> None:
+        self.table_id = table_id
+        self.columns = list(columns)
+        self.predicates = []
+        self.order_by_column = None
+        self.descending = False
+        self.limit_rows = None
+
+    def where(self, column: str, operator: str, value):
+        if operator not in QUERY_OPERATORS:
+            raise ValueError(f"Unsupported operator {operator}")
+        self.predicates.append((column, operator, value))
+        return self
+
+    def order_by(self, column: str, descending: bool = False):
+        self.order_by_column = column
+        self.descending = descending
+        return self
+
+    def limit(self, rows: int):
+        self.limit_rows = int(rows)
+        return self
+
+    def cache_key(self) -> tuple:
+        return (
+            self.table_id,
+            tuple(self.columns),
+            tuple(self.predicates),
+            self.order_by_column,
+            self.descending,
+            self.limit_rows,
+        )
+
+    def to_sql(self, table_ref: str, placeholder: Callable[[str], str]):
+        """
+        Returns the query text and its parameters by name, with placeholder
+        giving the backend's syntax for a named parameter
+        """
+        params = {}
+        clauses = []
+        for i, (column, operator, value) in enumerate(self.predicates):
+            params[f"p{i}"] = value
+            clauses.append(f"{column} {operator} {placeholder(f'p{i}')}")
+
+        query = f"SELECT {', '.join(self.columns)}\nFROM {table_ref}"
+        if clauses:
+            query += "\nWHERE " + "\nAND ".join(clauses)
+        if self.order_by_column:
+            query += f"\nORDER BY {self.order_by_column}"
+            query += " DESC" if self.descending else ""
+        if self.limit_rows is not None:
+            query += f"\nLIMIT {self.limit_rows}"
+        return query, params
+
+
+class WarehouseQueryResult:
+    def __init__(
+        self, df: pd.DataFrame, bytes_processed: int = None, cached: bool = False
+    ) -> None:
+        self.df = df
+        self.bytes_processed = bytes_processed
+        self.cached = cached
+
+
+class WarehouseClient(ABC):
+    """
+    The warehouse operations the API needs, so backends can be swapped.
+
+    Results of run_query are cached per query and parameter set for
+    cache_ttl_seconds, and dropped when this client writes to the table.
+    """
+
+    def __init__(
+        self,
+        cache_ttl_seconds: int = WAREHOUSE_QUERY_CACHE_TTL_SECONDS,
+        cache_max_entries: int = WAREHOUSE_QUERY_CACHE_MAX_ENTRIES,
+    ) -> None:
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.cache_max_entries = cache_max_entries
+        self._query_results = OrderedDict()
+        self._query_results_lock = threading.Lock()
+
+    def run_query(self, query: WarehouseQuery) -> WarehouseQueryResult:
+        key = query.cache_key()
+        with self._query_results_lock:
+            cached_result = self._query_results.get(key)
+            if cached_result is not None:
+                result, cached_at = cached_result
+                if time.monotonic() - cached_at <= self.cache_ttl_seconds:
+                    self._query_results.move_to_end(key)
+                    return WarehouseQueryResult(result.df.copy(), 0, cached=True)
+                del self._query_results[key]
+
+        result = self._execute_query(query)
+        logging.info(
+            f"Query on {query.table_id} returned {len(result.df.index)} rows, "
+            f"processed {result.bytes_processed} bytes"
+        )
+        with self._query_results_lock:
+            self._query_results[key] = (result, time.monotonic())
+            while len(self._query_results) > self.cache_max_entries:
+                self._query_results.popitem(last=False)
+        return WarehouseQueryResult(result.df.copy(), result.bytes_processed)
+
+    def invalidate_query_results(self, table_id: str):
+        with self._query_results_lock:
+            for key in [i for i in self._query_results if i[0] == table_id]:
+                del self._query_results[key]
+
+    @abstractmethod
+    def table_ref(self, table_id: str) -> str:
+        """Returns the table name quoted for use in a query"""
+        pass
+
+    @abstractmethod
+    def get_max_value(self, table_id: str, column: str):
+        """Returns the largest value of column, or None if the table is empty or missing"""
+        pass
+
+    @abstractmethod
+    def append_dataframe(self, table_id: str, df: pd.DataFrame) -> int:
+        """Appends every row of df, creating the table if needed, all or nothing"""
+        pass
+
+    @abstractmethod
+    def replace_dataframe(self, table_id: str, df: pd.DataFrame) -> int:
+        """Replaces the contents of the table with the rows of df"""
+        pass
+
+    @abstractmethod
+    def insert_rows(self, table_id: str, rows: list) -> list:
+        """Inserts rows given as dicts, returning a list of errors"""
+        pass
+
+    @abstractmethod
+    def _execute_query(self, query: WarehouseQuery) -> WarehouseQueryResult:
+        """Runs the query without the result cache"""
+        pass
+
+
+class BigQueryWarehouseClient(WarehouseClient):
+    def __init__(
+        self,
+        project_id: str = GCP_PROJECT_ID,
+        dataset_id: str = BIGQUERY_DATASET_ID,
+        client: bigquery.Client = None,
+    ) -> None:
+        super().__init__()
+        self.project_id = project_id
+        self.dataset_id = dataset_id
+        self.client = client or bigquery.Client(project=project_id)
+
+    def table_path(self, table_id: str) -> str:
+        return f"{self.project_id}.{self.dataset_id}.{table_id}"
+
+    def table_ref(self, table_id: str) -> str:
+        return f"`{self.table_path(table_id)}`"
+
+    def _execute_query(self, query: WarehouseQuery) -> WarehouseQueryResult:
+        sql, params = query.to_sql(self.table_ref(query.table_id), lambda i: f"@{i}")
+        job_config = bigquery.QueryJobConfig(
+            query_parameters=[
+                bigquery.ScalarQueryParameter(name, self._parameter_type(value), value)
+                for name, value in params.items()
+            ]
+        )
+        query_job = self.client.query(sql, job_config=job_config)
+        df = query_job.to_dataframe()
+        return WarehouseQueryResult(df, query_job.total_bytes_processed)
+
+    @staticmethod
+    def _parameter_type(value) -> str:
+        if isinstance(value, datetime):
+            return "TIMESTAMP"
+        if isinstance(value, date):
+            return "DATE"
+        if isinstance(value, bool):
+            return "BOOL"
+        if isinstance(value, int):
+            return "INT64"
+        if isinstance(value, float):
+            return "FLOAT64"
+        return "STRING"
+
+    def get_max_value(self, table_id: str, column: str):
+        query = f"SELECT MAX({column}) AS value FROM {self.table_ref(table_id)}"
+        try:
+            rows = list(self.client.query(query).result())
+        except NotFound:
+            return None
+        return rows[0]["value"] if rows else None
+
+    def append_dataframe(self, table_id: str, df: pd.DataFrame) -> int:
+        return self._load_dataframe(
+            table_id, df, bigquery.WriteDisposition.WRITE_APPEND
+        )
+
+    def replace_dataframe(self, table_id: str, df: pd.DataFrame) -> int:
+        return self._load_dataframe(
+            table_id, df, bigquery.WriteDisposition.WRITE_TRUNCATE
+        )
+
+    def insert_rows(self, table_id: str, rows: list) -> list:
+        self.invalidate_query_results(table_id)
+        return self.client.insert_rows_json(self.table_path(table_id), rows)
+
+    def _load_dataframe(
+        self, table_id: str, df: pd.DataFrame, write_disposition: str
+    ) -> int:
+        job_config = bigquery.LoadJobConfig(write_disposition=write_disposition)
+        load_job = self.client.load_table_from_dataframe(
+            df, self.table_path(table_id), job_config=job_config
+        )
+        load_job.result()
+        self.invalidate_query_results(table_id)
+        logging.info(f"Loaded {load_job.output_rows:,} rows into {table_id}")
+        return load_job.output_rows
+
+
+class SQLiteWarehouseClient(WarehouseClient):
+    """
+    Embedded warehouse holding mirrors of the BigQuery tables in SQLite, for
+    development, benchmarks and cheap local reads. Timestamps are stored as UTC
+    ISO 8601 text, so they sort and compare against date strings.
+    """
+
+    def __init__(
+        self, path: str = WAREHOUSE_SQLITE_PATH, schemas: dict = WAREHOUSE_TABLE_SCHEMAS
+    ) -> None:
+        super().__init__()
+        self.path = path
+        self.schemas = schemas
+        self._timestamp_columns = {
+            column
+            for schema in schemas.values()
+            for column, column_type in schema.items()
+            if column_type == "TIMESTAMP"
+        }
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+
+        with self._lock, self._connection:
+            for table_id, schema in schemas.items():
+                columns = ", ".join(f'"{i}" {j}' for i, j in schema.items())
+                self._connection.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.table_ref(table_id)} ({columns})"
+                )
+                if "created" in schema:
+                    self._connection.execute(
+                        f'CREATE INDEX IF NOT EXISTS "{table_id}_created" '
+                        f"ON {self.table_ref(table_id)} (created)"
+                    )
+
+    def table_ref(self, table_id: str) -> str:
+        return f'"{table_id}"'
+
+    def query_dataframe(self, query: str, params: dict = None) -> pd.DataFrame:
+        with self._lock:
+            df = pd.read_sql_query(query, self._connection, params=params)
+        for column in self._timestamp_columns.intersection(df.columns):
+            df[column] = pd.to_datetime(df[column], utc=True, format="ISO8601")
+        return df
+
+    def _execute_query(self, query: WarehouseQuery) -> WarehouseQueryResult:
+        sql, params = query.to_sql(self.table_ref(query.table_id), lambda i: f":{i}")
+        df = self.query_dataframe(
+            sql, {i: self._parameter_value(j) for i, j in params.items()}
+        )
+        return WarehouseQueryResult(df)
+
+    @staticmethod
+    def _parameter_value(value):
+        if isinstance(value, datetime):
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=timezone.utc)
+            return value.astimezone(timezone.utc).strftime(SQLITE_TIMESTAMP_FORMAT)
+        if isinstance(value, date):
+            return value.isoformat()
+        return value
+
+    def get_max_value(self, table_id: str, column: str):
+        df = self.query_dataframe(
+            f'SELECT MAX("{column}") AS "{column}" FROM {self.table_ref(table_id)}'
+        )
+        value = df[column].iloc[0]
+        if pd.isna(value):
+            return None
+        return value.to_pydatetime() if isinstance(value, pd.Timestamp) else value
+
+    def append_dataframe(self, table_id: str, df: pd.DataFrame) -> int:
+        columns, rows = self._generate_rows(table_id, df)
+        with self._lock, self._connection:
+            self._insert(table_id, columns, rows)
+        self.invalidate_query_results(table_id)
+        return len(rows)
+
+    def replace_dataframe(self, table_id: str, df: pd.DataFrame) -> int:
+        columns, rows = self._generate_rows(table_id, df)
+        with self._lock, self._connection:
+            self._connection.execute(f"DELETE FROM {self.table_ref(table_id)}")
+            self._insert(table_id, columns, rows)
+        self.invalidate_query_results(table_id)
+        return len(rows)
+
+    def insert_rows(self, table_id: str, rows: list) -> list:
+        self.append_dataframe(table_id, pd.DataFrame(rows))
+        return []
+
+    def _insert(self, table_id: str, columns: list, rows: list):
+        column_names = ", ".join(f'"{i}"' for i in columns)
+        placeholders = ", ".join("?" * len(columns))
+        self._connection.executemany(
+            f"INSERT INTO {self.table_ref(table_id)} ({column_names}) "
+            f"VALUES ({placeholders})",
+            rows,
+        )
+
+    def _generate_rows(self, table_id: str, df: pd.DataFrame):
+        """Returns the schema columns in df and its rows as Python values"""
+        schema = self.schemas[table_id]
+        df = df.reset_index() if df.index.name else df
+        columns = [i for i in schema if i in df.columns]
+
+        values_df = pd.DataFrame(index=df.index)
+        for column in columns:
+            if schema[column] == "TIMESTAMP":
+                values_df[column] = pd.to_datetime(
+                    df[column], utc=True, format="ISO8601"
+                ).dt.strftime(SQLITE_TIMESTAMP_FORMAT)
+            elif schema[column] == "DATE":
+                values_df[column] = pd.to_datetime(df[column]).dt.strftime("%Y-%m-%d")
+            else:
+                values_df[column] = df[column]
+
+        values_df = values_df.astype(object).where(values_df.notna(), None)
+        return columns, values_df.to_numpy().tolist()
+
+
+_warehouse_client = None
+_warehouse_client_lock = threading.Lock()
+
+
+def get_warehouse_client() -> WarehouseClient:
+    """
+    Returns the process-wide warehouse client for WAREHOUSE_BACKEND, BigQuery by
+    default, or the embedded SQLite warehouse at WAREHOUSE_SQLITE_PATH with
+    WAREHOUSE_BACKEND=sqlite
+    """
+    global _warehouse_client
+    with _warehouse_client_lock:
+        if _warehouse_client is None:
+            if WAREHOUSE_BACKEND not in WAREHOUSE_BACKENDS:
+                raise ValueError(f"Unknown warehouse backend {WAREHOUSE_BACKEND}")
+            _warehouse_client = (
+                SQLiteWarehouseClient()
+                if WAREHOUSE_BACKEND == "sqlite"
+                else BigQueryWarehouseClient()
+            )
+        return _warehouse_client
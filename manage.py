@@ -1,9 +1,146 @@
+import argparse
+import json
+import os
+import tempfile
+
 from api import app
+from api.analysis.benchmark import (
+    BENCHMARK_STRATEGIES,
+    DEFAULT_BENCHMARK_CONCURRENCY,
+    DEFAULT_BENCHMARK_REQUESTS,
+    DEFAULT_BENCHMARK_RUNS,
+    run_benchmark,
+    write_synthetic_price_history,
+)
+from api.analysis.backtest import (
+    DEFAULT_BACKTEST_HORIZONS,
+    DEFAULT_BACKTEST_WINDOW,
+    run_backtest,
+)
+from api.common.constants import RECORDS_BATCH_SIZE
+from api.record.histogram import refresh_record_histograms
+from api.record.migration import migrate_records_to_time_series
 
 
-def runserver():
+def runserver(_=None):
     app.run(host="0.0.0.0", port=8080, debug=True, use_reloader=True)
 
 
+def backtest(args):
+    results = run_backtest(
+        args.stocks.split(","), args.years, window=args.window, horizons=args.horizons
+    )
+    print(json.dumps(results, indent=2))
+
+
+def benchmark(args):
+    cache_dir = args.cache_dir or tempfile.mkdtemp()
+    if args.synthetic:
+        write_synthetic_price_history(cache_dir, args.stock)
+
+    report = run_benchmark(
+        cache_dir,
+        args.stock,
+        strategies=args.strategies,
+        runs_counts=args.runs,
+        concurrency_levels=args.concurrency,
+        requests=args.requests,
+        async_delay_seconds=args.async_delay,
+    )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
+
+
+def migrate_records(args):
+    result = migrate_records_to_time_series(
+        legacy_collection_name=args.legacy_collection, batch_size=args.batch_size
+    )
+    print(json.dumps(result, indent=2))
+
+
+def refresh_histograms(args):
+    refresh_record_histograms(days=args.days)
+
+
 if __name__ == "__main__":
-    runserver()
+    parser = argparse.ArgumentParser()
+    parser.set_defaults(func=runserver)
+    subparsers = parser.add_subparsers()
+
+    runserver_parser = subparsers.add_parser("runserver", help="Run development server")
+    runserver_parser.set_defaults(func=runserver)
+
+    backtest_parser = subparsers.add_parser(
+        "backtest", help="Walk-forward backtest of the linear trend price predictor"
+    )
+    backtest_parser.add_argument("stocks", help="Comma separated stock symbols")
+    backtest_parser.add_argument("--years", type=int, default=3)
+    backtest_parser.add_argument("--window", type=int, default=DEFAULT_BACKTEST_WINDOW)
+    backtest_parser.add_argument(
+        "--horizons", type=int, nargs="+", default=DEFAULT_BACKTEST_HORIZONS
+    )
+    backtest_parser.set_defaults(func=backtest)
+
+    benchmark_parser = subparsers.add_parser(
+        "benchmark",
+        help="Benchmark the price prediction strategies against offline price history",
+    )
+    benchmark_parser.add_argument(
+        "--cache-dir",
+        default=os.environ.get("PRICE_HISTORY_CACHE_DIR"),
+        help="Directory of {stock}.csv price history files",
+    )
+    benchmark_parser.add_argument("--stock", default="AAPL")
+    benchmark_parser.add_argument(
+        "--synthetic",
+        action="store_true",
+        help="Write a reproducible random walk price history for the stock first",
+    )
+    benchmark_parser.add_argument(
+        "--strategies",
+        nargs="+",
+        choices=list(BENCHMARK_STRATEGIES),
+        default=list(BENCHMARK_STRATEGIES),
+    )
+    benchmark_parser.add_argument(
+        "--runs", type=int, nargs="+", default=DEFAULT_BENCHMARK_RUNS
+    )
+    benchmark_parser.add_argument(
+        "--concurrency", type=int, nargs="+", default=DEFAULT_BENCHMARK_CONCURRENCY
+    )
+    benchmark_parser.add_argument(
+        "--requests", type=int, default=DEFAULT_BENCHMARK_REQUESTS
+    )
+    benchmark_parser.add_argument("--async-delay", type=float, default=0)
+    benchmark_parser.add_argument("--output", help="Write the JSON report to a file")
+    benchmark_parser.set_defaults(func=benchmark)
+
+    migrate_records_parser = subparsers.add_parser(
+        "migrate-records",
+        help="Recreate records as a time-series collection with datetime created",
+    )
+    migrate_records_parser.add_argument(
+        "--legacy-collection",
+        default="records_legacy",
+        help="Name the existing records collection is moved to",
+    )
+    migrate_records_parser.add_argument(
+        "--batch-size", type=int, default=RECORDS_BATCH_SIZE
+    )
+    migrate_records_parser.set_defaults(func=migrate_records)
+
+    refresh_histograms_parser = subparsers.add_parser(
+        "refresh-record-histograms",
+        help="Recount the daily record histogram counters from the records collection",
+    )
+    refresh_histograms_parser.add_argument(
+        "--days", type=int, help="Only recount the last days, all days by default"
+    )
+    refresh_histograms_parser.set_defaults(func=refresh_histograms)
+
+    args = parser.parse_args()
+    args.func(args)
@@ -1,4 +1,9 @@
+import json
 import os
+import threading
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
 import pytest
 from api import app
 
@@ -11,3 +16,53 @@ def test_client():
     with flask_app.test_client() as testing_client:
         with flask_app.app_context():
             yield testing_client
+
+
+class FakeGcsHandler(BaseHTTPRequestHandler):
+    """Serves the JSON API subset used by CloudStorageConnector"""
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.end_headers()
+        self.wfile.write(json.dumps(body).encode('utf-8'))
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        if self.server.failing_uploads > 0:
+            self.server.failing_uploads -= 1
+            return self._send_json(503, {'error': {'code': 503, 'message': 'unavailable'}})
+
+        bucket_name = self.path.split('/b/')[1].split('/')[0]
+        metadata, data = body.split(b'\r\n\r\n', 2)[1:]
+        name = json.loads(metadata.split(b'\r\n')[0])['name']
+        resource = {
+            'bucket': bucket_name,
+            'name': name,
+            'generation': str(len(self.server.objects) + 1),
+            'timeCreated': datetime.now(timezone.utc).strftime('%Y-%m-%dT%H:%M:%S.%fZ'),
+        }
+        self.server.objects[(bucket_name, name)] = (data.rsplit(b'\r\n--', 1)[0], resource)
+        self._send_json(200, resource)
+
+    def do_GET(self):
+        path = urlparse(self.path).path
+        bucket_name, name = path.split('/b/')[1].split('/o/')
+        stored = self.server.objects.get((bucket_name, unquote(name)))
+        if stored is None:
+            return self._send_json(404, {'error': {'code': 404, 'message': 'Not Found'}})
+        self._send_json(200, stored[1])
+
+
+@pytest.fixture
+def fake_gcs_server(monkeypatch):
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeGcsHandler)
+    server.objects = {}
+    server.failing_uploads = 0
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv('STORAGE_EMULATOR_HOST', f'http://127.0.0.1:{server.server_port}')
+    yield server
+    server.shutdown()
@@ -1,5 +1,15 @@
+import importlib
 import os
+from types import SimpleNamespace
+import jwt
+import numpy as np
+import pandas as pd
+import pytest
 from api import app
+from api.analysis.benchmark import write_synthetic_price_history
+from api.auth import auth
+from api.exception.models import BadRequestException
+from api.util.price_history import price_history_store
 
 
 def test_ping():
@@ -10,3 +20,68 @@ def test_ping():
         response = test_client.get('/ping')
         assert response.status_code == 200
         assert b"pong!" in response.data
+
+
+class FakeUsersCollection:
+    def find_one(self, query, projection):
+        return {'email': query['email']}
+
+
+class BusyPlotRenderer:
+    def render(self, draw, *args, **kwargs):
+        raise BadRequestException('Plot renderer is busy', status_code=503)
+
+
+class RenderingPlotCache:
+    def get_or_create(self, chart, inputs, data_end, render):
+        return render()
+
+
+def _generate_close_history(periods=120):
+    index = pd.date_range('2024-01-01', periods=periods, freq='D')
+    close = np.linspace(100, 120, periods)
+    return pd.DataFrame(
+        {'Adj Close': close, 'Close': close, 'Dividends': np.zeros(periods)},
+        index=index,
+    )
+
+
+@pytest.fixture
+def busy_plot_client(monkeypatch, tmp_path):
+    views = importlib.import_module('api.analysis.views')
+    monkeypatch.setenv('JWT_SECRET', 'secret')
+    monkeypatch.setattr(auth, 'db', {'users': FakeUsersCollection()})
+    monkeypatch.setattr(views, 'plot_renderer', BusyPlotRenderer())
+    monkeypatch.setattr(views, 'plot_cache', RenderingPlotCache())
+    history = _generate_close_history()
+    monkeypatch.setattr(views, 'yf', SimpleNamespace(
+        download=lambda tickers, start: pd.concat(
+            {'Close': history[['Close']].set_axis(tickers, axis=1)}, axis=1
+        ),
+        Ticker=lambda stock_symbol: SimpleNamespace(
+            history=lambda period, auto_adjust: history
+        ),
+    ))
+    write_synthetic_price_history(str(tmp_path), 'FOO')
+    monkeypatch.setattr(price_history_store, 'cache_dir', str(tmp_path))
+    monkeypatch.setattr(price_history_store, 'offline', True)
+
+    with app.test_client() as test_client:
+        test_client.environ_base['HTTP_X_AUTH_TOKEN'] = jwt.encode(
+            {'email': 'user@example.com'}, 'secret', algorithm='HS256'
+        )
+        yield test_client
+
+
+def test_generate_stock_plot_returns_503_when_renderer_is_busy(busy_plot_client):
+    response = busy_plot_client.post('/api/generate-stock-plot?stocks=FOO')
+    assert response.status_code == 503
+    assert response.get_json()['errors'] == [{'message': 'Plot renderer is busy'}]
+
+
+def test_generate_stock_plots_returns_503_when_renderer_is_busy(busy_plot_client):
+    response = busy_plot_client.post(
+        '/api/generate-stock-plots', json={'stock': 'FOO', 'years': 1}
+    )
+    assert response.status_code == 503
+    assert response.get_json()['errors'] == [{'message': 'Plot renderer is busy'}]
@@ -1,10 +1,34 @@
+import importlib
+import joblib
+import sys
+import numpy as np
+import pandas as pd
 import pytest
-from datetime import datetime
+from io import BytesIO
+from matplotlib.figure import Figure
+from datetime import datetime, timezone
+from sklearn.linear_model import LinearRegression
 from api.user.models import User, TestUserType, UserType, Currency
 from api.alert.models import Alert
 from api.common.models import BaseModel
-from api.record.models import Record
-from api.analysis.models import AnalysisJob
+from api.order import matching_engine as matching_engine_module
+from api.order.matching_engine import MatchingEngine
+from api.record import histogram
+from api.record.cache import LatestRecordCache
+from api.record import migration
+from api.record.migration import convert_created_to_datetime
+from api.record.models import GB, Record
+from api.record.series import RecordSeries, generate_resampled_stats
+from api.record.warehouse_sync import sync_records_to_warehouse
+from api.util.warehouse import SQLiteWarehouseClient
+import bson
+from pydantic import ValidationError
+from pymongo.errors import PyMongoError
+from api.analysis.benchmark import write_synthetic_price_history
+from api.analysis.models import AnalysisJob, CreateStockPlotsRequest
+from api.util.price_history import price_history_store
+from api.model.models import LinearTrendModel, PredictStockFromModelBatchRequest
+from api.model.registry import ModelRegistry, deserialize_model
 from api.exception.models import BadRequestException, UnauthorizedException
 from api.util.util import (
     generate_df_from_csv,
@@ -75,6 +99,21 @@ def test_new_analysis_job():
     assert not analysis_job.complete
 
 
+def test_create_stock_plots_request(tmp_path, monkeypatch):
+    write_synthetic_price_history(str(tmp_path), "FOO")
+    monkeypatch.setattr(price_history_store, "cache_dir", str(tmp_path))
+    monkeypatch.setattr(price_history_store, "offline", True)
+
+    plots_request = CreateStockPlotsRequest(
+        stock="FOO", years=1, charts=["roi", "dividends", "roi"]
+    )
+    assert plots_request.charts == ["roi", "dividends"]
+    assert len(CreateStockPlotsRequest(stock="FOO", years=1).charts) == 5
+
+    with pytest.raises(ValidationError):
+        CreateStockPlotsRequest(stock="FOO", years=1, charts=["foo"])
+
+
 @pytest.fixture(scope="module")
 def new_record():
     record = Record(42)
@@ -83,7 +122,8 @@ def new_record():
 
 def test_new_record_with_fixture(new_record):
     assert new_record.index == 42
-    assert type(new_record.created) is str
+    assert type(new_record.created) is datetime
+    assert new_record.created.tzinfo is not None
 
 
 @pytest.fixture(scope="module")
@@ -117,7 +157,700 @@ def test_new_base_model():
     assert base.created == base.last_modified
 
 
+class FakeRecordsCollection:
+    def __init__(self, records):
+        self.records = records
+        self.pipelines = []
+
+    def aggregate_raw_batches(self, pipeline, batchSize):
+        self.pipelines.append(pipeline)
+        for i in range(0, len(self.records), batchSize):
+            batch = self.records[slice(i, i + batchSize)]
+            yield b"".join(bson.encode(j) for j in batch)
+
+
+class FakeSyncRecordsCollection(FakeRecordsCollection):
+    def aggregate_raw_batches(self, pipeline, batchSize):
+        created_after = pipeline[0]["$match"]["created"].get("$gt")
+        records = self.records
+        if created_after:
+            created_after_ms = int(created_after.timestamp() * 1000)
+            records = [i for i in records if i["created"] > created_after_ms]
+        return FakeRecordsCollection(records).aggregate_raw_batches(pipeline, batchSize)
+
+
+class FailingSQLiteWarehouseClient(SQLiteWarehouseClient):
+    def __init__(self, fail_on_load):
+        super().__init__(
+            ":memory:",
+            {"records": {"created": "TIMESTAMP", "fear_greed_index": "INTEGER"}},
+        )
+        self.fail_on_load = fail_on_load
+        self.loads = 0
+
+    def append_dataframe(self, table_id, df):
+        self.loads += 1
+        if self.loads == self.fail_on_load:
+            raise RuntimeError("load job failed")
+        return super().append_dataframe(table_id, df)
+
+
+def test_sync_records_to_warehouse_resumes_from_watermark(monkeypatch):
+    collection = FakeSyncRecordsCollection(
+        [{"created": 1704099600000 + i * 86_400_000, "index": i} for i in range(10)]
+    )
+    monkeypatch.setattr(sys.modules[Record.__module__], "db", {"records": collection})
+    series = RecordSeries(loader=Record.iter_index_batches_created_after)
+    warehouse_client = FailingSQLiteWarehouseClient(fail_on_load=3)
+
+    with pytest.raises(RuntimeError):
+        sync_records_to_warehouse(
+            warehouse_client, "records", load_batch_rows=3, series=series
+        )
+    assert warehouse_client.get_max_value("records", "fear_greed_index") == 5
+
+    sync_result = sync_records_to_warehouse(
+        warehouse_client, "records", load_batch_rows=3, series=series
+    )
+    assert sync_result["synced"] == 4 and sync_result["loadJobs"] == 2
+    df = warehouse_client.query_dataframe("SELECT * FROM records ORDER BY created")
+    assert list(df["fear_greed_index"]) == list(range(10))
+    assert sync_result["watermark"] == datetime(2024, 1, 10, 9, tzinfo=timezone.utc)
+
+    assert (
+        sync_records_to_warehouse(warehouse_client, "records", series=series)["synced"]
+        == 0
+    )
+
+
+class FakeFindOneRecordsCollection:
+    def __init__(self):
+        self.queries = []
+
+    def find_one(self, query, sort):
+        self.queries.append((query, sort))
+        return {"index": "42", "created": query["created"]["$gte"]}
+
+
+def test_find_first_record_on_date_queries_london_day(monkeypatch):
+    collection = FakeFindOneRecordsCollection()
+    monkeypatch.setattr(
+        sys.modules[Record.__module__], "records_collection", lambda: collection
+    )
+
+    record = Record.find_first_record_on_date(datetime(2024, 3, 31).date())
+    assert record["index"] == "42"
+    query, sort = collection.queries[0]
+    assert sort == [("created", 1)]
+    # the clocks go forward on 31 March, so the day is 23 hours long
+    assert query["created"]["$lt"] - query["created"]["$gte"] == pd.Timedelta(hours=23)
+    assert query["created"]["$gte"] == GB.localize(datetime(2024, 3, 31))
+
+
+def test_record_series_slices_and_refreshes_incrementally():
+    records = [(1704099600000 + i * 86_400_000, i * 10) for i in range(5)]
+    loaded_after = []
+
+    def loader(created_after):
+        loaded_after.append(created_after)
+        after_ms = int(created_after.timestamp() * 1000) if created_after else 0
+        batch = [i for i in records if i[0] > after_ms]
+        yield np.array([i[0] for i in batch]), np.array([i[1] for i in batch])
+
+    series = RecordSeries(loader=loader, refresh_seconds=60)
+    created, index = series.slice(
+        GB.localize(datetime(2024, 1, 2)), GB.localize(datetime(2024, 1, 5)), 15, 100
+    )
+    assert index.dtype == np.uint8 and list(index) == [20, 30]
+    assert series.first(
+        GB.localize(datetime(2024, 1, 4)), GB.localize(datetime(2024, 1, 5))
+    ) == (records[3][0], 30)
+    assert (
+        series.first(
+            GB.localize(datetime(2024, 2, 1)), GB.localize(datetime(2024, 2, 2))
+        )
+        is None
+    )
+
+    # an older record inserted by this process and a newer one written elsewhere
+    series.add(np.array([records[0][0] - 1000]), np.array([99]))
+    records.append((records[-1][0] + 1000, 55))
+    series.refresh()
+    assert loaded_after[-1] == datetime(2024, 1, 5, 9, tzinfo=timezone.utc)
+    created, index = series.arrays()
+    assert list(index) == [99, 0, 10, 20, 30, 40, 55]
+    assert np.all(np.diff(created) > 0)
+
+    # records loaded again are kept once
+    series.add(np.array([records[-1][0]]), np.array([55]))
+    assert series.stats()["records"] == 7
+    created, _ = series.created_after(datetime(2024, 1, 5, 9, tzinfo=timezone.utc))
+    assert len(created) == 1
+
+
+def test_generate_resampled_stats_by_london_week():
+    # Monday 1 January to Sunday 21 January 2024, nothing in the second week
+    created = pd.DatetimeIndex(
+        ["2024-01-01 00:30", "2024-01-07 23:30", "2024-01-15 09:00", "2024-01-21 09:00"]
+    ).tz_localize(GB)
+    values = pd.Series([10, 30, 50, 90], index=created)
+
+    stats = generate_resampled_stats(values, "W-MON", 2)
+    assert list(stats.index.strftime("%Y-%m-%d")) == [
+        "2024-01-01",
+        "2024-01-08",
+        "2024-01-15",
+    ]
+    assert stats["mean"].tolist()[0] == 20 and np.isnan(stats["mean"].iloc[1])
+    assert stats["count"].tolist() == [2, 0, 2]
+    assert stats["max"].iloc[2] == 90
+    assert np.isnan(stats["rollingMean"].iloc[0])
+    assert stats["rollingMean"].iloc[1] == 20 and stats["rollingMean"].iloc[2] == 70
+    assert stats["rollingMin"].iloc[2] == 50 and stats["rollingMax"].iloc[1] == 30
+
+
+class FakeMigrationCollection:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, query, projection):
+        return [{"_id": i["_id"]} for i in self.documents]
+
+    def find_raw_batches(self, batch_size):
+        for i in range(0, len(self.documents), batch_size):
+            batch = self.documents[slice(i, i + batch_size)]
+            yield b"".join(bson.encode(j) for j in batch)
+
+    def insert_many(self, documents, ordered):
+        self.documents.extend(documents)
+
+
+class FakeMigrationDatabase(dict):
+    def list_collection_names(self):
+        return list(self)
+
+    def list_collections(self, filter):
+        return [{"type": "timeseries"}] if filter["name"] == "records" else []
+
+
+def test_migrate_records_resumes_after_failure(monkeypatch):
+    legacy_records = [
+        {"_id": bson.ObjectId(), "created": f"2024-01-0{i}T09:00:00+00:00"}
+        for i in range(1, 5)
+    ]
+    # a previous run copied the first two records before failing
+    records = FakeMigrationCollection(
+        convert_created_to_datetime([dict(i) for i in legacy_records[slice(0, 2)]])
+    )
+    monkeypatch.setattr(
+        migration,
+        "db",
+        FakeMigrationDatabase(
+            records=records, records_legacy=FakeMigrationCollection(legacy_records)
+        ),
+    )
+
+    result = migration.migrate_records_to_time_series(batch_size=3)
+    assert result == {"migrated": 2, "skipped": 0, "existing": 2}
+    assert [i["_id"] for i in records.documents] == [i["_id"] for i in legacy_records]
+
+
+def test_convert_created_to_datetime():
+    records = convert_created_to_datetime(
+        [
+            {"created": "2024-01-01T09:00:00.123456+01:00", "index": "5"},
+            {"created": datetime(2024, 1, 2, 8), "index": "6", "creatd": ""},
+            {"created": "", "index": "7"},
+        ]
+    )
+    assert [i["index"] for i in records] == ["5", "6"]
+    assert records[0]["created"] == datetime(
+        2024, 1, 1, 8, 0, 0, 123456, tzinfo=timezone.utc
+    )
+    assert "creatd" not in records[1]
+
+
+def test_latest_record_cache_reads_from_memory():
+    records = [{"index": "40", "created": datetime(2024, 1, 1, tzinfo=timezone.utc)}]
+    loader_calls = []
+
+    def loader():
+        loader_calls.append(1)
+        return records[-1]
+
+    latest_record_cache = LatestRecordCache(loader=loader, reconcile_seconds=60)
+    assert latest_record_cache.get()["index"] == "40"
+    assert latest_record_cache.get()["index"] == "40"
+    assert len(loader_calls) == 1
+
+    latest_record_cache.update(
+        {"index": "41", "created": datetime(2024, 1, 2, tzinfo=timezone.utc)}
+    )
+    latest_record_cache.update(
+        {"index": "39", "created": datetime(2023, 12, 31, tzinfo=timezone.utc)}
+    )
+    assert latest_record_cache.get()["index"] == "41"
+
+    records.append(
+        {"index": "42", "created": datetime(2024, 1, 3, tzinfo=timezone.utc)}
+    )
+    latest_record_cache.reconcile()
+    assert latest_record_cache.get()["index"] == "42"
+    assert latest_record_cache.stats()["hits"] == 3
+
+
 def test_import_from_dataframe():
     df = generate_df_from_csv("data/example.csv")
-    records_imported = Record.import_from_dataframe(df)
-    assert records_imported == 1
+    import_result = Record.import_from_dataframe(df, dry_run=True)
+    assert import_result["inserted"] == 1
+
+
+class FakeImportRecordsCollection:
+    def __init__(self, records):
+        self.records = records
+        self.queries = []
+        self.insert_chunks = []
+
+    def find(self, query, projection):
+        self.queries.append(query)
+        return [
+            i
+            for i in self.records
+            if query["created"]["$gte"] <= i["created"] <= query["created"]["$lte"]
+        ]
+
+    def insert_many(self, records, ordered):
+        assert not ordered
+        self.insert_chunks.append(records)
+        self.records.extend(records)
+
+
+class FakeRecordHistogramsCollection:
+    def __init__(self):
+        self.documents = {}
+
+    def bulk_write(self, operations, ordered):
+        for operation in operations:
+            document = self.documents.setdefault(
+                operation._filter["_id"], {"values": {}}
+            )
+            for field, increment in operation._doc["$inc"].items():
+                index = field.split(".")[1]
+                document["values"][index] = document["values"].get(index, 0) + increment
+
+    def find(self, query, projection):
+        return [
+            j
+            for i, j in sorted(self.documents.items())
+            if query["_id"]["$gte"] <= i < query["_id"]["$lt"]
+        ]
+
+
+class FakeAggregateRecordsCollection:
+    def __init__(self):
+        self.pipelines = []
+
+    def aggregate(self, pipeline):
+        self.pipelines.append(pipeline)
+
+
+def test_refresh_record_histograms_recounts_whole_london_days(monkeypatch):
+    collection = FakeAggregateRecordsCollection()
+    monkeypatch.setattr(histogram, "db", {"records": collection})
+
+    histogram.refresh_record_histograms(days=2)
+    start = collection.pipelines[0][0]["$match"]["created"]["$gte"]
+    assert start.tzinfo.zone == "Europe/London"
+    assert start.time() == datetime.min.time()
+    assert (datetime.now(GB).date() - start.date()).days == 2
+
+
+def test_import_from_dataframe_bulk_inserts_new_dates(monkeypatch):
+    collection = FakeImportRecordsCollection(
+        [{"index": "50", "created": GB.localize(datetime(2024, 1, 2, 9))}]
+    )
+    monkeypatch.setattr(
+        sys.modules[Record.__module__], "records_collection", lambda: collection
+    )
+    series = RecordSeries(loader=lambda _: [])
+    monkeypatch.setattr(sys.modules[Record.__module__], "record_series", series)
+    histograms_collection = FakeRecordHistogramsCollection()
+    monkeypatch.setattr(
+        histogram,
+        "db",
+        {histogram.RECORD_HISTOGRAMS_COLLECTION: histograms_collection},
+    )
+    df = pd.DataFrame(
+        {"Index": [40, 41, 41, 42, 43]},
+        index=pd.DatetimeIndex(
+            ["2024-01-01", "2024-01-02", "2024-01-02", "2024-01-04", "2024-01-05"],
+            name="Date",
+        ),
+    )
+
+    assert Record.import_from_dataframe(df, dry_run=True) == {
+        "inserted": 3,
+        "skipped": 2,
+    }
+    assert not collection.insert_chunks
+
+    assert Record.import_from_dataframe(df, chunk_size=1) == {
+        "inserted": 3,
+        "skipped": 2,
+    }
+    assert len(collection.queries) == 2
+    assert [i["index"] for i in collection.records] == ["50", "40", "42", "43"]
+    assert len(collection.insert_chunks) == 3
+    assert Record.import_from_dataframe(df)["inserted"] == 0
+
+    assert sorted(histograms_collection.documents) == [
+        "2024-01-01",
+        "2024-01-04",
+        "2024-01-05",
+    ]
+    value_counts = histogram.get_value_counts(
+        datetime(2024, 1, 1).date(), datetime(2024, 1, 5).date()
+    )
+    assert np.flatnonzero(value_counts).tolist() == [40, 42]
+    assert histogram.generate_decile_counts(value_counts)[4] == 2
+    assert list(series.arrays()[1]) == [40, 42, 43]
+
+
+def test_histogram_from_value_counts_matches_records():
+    index_values = np.random.default_rng(0).integers(0, 101, size=5_000)
+    value_counts = np.bincount(index_values, minlength=101)
+
+    for bins in (3, 4, 5):
+        counts, edges = histogram.generate_histogram(value_counts, bins)
+        expected_counts, expected_edges = np.histogram(index_values, bins=bins)
+        assert np.array_equal(counts, expected_counts)
+        assert np.allclose(edges, expected_edges)
+
+    descriptions = pd.cut(index_values, (-1, 25, 45, 55, 75, 100), labels=False)
+    assert np.array_equal(
+        histogram.generate_band_counts(value_counts),
+        np.bincount(descriptions, minlength=5),
+    )
+
+
+def test_bar_chart_heights_match_band_counts():
+    views = importlib.import_module("api.record.views")
+    value_counts = np.bincount(
+        np.random.default_rng(0).integers(0, 101, size=1_000), minlength=101
+    )
+    fig = Figure()
+
+    views._draw_records_plot(fig, pd.Series(value_counts), "bar", 10)
+
+    assert [i.get_height() for i in fig.axes[0].patches] == list(
+        views._generate_description_counts(pd.Series(value_counts))
+    )
+
+
+class FakeModelBlob:
+    def __init__(self, model, generation=1):
+        buf = BytesIO()
+        joblib.dump(model, buf)
+        self.data = buf.getvalue()
+        self.generation = generation
+        self.download_count = 0
+
+    def download_as_bytes(self, if_generation_match=None):
+        self.download_count += 1
+        return self.data
+
+
+class FakeCloudStorageConnector:
+    def __init__(self, blobs):
+        self.blobs = blobs
+        self.metadata_requests = 0
+
+    def get_model_blob(self, stock_symbol, model_file_name):
+        self.metadata_requests += 1
+        return self.blobs.get(f"{stock_symbol}/{model_file_name}")
+
+
+def test_model_registry_skips_cloud_storage_on_repeat_lookup():
+    blob = FakeModelBlob({"slope": 1.5})
+    connector = FakeCloudStorageConnector({"AAPL/foo.pkl": blob})
+    registry = ModelRegistry("my_bucket", cloud_storage_connector=connector)
+
+    assert registry.get_model("AAPL", "foo.pkl") == {"slope": 1.5}
+    assert registry.get_model("AAPL", "foo.pkl") == {"slope": 1.5}
+    assert connector.metadata_requests == 1
+    assert blob.download_count == 1
+    assert registry.get_model("AAPL", "bar.pkl") is None
+
+
+def test_model_registry_evicts_least_recently_used():
+    connector = FakeCloudStorageConnector(
+        {f"AAPL/{i}.pkl": FakeModelBlob(i) for i in range(3)}
+    )
+    registry = ModelRegistry(
+        "my_bucket", max_entries=2, cloud_storage_connector=connector
+    )
+
+    registry.get_model("AAPL", "0.pkl")
+    registry.get_model("AAPL", "1.pkl")
+    registry.get_model("AAPL", "0.pkl")
+    registry.get_model("AAPL", "2.pkl")
+
+    assert registry.stats()["entries"] == 2
+    registry.get_model("AAPL", "0.pkl")
+    assert registry.stats()["misses"] == 3
+
+
+def test_model_registry_disk_tier_validates_generation(tmp_path):
+    blob = FakeModelBlob("first", generation=1)
+    connector = FakeCloudStorageConnector({"AAPL/foo.pkl": blob})
+    ModelRegistry(
+        "my_bucket", disk_dir=str(tmp_path), cloud_storage_connector=connector
+    ).get_model("AAPL", "foo.pkl")
+
+    registry = ModelRegistry(
+        "my_bucket", disk_dir=str(tmp_path), cloud_storage_connector=connector
+    )
+    assert registry.get_model("AAPL", "foo.pkl") == "first"
+    assert registry.stats()["diskHits"] == 1
+
+    connector.blobs["AAPL/foo.pkl"] = FakeModelBlob("second", generation=2)
+    registry.evict("AAPL", "foo.pkl")
+    assert registry.get_model("AAPL", "foo.pkl") == "second"
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_model_registry_disk_tier_stays_in_disk_dir(tmp_path):
+    disk_dir = tmp_path / "models"
+    connector = FakeCloudStorageConnector(
+        {"../../escape/foo.pkl": FakeModelBlob("model")}
+    )
+    registry = ModelRegistry(
+        "my_bucket", disk_dir=str(disk_dir), cloud_storage_connector=connector
+    )
+
+    assert registry.get_model("../../escape", "foo.pkl") == "model"
+    assert [i.parent for i in tmp_path.rglob("*") if i.is_file()] == [disk_dir]
+
+
+def test_linear_trend_model_matches_linear_regression():
+    dates = pd.date_range("2024-01-01", periods=30, tz="UTC")
+    df = pd.DataFrame({"Close": np.arange(30) * 2.0 + 100}, index=dates)
+    df["Days"] = (df.index - df.index.min()).days
+    model = LinearRegression().fit(df[["Days"]], df["Close"])
+
+    trend_model = LinearTrendModel.from_linear_regression(model, df.index.min())
+    assert trend_model.predict([[40]])[0] == pytest.approx(180.0)
+    assert trend_model.days_since_origin(datetime(2024, 2, 10)) == 40
+
+    for model_file_name, model_bytes in [
+        ("foo.json", trend_model.to_json_bytes()),
+        ("foo.npz", trend_model.to_npz_bytes()),
+    ]:
+        loaded_model = deserialize_model(model_file_name, model_bytes)
+        assert loaded_model.to_dict() == trend_model.to_dict()
+
+
+class FakeOrdersCollection:
+    def __init__(self, orders):
+        self.orders = {i["_id"]: i for i in orders}
+        self.bulk_writes = []
+
+    def find(self, query, projection=None, sort=None):
+        if "_id" in query:
+            return [self.orders[i] for i in query["_id"]["$in"] if i in self.orders]
+        if "status" in query:
+            orders = [i for i in self.orders.values() if i["status"] == "open"]
+        else:
+            since = query["last_modified"]["$gte"]
+            orders = [i for i in self.orders.values() if i["last_modified"] >= since]
+        return sorted(orders, key=lambda i: i["created"])
+
+    def bulk_write(self, operations, ordered):
+        self.bulk_writes.append(operations)
+        matched_count = 0
+        for operation in operations:
+            order = self.orders.get(operation._filter["_id"])
+            if order is None or any(
+                order[k] != v for k, v in operation._filter.items()
+            ):
+                continue
+            matched_count += 1
+            order.update(operation._doc["$set"])
+            order.setdefault("fills", []).extend(
+                operation._doc["$push"]["fills"]["$each"]
+            )
+        return type("BulkWriteResult", (), {"matched_count": matched_count})()
+
+    def update_one(self, query, update):
+        order = self.orders.get(query["_id"])
+        if order is None or order["quantity"] != query["quantity"]:
+            return type("UpdateResult", (), {"matched_count": 0})()
+        order["quantity"] += update["$inc"]["quantity"]
+        order.update(update["$set"])
+        counterparty_order_ids = update["$pull"]["fills"]["counterparty_order_id"]
+        order["fills"] = [
+            i
+            for i in order["fills"]
+            if i["counterparty_order_id"] not in counterparty_order_ids["$in"]
+        ]
+        return type("UpdateResult", (), {"matched_count": 1})()
+
+
+def test_matching_engine_fills_in_price_time_priority(monkeypatch):
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    orders = [
+        ("bid-1", "u1", "BUY", 10, 101),
+        ("bid-2", "u2", "BUY", 5, 100),
+        ("ask-1", "u1", "SELL", 4, 99),
+        ("ask-2", "u3", "SELL", 8, 100),
+        ("ask-3", "u3", "SELL", 5, 102),
+    ]
+    collection = FakeOrdersCollection(
+        [
+            {
+                "_id": order_id,
+                "created_by": created_by,
+                "stock_symbol": "AAPL",
+                "order_type": order_type,
+                "quantity": quantity,
+                "price": price,
+                "status": "open",
+                "created": created + pd.Timedelta(minutes=i),
+                "last_modified": created + pd.Timedelta(minutes=i),
+            }
+            for i, (order_id, created_by, order_type, quantity, price) in enumerate(
+                orders
+            )
+        ]
+    )
+    monkeypatch.setattr(matching_engine_module, "db", {"orders": collection})
+    published = []
+    monkeypatch.setattr(matching_engine_module, "_publish_trades", published.extend)
+    engine = MatchingEngine()
+
+    fills = engine.match()
+    # bid-1 skips its own user's cheaper ask-1 and takes ask-2
+    assert [
+        (i["buy_order_id"], i["sell_order_id"], i["quantity"], i["price"])
+        for i in fills
+    ] == [
+        ("bid-1", "ask-2", 8, 100),
+        ("bid-2", "ask-1", 4, 99),
+    ]
+    assert len(collection.bulk_writes) == 1 and published == fills
+    assert {k: (v["quantity"], v["status"]) for k, v in collection.orders.items()} == {
+        "bid-1": (2, "open"),
+        "bid-2": (1, "open"),
+        "ask-1": (0, "complete"),
+        "ask-2": (0, "complete"),
+        "ask-3": (5, "open"),
+    }
+    assert collection.orders["bid-1"]["fills"][0]["counterparty_order_id"] == "ask-2"
+
+    collection.orders["ask-4"] = {
+        **collection.orders["ask-3"],
+        "_id": "ask-4",
+        "price": 100,
+        "quantity": 3,
+        "created_by": "u4",
+        "last_modified": datetime.now(timezone.utc),
+    }
+    fills = engine.match()
+    assert [(i["buy_order_id"], i["quantity"]) for i in fills] == [
+        ("bid-1", 2),
+        ("bid-2", 1),
+    ]
+    assert engine.stats()["reloads"] == 1 and engine.stats()["openOrders"] == 1
+    assert engine.match() == []
+
+
+class ChangingOrdersCollection(FakeOrdersCollection):
+    def bulk_write(self, operations, ordered):
+        if not self.bulk_writes:
+            self.orders["ask-1"]["quantity"] = 3
+        return super().bulk_write(operations, ordered)
+
+
+def test_matching_engine_publishes_only_fills_written_to_both_orders(monkeypatch):
+    created = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    collection = ChangingOrdersCollection(
+        [
+            {
+                "_id": order_id,
+                "created_by": created_by,
+                "stock_symbol": "AAPL",
+                "order_type": order_type,
+                "quantity": quantity,
+                "price": price,
+                "status": "open",
+                "created": created + pd.Timedelta(minutes=i),
+                "last_modified": created + pd.Timedelta(minutes=i),
+            }
+            for i, (order_id, created_by, order_type, quantity, price) in enumerate(
+                [
+                    ("bid-1", "u1", "BUY", 8, 101),
+                    ("bid-2", "u2", "BUY", 5, 100),
+                    ("ask-1", "u1", "SELL", 4, 99),
+                    ("ask-2", "u3", "SELL", 8, 100),
+                ]
+            )
+        ]
+    )
+    monkeypatch.setattr(matching_engine_module, "db", {"orders": collection})
+    published = []
+    monkeypatch.setattr(matching_engine_module, "_publish_trades", published.extend)
+    engine = MatchingEngine()
+
+    # ask-1 changes before the write, so its fill is taken back out of bid-2
+    fills = engine.match()
+    assert [(i["buy_order_id"], i["sell_order_id"]) for i in fills] == [
+        ("bid-1", "ask-2")
+    ]
+    assert published == fills
+    assert (
+        collection.orders["bid-2"]["quantity"],
+        collection.orders["bid-2"]["fills"],
+    ) == (5, [])
+
+    fills = engine.match()
+    assert [(i["buy_order_id"], i["sell_order_id"], i["quantity"]) for i in fills] == [
+        ("bid-2", "ask-1", 3)
+    ]
+    assert engine.stats()["reloads"] == 2
+
+    def fail_bulk_write(operations, ordered):
+        raise PyMongoError("connection closed")
+
+    collection.orders["ask-3"] = {
+        **collection.orders["ask-2"],
+        "_id": "ask-3",
+        "quantity": 2,
+        "status": "open",
+        "last_modified": datetime.now(timezone.utc),
+    }
+    monkeypatch.setattr(collection, "bulk_write", fail_bulk_write)
+    assert engine.match() == []
+    assert engine.stats()["fills"] == 2 and len(published) == 2
+    assert collection.orders["ask-3"]["quantity"] == 2
+    assert collection.orders["bid-2"]["quantity"] == 2
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        {"future_dates": None},
+        {"start_date": None, "end_date": None},
+        {"future_dates": ["2099-01-01"], "step_days": None},
+        {"future_dates": ["2099-01-01"], "model_format": None},
+    ],
+)
+def test_predict_batch_request_rejects_null_fields(monkeypatch, payload):
+    monkeypatch.setattr(
+        sys.modules[PredictStockFromModelBatchRequest.__module__],
+        "check_asset_available",
+        lambda _: True,
+    )
+    with pytest.raises(ValidationError):
+        PredictStockFromModelBatchRequest.model_validate(
+            {"stock": "AAPL", "pkl_model_ids": ["foo"], **payload}
+        )
@@ -1,11 +1,31 @@
-from datetime import datetime
+from datetime import datetime, timezone
+import gc
+import io
+import multiprocessing
+import os
 import pytest
 import pandas as pd
 import numpy as np
 import time
 import yfinance as yf
-from api.common.constants import PANDAS_DF_DATE_FORMATE_CODE
-from api.util.cloud_storage_connector import CloudStorageConnector
+import matplotlib.pyplot as plt
+import pyarrow as pa
+from api import app
+from api.common.constants import (
+    BIGQUERY_TABLE_ID,
+    BIGQUERY_TABLE_ID_ORDERS,
+    PANDAS_DF_DATE_FORMATE_CODE,
+    SERIES_MAX_POINTS,
+)
+from api.util.csv_stream import generate_csv_chunks, split_df
+from api.util.warehouse import SQLiteWarehouseClient, WarehouseQuery
+from api.util.downsample import downsample_df, lttb_indices, minmax_indices
+from api.util.cloud_storage_connector import (
+    BackgroundUploader,
+    CloudStorageConnector,
+    get_storage_client,
+)
+from google.cloud import storage
 from api.util.util import (
     generate_dividend_yield_df,
     return_dupliucated_items_in_list,
@@ -17,6 +37,7 @@ from api.util.util import (
     return_union_set,
     return_random_int,
     generate_df_from_csv,
+    summarise_records_csv,
     return_delta,
     generate_figure_blob_filename,
     validate_date_string_for_pandas_df,
@@ -27,6 +48,17 @@ from api.util.util import (
     get_tuesday_date_months_ago,
 )
 from api.auth.auth import validate_google_oauth_token
+from api.analysis.benchmark import _get_worker_result, write_synthetic_price_history
+from api.analysis.backtest import backtest_close_series, rolling_linear_trend
+from api.util.plot_cache import PlotCache
+from api.exception.models import BadRequestException
+from api.util.plot_renderer import PlotRenderer
+from api.util.price_history import PriceHistoryStore
+from api.util.series_response import (
+    ARROW_STREAM_MIMETYPE,
+    generate_series_response,
+    get_series_max_points,
+)
 
 
 def test_return_duplicated_items_in_list_one_duplicate():
@@ -114,6 +146,21 @@ def test_generate_df_from_csv():
     assert df.index.inferred_type == "datetime64"
 
 
+def test_summarise_records_csv():
+    records_summary = summarise_records_csv("data/example.csv", chunk_rows=2)
+    assert records_summary["recordsCount"] == 3
+    assert records_summary["startDate"] == pd.Timestamp("2020-09-10")
+    assert records_summary["endDate"] == pd.Timestamp("2025-09-11")
+    assert records_summary["startDateIndexValue"] == 50
+    assert records_summary["endDateIndexValue"] == 55
+
+
+def test_summarise_records_csv_rejects_invalid_row():
+    data = io.StringIO("Date,Index\n10/09/2020,50\n11/09/2020,101\n12/09/2020,50\n")
+    with pytest.raises(ValueError, match="Invalid row 3"):
+        summarise_records_csv(data, chunk_rows=1)
+
+
 def test_return_delta():
     assert return_delta(10.54, 30.23) == -0.65
     assert return_delta(40.54, 30.23) == 0.34
@@ -199,3 +246,365 @@ def test_generate_dividend_yield_df():
 def test_get_tuesday_date_months_ago():
     date_string = get_tuesday_date_months_ago(6)
     assert datetime.strptime(date_string, PANDAS_DF_DATE_FORMATE_CODE).weekday() == 1
+
+
+def test_rolling_linear_trend_matches_polyfit():
+    days = np.arange(40, dtype=float) * 1.5
+    close = np.random.default_rng(1).normal(100, 5, size=40)
+    slope, intercept = rolling_linear_trend(days, close, 10)
+    for i in (0, 15, 30):
+        window = slice(i, i + 10)
+        expected_slope, expected_intercept = np.polyfit(days[window], close[window], 1)
+        assert slope[i] == pytest.approx(expected_slope)
+        assert intercept[i] == pytest.approx(expected_intercept)
+
+
+def test_backtest_close_series_linear_prices():
+    index = pd.date_range("2024-01-01", periods=100, freq="D", tz="UTC")
+    close = pd.Series(np.arange(100, dtype=float) * 2 + 50, index=index)
+    results = backtest_close_series(close, window=20, horizons=[5, 200])
+    assert results[0]["samples"] == 76
+    assert results[0]["mae"] == pytest.approx(0)
+    assert results[0]["directionalAccuracy"] == 1.0
+    assert results[1]["samples"] == 0
+    assert results[1]["mae"] is None
+
+
+def test_price_history_store_offline_reads_cache_dir(tmp_path):
+    index = pd.date_range("2020-01-01", "2024-12-31", freq="D", tz="UTC", name="Date")
+    pd.DataFrame({"Close": np.arange(len(index), dtype=float)}, index=index).to_csv(
+        tmp_path / "FOO.csv"
+    )
+    store = PriceHistoryStore(cache_dir=str(tmp_path), offline=True)
+    df = store.get_history("FOO", 1)
+    assert df.index.min() >= pd.Timestamp("2023-12-31", tz="UTC")
+    with pytest.raises(ValueError):
+        store.get_history("BAR", 1)
+
+
+def test_price_history_store_offline_synthetic_history(tmp_path):
+    write_synthetic_price_history(str(tmp_path), "FOO", years=2)
+    store = PriceHistoryStore(cache_dir=str(tmp_path), offline=True)
+    assert store.is_available("FOO")
+    assert not store.is_available("BAR")
+    assert len(store.get_history("FOO", 2)) == 504
+
+
+def test_benchmark_worker_exit_without_result():
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=os._exit, args=(3,))
+    process.start()
+    result = _get_worker_result(queue, process, timeout_seconds=30)
+    process.join()
+    assert result == {"error": "Worker exited with code 3 without a result"}
+
+
+def _draw_line(fig, values):
+    fig.add_subplot().plot(values)
+
+
+def _draw_failure(fig):
+    raise ValueError("draw failed")
+
+
+def test_plot_renderer_releases_figures():
+    plot_renderer = PlotRenderer(max_workers=2, max_pending=2)
+    png = plot_renderer.render(_draw_line, [1, 2, 3], figsize=(4, 3))
+    assert png.startswith(b"\x89PNG")
+
+    with pytest.raises(ValueError):
+        plot_renderer.render(_draw_failure)
+
+    gc.collect()
+    stats = plot_renderer.stats()
+    assert stats["renders"] == 1
+    assert stats["failures"] == 1
+    assert stats["liveFigures"] == 0
+    assert plt.get_fignums() == []
+
+
+def _draw_slowly(fig):
+    time.sleep(0.5)
+
+
+def test_plot_renderer_times_out_with_503():
+    plot_renderer = PlotRenderer(max_workers=1, max_pending=1, timeout_seconds=0.1)
+    with pytest.raises(BadRequestException) as e:
+        plot_renderer.render(_draw_slowly)
+    assert e.value.status_code == 503
+    assert plot_renderer.stats()["timeouts"] == 1
+
+
+class FakePlotBlob:
+    def __init__(self, blob_name):
+        self.public_url = f"https://storage.googleapis.com/plots-bucket/{blob_name}"
+        self.time_created = datetime.now(timezone.utc)
+
+
+class FakePlotCloudStorageConnector:
+    def __init__(self):
+        self.blobs = {}
+        self.uploads = 0
+
+    def get_blob(self, blob_name):
+        return self.blobs.get(blob_name)
+
+    def upload_png(self, png_bytes, blob_name, wait=True, on_failure=None):
+        self.uploads += 1
+        self.blobs[blob_name] = FakePlotBlob(blob_name)
+        return self.blobs[blob_name].public_url
+
+
+def test_plot_cache_skips_duplicate_renders():
+    cloud_storage_connector = FakePlotCloudStorageConnector()
+    plot_cache = PlotCache(
+        "plots-bucket", cloud_storage_connector=cloud_storage_connector
+    )
+    renders = []
+
+    def render():
+        renders.append(1)
+        return b"png"
+
+    inputs = {"stock": "FOO", "years": 1}
+    url = plot_cache.get_or_create("roi", inputs, "2024-01-02", render)
+    assert plot_cache.get_or_create("roi", dict(inputs), "2024-01-02", render) == url
+    assert len(renders) == 1
+
+    # another instance finds the blob uploaded for the same hash
+    other_plot_cache = PlotCache(
+        "plots-bucket", cloud_storage_connector=cloud_storage_connector
+    )
+    assert other_plot_cache.get_or_create("roi", inputs, "2024-01-02", render) == url
+    assert other_plot_cache.stats()["storageHits"] == 1
+
+    assert plot_cache.get_or_create("roi", inputs, "2024-01-03", render) != url
+    assert len(renders) == 2
+    assert cloud_storage_connector.uploads == 2
+
+
+class FailingPlotCloudStorageConnector(FakePlotCloudStorageConnector):
+    def upload_png(self, png_bytes, blob_name, wait=True, on_failure=None):
+        self.uploads += 1
+        on_failure()
+        return FakePlotBlob(blob_name).public_url
+
+
+def test_plot_cache_skips_url_of_failed_background_upload():
+    cloud_storage_connector = FailingPlotCloudStorageConnector()
+    plot_cache = PlotCache(
+        "plots-bucket",
+        async_uploads=True,
+        cloud_storage_connector=cloud_storage_connector,
+    )
+
+    inputs = {"stock": "FOO", "years": 1}
+    plot_cache.get_or_create("roi", inputs, "2024-01-02", lambda: b"png")
+    assert plot_cache.stats()["entries"] == 0
+
+    plot_cache.get_or_create("roi", inputs, "2024-01-02", lambda: b"png")
+    assert cloud_storage_connector.uploads == 2
+
+
+def test_cloud_storage_connector_reuses_storage_client(fake_gcs_server, monkeypatch):
+    monkeypatch.setattr("api.util.cloud_storage_connector._storage_client", None)
+    storage_client = get_storage_client()
+    assert storage_client is get_storage_client()
+    assert CloudStorageConnector("foo").storage_client is storage_client
+
+
+def test_cloud_storage_connector_uploads_to_fake_gcs(fake_gcs_server):
+    cloud_storage_connector = CloudStorageConnector(
+        "plots-bucket", storage_client=storage.Client()
+    )
+    url = cloud_storage_connector.upload_png(b"png", "plots/roi/foo.png")
+    assert url == "https://storage.googleapis.com/plots-bucket/plots/roi/foo.png"
+    assert fake_gcs_server.objects[("plots-bucket", "plots/roi/foo.png")][0] == b"png"
+    assert cloud_storage_connector.get_blob("plots/roi/foo.png").time_created
+    assert cloud_storage_connector.get_blob("plots/roi/bar.png") is None
+
+
+def test_background_uploader_retries_failed_uploads(fake_gcs_server, monkeypatch):
+    background_uploader = BackgroundUploader(max_attempts=3, backoff_seconds=0)
+    monkeypatch.setattr(
+        "api.util.cloud_storage_connector.background_uploader", background_uploader
+    )
+    fake_gcs_server.failing_uploads = 1
+    cloud_storage_connector = CloudStorageConnector(
+        "plots-bucket", storage_client=storage.Client()
+    )
+
+    url = cloud_storage_connector.upload_png(b"png", "plots/roi/foo.png", wait=False)
+    assert url.endswith("/plots-bucket/plots/roi/foo.png")
+    background_uploader._executor.shutdown(wait=True)
+
+    assert ("plots-bucket", "plots/roi/foo.png") in fake_gcs_server.objects
+    stats = background_uploader.stats()
+    assert stats["completed"] == 1
+    assert stats["retries"] == 1
+    assert stats["pending"] == 0
+
+
+def test_generate_series_response_formats():
+    df = pd.DataFrame(
+        {"Close": [1.23456, np.nan], "Count": [1, 2]},
+        index=pd.DatetimeIndex(["2024-01-01", "2024-01-02"], tz="UTC"),
+    )
+
+    with app.test_request_context():
+        response, status_code = generate_series_response(df, "json", stock="foo")
+        assert status_code == 200
+        assert response.get_json() == {
+            "stock": "foo",
+            "index": [1704067200000, 1704153600000],
+            "series": {"Close": [1.2346, None], "Count": [1, 2]},
+        }
+
+        response, _ = generate_series_response(df, "arrow", stock="foo")
+        assert response.mimetype == ARROW_STREAM_MIMETYPE
+        table = pa.ipc.open_stream(response.get_data()).read_all()
+        assert table.column_names == ["index", "Close", "Count"]
+        assert table.column("index").to_pylist() == [1704067200000, 1704153600000]
+        assert table.schema.metadata == {b"stock": b"foo"}
+
+
+def test_get_series_max_points_rejects_non_integers():
+    for query, max_points in (
+        ("", SERIES_MAX_POINTS),
+        ("maxPoints=0", 0),
+        ("maxPoints=3", 3),
+    ):
+        with app.test_request_context(f"/?{query}"):
+            assert get_series_max_points() == max_points
+
+    for value in ("abc", "1.5", "-1", "2", ""):
+        with app.test_request_context(f"/?maxPoints={value}"):
+            with pytest.raises(BadRequestException) as e:
+                get_series_max_points()
+            assert e.value.status_code == 400
+
+
+def test_lttb_indices_keeps_endpoints_and_peaks():
+    x = np.arange(10_000, dtype=float)
+    y = np.sin(x / 500)
+    y[1234] = 10
+    y[100:200] = np.nan
+
+    indices = lttb_indices(x, y, 500)
+    assert len(indices) == 500
+    assert indices[0] == 0 and indices[-1] == len(x) - 1
+    assert np.all(np.diff(indices) > 0)
+    assert 1234 in indices
+    assert np.array_equal(lttb_indices(x, y, 20_000), np.arange(len(x)))
+
+
+def test_minmax_indices_keeps_bucket_extremes():
+    y = np.random.default_rng(0).normal(size=1_000)
+    indices = minmax_indices(y, 100)
+    assert len(indices) <= 102
+    assert y.argmin() in indices and y.argmax() in indices
+
+
+def test_downsample_df_shares_one_index():
+    df = pd.DataFrame(
+        {
+            "Close": np.random.default_rng(0).normal(size=3_000).cumsum(),
+            "Volatility": np.linspace(0, 1, 3_000),
+            "Description": "foo",
+        },
+        index=pd.bdate_range("2020-01-01", periods=3_000),
+    )
+
+    downsampled_df = downsample_df(df, 300)
+    assert len(downsampled_df.index) <= 300
+    assert downsampled_df.index.is_monotonic_increasing
+    assert downsampled_df.index[-1] == df.index[-1]
+    assert list(downsampled_df.columns) == list(df.columns)
+    assert len(downsample_df(df, 300, method="minmax").index) <= 302
+    assert downsample_df(df, 0) is df
+
+
+def test_generate_csv_chunks_matches_to_csv():
+    df = pd.DataFrame(
+        {"Close": np.linspace(1, 2, 2_500), "Volume": np.arange(2_500)},
+        index=pd.bdate_range("2020-01-01", periods=2_500, name="Date"),
+    )
+
+    chunks = list(generate_csv_chunks(split_df(df, 1_000)))
+    assert len(chunks) == 3
+    assert "".join(chunks) == df.to_csv()
+
+
+def test_sqlite_warehouse_client_mirrors_orders():
+    warehouse_client = SQLiteWarehouseClient(":memory:")
+    table_ref = warehouse_client.table_ref(BIGQUERY_TABLE_ID_ORDERS)
+    warehouse_client.insert_rows(
+        BIGQUERY_TABLE_ID_ORDERS,
+        [
+            {
+                "created": "2024-01-01T09:00:00+01:00",
+                "stock_symbol": "AAPL",
+                "quantity": 2,
+                "price": 1.5,
+                "created_date": "2024-01-01",
+            }
+        ],
+    )
+    warehouse_client.replace_dataframe(
+        BIGQUERY_TABLE_ID_ORDERS,
+        pd.DataFrame(
+            {"stock_symbol": ["MSFT", "AAPL"], "quantity": [1, 3]},
+            index=pd.DatetimeIndex(
+                ["2024-01-02 10:00", "2024-01-03 10:00"], tz="UTC", name="created"
+            ),
+        ),
+    )
+
+    df = warehouse_client.query_dataframe(
+        f"SELECT * FROM {table_ref} WHERE created > '2024-01-03' ORDER BY created"
+    )
+    assert list(df["stock_symbol"]) == ["AAPL"]
+    assert df["created"].iloc[0] == pd.Timestamp("2024-01-03 10:00", tz="UTC")
+    assert warehouse_client.get_max_value(BIGQUERY_TABLE_ID_ORDERS, "quantity") == 3
+    assert warehouse_client.get_max_value(BIGQUERY_TABLE_ID, "created") is None
+
+
+def test_warehouse_query_pushes_down_parameterized_predicates():
+    query = (
+        WarehouseQuery(BIGQUERY_TABLE_ID_ORDERS, ["created", "stock_symbol"])
+        .where("created", ">=", datetime(2024, 1, 2, tzinfo=timezone.utc))
+        .where("stock_symbol", "=", "AAPL'; DROP TABLE orders; --")
+        .order_by("created", descending=True)
+        .limit(10)
+    )
+    sql, params = query.to_sql("orders", lambda i: f"@{i}")
+    assert sql.endswith(
+        "WHERE created >= @p0\nAND stock_symbol = @p1\nORDER BY created DESC\nLIMIT 10"
+    )
+    assert params["p1"] == "AAPL'; DROP TABLE orders; --"
+
+    warehouse_client = SQLiteWarehouseClient(":memory:")
+    warehouse_client.append_dataframe(
+        BIGQUERY_TABLE_ID_ORDERS,
+        pd.DataFrame(
+            {"stock_symbol": ["AAPL", "MSFT", "AAPL"]},
+            index=pd.date_range("2024-01-01", periods=3, tz="UTC", name="created"),
+        ),
+    )
+    query = (
+        WarehouseQuery(BIGQUERY_TABLE_ID_ORDERS, ["created", "stock_symbol"])
+        .where("created", ">=", datetime(2024, 1, 2, tzinfo=timezone.utc))
+        .where("stock_symbol", "=", "AAPL")
+    )
+    query_result = warehouse_client.run_query(query)
+    assert list(query_result.df["created"]) == [pd.Timestamp("2024-01-03", tz="UTC")]
+    assert not query_result.cached
+    assert warehouse_client.run_query(query).cached
+
+    warehouse_client.insert_rows(
+        BIGQUERY_TABLE_ID_ORDERS,
+        [{"created": "2024-01-04T00:00:00+00:00", "stock_symbol": "AAPL"}],
+    )
+    query_result = warehouse_client.run_query(query)
+    assert not query_result.cached and len(query_result.df.index) == 2